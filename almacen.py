@@ -0,0 +1,716 @@
+# ALMACÉN EN MEMORIA DE PELÍCULAS
+
+# Este módulo reemplaza a la antigua lista `movies_db` por un "almacén" que, además
+# de guardar las películas, mantiene un índice por título normalizado.
+# Así buscar, agregar, renombrar o borrar una película cuesta O(1) en vez de
+# recorrer las ~36k películas en cada petición.
+# También mantiene índices secundarios (año, género y actor -> ids) para que los
+# filtros de `GET /movies` no dependan del tamaño total del catálogo.
+# Otros componentes (por ejemplo el diario de persistencia) pueden suscribirse para
+# enterarse de cada cambio.
+# Al cargar un snapshot binario, algunos campos pesados (ver `snapshot_binario`) quedan
+# sin decodificar hasta que se pide la película completa por primera vez.
+#
+# Por dentro, cada película no se guarda como un dict sino como un `RegistroPelicula`
+# (un objeto con `__slots__`): los géneros y actores son tuplas de strings compartidos
+# entre todas las películas, y el `extract` se guarda como bytes UTF-8. Hacia afuera
+# el almacén sigue recibiendo y devolviendo dicts.
+#
+# Para `GET /movies/search` mantiene además un índice de texto completo (ver `busqueda`),
+# que se arma la primera vez que se usa y desde ahí se actualiza con cada escritura.
+# Lo mismo con los índices ordenados por título y por año (ver `indice_ordenado`), que
+# resuelven los listados ordenados (`sort=`) y los filtros por prefijo del título.
+
+import sys
+import threading                     # Para proteger el almacén del acceso concurrente (FastAPI usa un pool de hilos)
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Callable, Collection, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from busqueda import IndiceTextual
+from indice_ordenado import ListaOrdenada
+
+
+
+# EXCEPCIONES DEL ALMACÉN
+
+class PeliculaNoEncontrada(KeyError):
+    """No existe ninguna película con el título pedido."""
+
+class PeliculaDuplicada(ValueError):
+    """Ya existe otra película con el mismo título."""
+
+
+
+# Firma de los suscriptores: reciben la película anterior (None si es nueva) y la
+# nueva (None si se eliminó). Se llaman con el almacén bloqueado, en el orden de los cambios.
+# Si reciben (None, None) es porque se recargó todo el almacén con `cargar`.
+Suscriptor = Callable[[Optional[Dict], Optional[Dict]], None]
+
+# Órdenes en los que se pueden listar las películas, con los tipos de su clave de orden:
+#   "title": (título normalizado, id)
+#   "year":  (año, título normalizado, id), es decir por año y dentro de cada año por título.
+# El id al final desempata (hay títulos repetidos) y es lo que se devuelve.
+ORDENES = {"title": (str, int), "year": (int, str, int)}
+
+# Año con el que se ordenan las películas que no tienen (no debería haber: la API lo exige).
+# Los años válidos son >= 0, así que quedan primero.
+_SIN_ANIO = -1
+
+# Función que devuelve los campos que faltan de la película cargada en la posición `i`.
+# Tiene que tener un atributo `campos` con los nombres de esos campos.
+Detalles = Callable[[int], Dict]
+
+
+
+# FUNCIONES AUXILIARES
+
+def normalizar_titulo(titulo: str) -> str:
+    """Devuelve la clave con la que se indexa un título (no distingue mayúsculas/minúsculas)."""
+    return titulo.lower()
+
+def normalizar_texto(texto: str) -> str:
+    """Clave con la que se indexan géneros y actores (tampoco distingue mayúsculas/minúsculas)."""
+    return texto.strip().lower()
+
+
+
+# REGISTROS COMPACTOS
+
+CAMPOS_PELICULA = ("title", "year", "cast", "genres", "href", "extract",
+                   "thumbnail", "thumbnail_width", "thumbnail_height")
+
+class RegistroPelicula:
+    """
+    Una película tal como se guarda dentro del almacén. Ocupa bastante menos que un dict:
+    no tiene tabla de claves propia, `cast` y `genres` son tuplas de strings compartidos y
+    `extract` (el campo más largo) se guarda en UTF-8, que para textos con tildes ocupa
+    la mitad que un `str` de Python. Los campos desconocidos van en `otros`.
+    """
+    __slots__ = CAMPOS_PELICULA + ("otros",)
+
+
+class _Pendiente:
+    """Valor de los campos perezosos que todavía no se cargaron (recuerda de dónde cargarlos)."""
+    __slots__ = ("detalles",)
+
+    def __init__(self, detalles: Detalles):
+        self.detalles = detalles
+
+
+_CAMPOS_CONOCIDOS = frozenset(CAMPOS_PELICULA)
+_nuevo_registro = object.__new__
+
+
+
+# ÍNDICES COMPACTOS
+
+# La mayoría de los títulos, y muchos actores, aparecen en una sola película. Un set o una
+# lista con un único id ocupa más de 200 bytes, así que en los índices un id solo se guarda
+# como un int, y recién se pasa a lista (títulos) o set (año, género, actor) con el segundo.
+
+Ids = Union[int, List[int], Set[int]]
+
+def _ids_de(valor: Optional[Ids]) -> Collection[int]:
+    """Los ids de una entrada de índice, como colección (vacía si no hay entrada)."""
+    if valor is None:
+        return ()
+    return (valor,) if type(valor) is int else valor
+
+def _agregar_titulo(indice: Dict[str, Ids], clave: str, id_pelicula: int) -> None:
+    actual = indice.get(clave)
+    if actual is None:
+        indice[clave] = id_pelicula
+    elif type(actual) is int:
+        indice[clave] = [actual, id_pelicula]
+    else:
+        actual.append(id_pelicula)
+
+def _agregar_id(indice: Dict, clave, id_pelicula: int) -> None:
+    actual = indice.get(clave)
+    if actual is None:
+        indice[clave] = id_pelicula
+    elif type(actual) is int:
+        if actual != id_pelicula:
+            indice[clave] = {actual, id_pelicula}
+    else:
+        actual.add(id_pelicula)
+
+def _quitar_id(indice: Dict, clave, id_pelicula: int) -> None:
+    """Saca el id de la entrada (lista o set); si queda uno solo vuelve a ser un int, y si no queda ninguno se borra."""
+    actual = indice[clave]
+    if type(actual) is int:
+        del indice[clave]
+        return
+    if type(actual) is list:
+        actual.remove(id_pelicula)
+    else:
+        actual.discard(id_pelicula)
+    if len(actual) == 1:
+        indice[clave] = next(iter(actual))
+    elif not actual:
+        del indice[clave]
+
+def _siguiente_prefijo(prefijo: str) -> Optional[Tuple[str]]:
+    """
+    Clave de orden hasta la que llegan (sin incluirla) los títulos que empiezan con
+    `prefijo`: el prefijo con su último carácter incrementado. None si no hay (el último
+    carácter ya es el máximo de Unicode, o el prefijo es vacío): entonces llegan hasta el final.
+    """
+    if not prefijo or ord(prefijo[-1]) == sys.maxunicode:
+        return None
+    return (prefijo[:-1] + chr(ord(prefijo[-1]) + 1),)
+
+def _pendiente_de(registro: RegistroPelicula) -> Optional[_Pendiente]:
+    """El valor de los campos perezosos del registro si todavía no se cargaron, o None."""
+    for valor in (registro.extract, registro.thumbnail, *(registro.otros or {}).values()):
+        if type(valor) is _Pendiente:
+            return valor
+    return None
+
+def _asignar(registro: RegistroPelicula, campo: str, valor) -> None:
+    """Guarda un campo en el registro, con la misma representación que usa `_a_registro`."""
+    if campo == "extract" and type(valor) is str:
+        valor = valor.encode("utf-8")
+    if campo in _CAMPOS_CONOCIDOS:
+        setattr(registro, campo, valor)
+    else:
+        registro.otros = {**(registro.otros or {}), campo: valor}
+
+
+
+# ALMACÉN
+
+# Atributos que `cargar` reemplaza por los de un almacén armado aparte.
+_ESTADO_DEL_CONTENIDO = ("_peliculas", "_por_titulo", "_por_anio", "_por_genero", "_por_actor",
+                         "_siguiente_id", "_cadenas", "_campos_perezosos")
+
+class AlmacenPeliculas:
+    """
+    Guarda las películas en memoria junto a un índice `título normalizado -> ids`
+    y a índices secundarios por año, género y actor.
+    Cada película recibe un id interno creciente, por lo que recorrer los ids en orden
+    equivale a recorrer las películas en el orden en que fueron cargadas o agregadas.
+
+    El dataset de Wikipedia tiene títulos repetidos (remakes), por eso el índice guarda
+    una lista de ids por título: las búsquedas devuelven la primera, y borrar elimina todas,
+    igual que hacía la versión basada en listas.
+
+    Cada llamada de lectura devuelve un dict nuevo armado a partir del registro interno,
+    así que modificarlo no cambia el almacén.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._peliculas: Dict[int, RegistroPelicula] = {}   # id interno -> película
+        # Índices (ver "ÍNDICES COMPACTOS": cada entrada es un id suelto o una lista/set de ids)
+        self._por_titulo: Dict[str, Ids] = {}          # título normalizado -> ids (en orden de inserción)
+        self._por_anio: Dict[int, Ids] = {}            # año -> ids
+        self._por_genero: Dict[str, Ids] = {}          # género normalizado -> ids
+        self._por_actor: Dict[str, Ids] = {}           # actor normalizado -> ids
+        self._siguiente_id = 0
+        self._suscriptores: List[Suscriptor] = []
+        # Cambios todavía sin avisar (None si no se están reteniendo, ver `retener_notificaciones`)
+        self._retenidas: Optional[List[Tuple[Optional[Dict], Optional[Dict]]]] = None
+        self._no_retenido: Optional[Suscriptor] = None
+        self._cadenas: Dict[str, str] = {}             # Una sola copia de cada género y actor
+        self._campos_perezosos: Tuple[str, ...] = ()   # Campos que pueden faltar cargar (ver `cargar`)
+        # Índice de texto completo (None hasta que se arma, ver `preparar_busqueda`)
+        self._busqueda: Optional[IndiceTextual] = None
+        self._lock_busqueda = threading.Lock()            # Para que no lo armen dos hilos a la vez
+        self._tocados_durante_busqueda: Optional[Set[int]] = None
+        # Índices ordenados (None hasta que se arman, ver `_preparar_ordenes`)
+        self._orden_titulo: Optional[ListaOrdenada] = None   # (título normalizado, id)
+        self._orden_anio: Optional[ListaOrdenada] = None     # (año, título normalizado, id)
+
+    def suscribir(self, suscriptor: Suscriptor) -> None:
+        """Registra una función que será llamada en cada alta, modificación o baja."""
+        self._suscriptores.append(suscriptor)
+
+    def desuscribir(self, suscriptor: Suscriptor) -> None:
+        self._suscriptores.remove(suscriptor)
+
+    def retener_notificaciones(self, salvo: Suscriptor) -> None:
+        """
+        Desde ahora los cambios se le avisan enseguida solo a `salvo`; los demás suscriptores
+        no se enteran hasta `notificar_retenidas`. Lo usa el diario compartido para que nadie
+        publique un cambio antes de que quede confirmado.
+        """
+        with self._lock:
+            self._retenidas, self._no_retenido = [], salvo
+
+    def soltar_notificaciones(self) -> List[Tuple[Optional[Dict], Optional[Dict]]]:
+        """Deja de retener y devuelve los cambios retenidos, en orden. Si no se avisan, se descartan."""
+        with self._lock:
+            retenidas, self._retenidas, self._no_retenido = self._retenidas or [], None, None
+            return retenidas
+
+    def notificar_retenidas(self, cambios: List[Tuple[Optional[Dict], Optional[Dict]]], salvo: Suscriptor) -> None:
+        """Avisa los cambios devueltos por `soltar_notificaciones` a todos los suscriptores menos a `salvo`."""
+        with self._lock:
+            for anterior, nueva in cambios:
+                for suscriptor in self._suscriptores:
+                    if suscriptor != salvo:
+                        suscriptor(anterior, nueva)
+
+    def bloqueo(self) -> threading.RLock:
+        """Lock del almacén, para operaciones que necesitan verlo sin cambios concurrentes."""
+        return self._lock
+
+    # Lectura
+
+    def __len__(self) -> int:
+        return len(self._peliculas)
+
+    def __iter__(self) -> Iterator[Dict]:
+        # Se itera sobre una copia para que una escritura concurrente no rompa el recorrido.
+        with self._lock:
+            registros = list(self._peliculas.items())
+        return (self._a_dict(id_pelicula, registro) for id_pelicula, registro in registros)
+
+    def instantanea(self) -> Tuple[List[Dict], List[Optional[Tuple[Detalles, int]]]]:
+        """
+        Las películas para escribir un snapshot, sin cargar sus campos perezosos. Devuelve dos
+        listas paralelas: las películas (sin los campos que están pendientes) y, para cada una,
+        (detalles, posición) de donde leer esos campos, o None si no tiene pendientes.
+        """
+        with self._lock:
+            registros = list(self._peliculas.items())
+        peliculas, pendientes = [], []
+        for id_pelicula, registro in registros:
+            pendiente = _pendiente_de(registro)
+            peliculas.append(self._a_dict(id_pelicula, registro, completa=False))
+            # Las películas cargadas con `cargar` recibieron los ids 0, 1, 2...: el id es su posición.
+            pendientes.append((pendiente.detalles, id_pelicula) if pendiente is not None else None)
+        return peliculas, pendientes
+
+    def obtener(self, titulo: str) -> Optional[Dict]:
+        """Devuelve la película con ese título, o None si no existe."""
+        with self._lock:  # Entre buscar el título y el registro, otro hilo podría borrarla.
+            ids = _ids_de(self._por_titulo.get(normalizar_titulo(titulo)))
+            if not ids:
+                return None
+            id_pelicula = ids[0]
+            registro = self._peliculas[id_pelicula]
+        return self._a_dict(id_pelicula, registro)
+
+    def existe(self, titulo: str) -> bool:
+        return normalizar_titulo(titulo) in self._por_titulo
+
+    def cantidad_con_titulo(self, titulo: str) -> int:
+        """Cuántas películas tienen ese título (más de una si hay remakes con el mismo nombre)."""
+        return len(_ids_de(self._por_titulo.get(normalizar_titulo(titulo))))
+
+    def obtener_por_id(self, id_pelicula: int, campos: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """
+        Devuelve la película con ese id interno, o None si ya no existe.
+        Si se indican `campos`, los detalles perezosos solo se cargan si se pide alguno de
+        ellos (la película devuelta puede no tener los demás).
+        """
+        registro = self._peliculas.get(id_pelicula)
+        if registro is None:
+            return None
+        completa = campos is None or not self._campos_perezosos or not set(self._campos_perezosos).isdisjoint(campos)
+        return self._a_dict(id_pelicula, registro, completa)
+
+    def filtrar(self, year: Optional[int] = None, genres: Iterable[str] = (), cast: Iterable[str] = (),
+                year_from: Optional[int] = None, year_to: Optional[int] = None) -> List[Dict]:
+        """Devuelve las películas que cumplen TODOS los filtros indicados, en orden de inserción."""
+        with self._lock:
+            ids = self.filtrar_ids(year, genres, cast, year_from, year_to)
+            return [self._a_dict(id_pelicula, self._peliculas[id_pelicula]) for id_pelicula in ids]
+
+    def filtrar_ids(self, year: Optional[int] = None, genres: Iterable[str] = (), cast: Iterable[str] = (),
+                    year_from: Optional[int] = None, year_to: Optional[int] = None,
+                    title_prefix: Optional[str] = None) -> List[int]:
+        """
+        Igual que `filtrar`, pero devuelve los ids internos (ordenados de menor a mayor).
+        Cada filtro aporta un conjunto de ids ("posting set") y se intersectan empezando por
+        el más chico, así el costo depende del tamaño de los resultados y no del catálogo.
+        `title_prefix` deja solo los títulos que empiezan así (sin distinguir mayúsculas).
+        """
+        with self._lock:
+            conjuntos: List[Collection[int]] = []
+            if year is not None:
+                conjuntos.append(_ids_de(self._por_anio.get(year)))
+            if year_from is not None or year_to is not None:
+                conjuntos.append(self._ids_en_rango_de_anios(year_from, year_to))
+            if title_prefix is not None:
+                conjuntos.append([clave[-1] for clave in self._claves_con_prefijo(title_prefix)])
+            conjuntos.extend(_ids_de(self._por_genero.get(normalizar_texto(g))) for g in genres)
+            conjuntos.extend(_ids_de(self._por_actor.get(normalizar_texto(a))) for a in cast)
+
+            if not conjuntos:
+                return list(self._peliculas)  # Los ids se asignan en orden creciente: ya están ordenados.
+
+            conjuntos.sort(key=len)
+            ids = set(conjuntos[0])
+            for conjunto in conjuntos[1:]:
+                if not ids:
+                    break
+                ids.intersection_update(conjunto)
+            return sorted(ids)
+
+    def pagina_ordenada(self, orden: str, descendente: bool = False, despues_de: Optional[Tuple] = None,
+                        saltear: int = 0, cantidad: Optional[int] = None, year: Optional[int] = None,
+                        genres: Iterable[str] = (), cast: Iterable[str] = (), year_from: Optional[int] = None,
+                        year_to: Optional[int] = None, title_prefix: Optional[str] = None) -> Tuple[List[Tuple], int, bool]:
+        """
+        Una página de las películas que cumplen los filtros (como `filtrar_ids`), ordenadas
+        según `orden` (ver `ORDENES`). Devuelve las claves de orden de la página (el id es el
+        último elemento), cuántas películas cumplen los filtros en total y si hay más después
+        de la página. `despues_de` es la clave de un cursor: la página empieza después de ella,
+        en el sentido del recorrido; después se saltean `saltear` y se toman hasta `cantidad`.
+
+        Si los filtros son los del mismo índice (`title_prefix` ordenando por título; año o
+        rango de años ordenando por año) o no hay filtros, la página se lee directamente del
+        índice ordenado a partir del cursor: O(log N + saltear + cantidad), sin copiar el resto
+        del rango. Si no, se filtra como siempre y se ordenan los k resultados.
+        """
+        with self._lock:
+            self._preparar_ordenes()
+            filtros_de_anio = year is not None or year_from is not None or year_to is not None
+            if orden == "title" and not (filtros_de_anio or genres or cast):
+                indice, desde, hasta = self._orden_titulo, None, None
+                if title_prefix is not None:
+                    prefijo = normalizar_titulo(title_prefix)
+                    desde, hasta = (prefijo,), _siguiente_prefijo(prefijo)
+            elif orden == "year" and not (title_prefix is not None or genres or cast):
+                indice = self._orden_anio
+                anio_desde = max((a for a in (year, year_from) if a is not None), default=None)
+                anio_hasta = min((a for a in (year, year_to) if a is not None), default=None)
+                # Las películas sin año (`_SIN_ANIO`) quedan fuera de cualquier filtro por año.
+                desde = None if anio_desde is None and anio_hasta is None else (_SIN_ANIO + 1 if anio_desde is None else anio_desde,)
+                hasta = None if anio_hasta is None else (anio_hasta + 1,)
+            else:
+                indice = None
+
+            if indice is not None:
+                total = indice.contar(desde, hasta)
+                claves = indice.rango(desde, hasta, descendente, despues_de)
+            else:
+                ids = self.filtrar_ids(year, genres, cast, year_from, year_to, title_prefix)
+                ordenadas = sorted(self._clave_de_orden(orden, id_pelicula, self._peliculas[id_pelicula]) for id_pelicula in ids)
+                total = len(ordenadas)
+                if descendente:
+                    fin = len(ordenadas) if despues_de is None else bisect_left(ordenadas, despues_de)
+                    claves = islice(reversed(ordenadas), len(ordenadas) - fin, None)
+                else:
+                    claves = islice(ordenadas, 0 if despues_de is None else bisect_right(ordenadas, despues_de), None)
+
+            # Se pide una clave de más para saber si hay otra página.
+            pagina = list(islice(claves, saltear, None if cantidad is None else saltear + cantidad + 1))
+            hay_mas = cantidad is not None and len(pagina) > cantidad
+            return (pagina[:cantidad] if hay_mas else pagina), total, hay_mas
+
+    def buscar(self, consulta: str, limite: int = 10, prefijo: bool = True) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        Búsqueda de texto completo en título, reparto y `extract` (ver `IndiceTextual.buscar`).
+        Devuelve los pares (id, puntaje) de las `limite` mejores películas y cuántas coincidieron.
+        """
+        while True:
+            self.preparar_busqueda()
+            with self._lock:
+                if self._busqueda is not None:  # Si no, se recargó el almacén mientras se armaba.
+                    return self._busqueda.buscar(consulta, limite, prefijo)
+
+    def preparar_busqueda(self) -> None:
+        """
+        Arma el índice de texto completo si todavía no existe (tarda unos segundos con el
+        catálogo entero: decodifica cada `extract` perezoso, aunque sin dejarlo cargado, ver
+        `_textos`). Casi todo el trabajo se hace sin el lock del almacén: las escrituras que
+        llegan mientras tanto solo anotan qué películas tocaron, y al final se corrigen esas
+        en el índice nuevo.
+        """
+        with self._lock_busqueda:
+            while self._busqueda is None:
+                with self._lock:
+                    peliculas = self._peliculas
+                    registros = dict(peliculas)
+                    self._tocados_durante_busqueda = set()
+
+                indice = IndiceTextual()
+                for id_pelicula, registro in registros.items():
+                    indice.agregar(id_pelicula, self._textos(id_pelicula, registro))
+
+                with self._lock:
+                    tocados, self._tocados_durante_busqueda = self._tocados_durante_busqueda, None
+                    if self._peliculas is not peliculas:
+                        continue  # `cargar` reemplazó todo el contenido: hay que empezar de nuevo.
+                    for id_pelicula in tocados:
+                        if id_pelicula in registros:
+                            indice.quitar(id_pelicula, self._textos(id_pelicula, registros[id_pelicula]))
+                        if id_pelicula in self._peliculas:
+                            indice.agregar(id_pelicula, self._textos(id_pelicula, self._peliculas[id_pelicula]))
+                    self._busqueda = indice
+
+    # Escritura
+
+    def cargar(self, peliculas: Iterable[Dict], detalles: Optional[Detalles] = None) -> None:
+        """
+        Reemplaza todo el contenido del almacén y reconstruye los índices (avisa con un único (None, None)).
+        Si se pasan `detalles`, a las películas les faltan esos campos: se completan con
+        `detalles(posición)` la primera vez que se pide cada una.
+
+        El contenido nuevo se arma aparte, sin el lock: mientras tanto se sigue atendiendo con
+        el anterior, que se reemplaza de una vez al final. Una escritura que llegue durante la
+        carga queda reemplazada, como si hubiera ocurrido antes.
+        """
+        nuevo = AlmacenPeliculas()
+        nuevo._campos_perezosos = tuple(detalles.campos) if detalles is not None else ()
+        nuevo._indexar_en_bloque(peliculas, _Pendiente(detalles) if detalles is not None else None)
+        with self._lock:
+            for campo in _ESTADO_DEL_CONTENIDO:
+                setattr(self, campo, getattr(nuevo, campo))
+            self._busqueda = None  # Se vuelve a armar con la próxima búsqueda.
+            self._orden_titulo = self._orden_anio = None  # Y estos con el próximo listado ordenado.
+            self._notificar(None, None)
+
+    def agregar(self, pelicula: Dict) -> Dict:
+        """Agrega una película nueva. Lanza `PeliculaDuplicada` si el título ya existe."""
+        with self._lock:
+            if self.existe(pelicula["title"]):
+                raise PeliculaDuplicada(pelicula["title"])
+            self._insertar(self._a_registro(pelicula))
+            self._notificar(None, pelicula)
+            return pelicula
+
+    def actualizar(self, titulo: str, pelicula: Dict) -> Dict:
+        """
+        Reemplaza la película `titulo` por `pelicula`, manteniendo su posición.
+        Si el título cambia, verifica que el nuevo no choque con otra película.
+        """
+        with self._lock:
+            clave_vieja = normalizar_titulo(titulo)
+            ids = _ids_de(self._por_titulo.get(clave_vieja))
+            if not ids:
+                raise PeliculaNoEncontrada(titulo)
+            id_pelicula = ids[0]
+            clave_nueva = normalizar_titulo(pelicula["title"])
+            if clave_nueva != clave_vieja:
+                if clave_nueva in self._por_titulo:
+                    raise PeliculaDuplicada(pelicula["title"])
+                _quitar_id(self._por_titulo, clave_vieja, id_pelicula)
+                self._por_titulo[clave_nueva] = id_pelicula
+            registro_anterior = self._peliculas[id_pelicula]
+            self._desindexar_secundarios(id_pelicula, registro_anterior)
+            registro = self._a_registro(pelicula)
+            self._peliculas[id_pelicula] = registro
+            self._indexar_secundarios(id_pelicula, registro)
+            self._notificar(self._a_dict(id_pelicula, registro_anterior), pelicula)
+            return pelicula
+
+    def eliminar(self, titulo: str) -> List[Dict]:
+        """Elimina todas las películas con ese título y las devuelve."""
+        with self._lock:
+            ids = _ids_de(self._por_titulo.pop(normalizar_titulo(titulo), None))
+            if not ids:
+                raise PeliculaNoEncontrada(titulo)
+            eliminadas = []
+            for id_pelicula in ids:
+                registro = self._peliculas.pop(id_pelicula)
+                self._desindexar_secundarios(id_pelicula, registro)
+                pelicula = self._a_dict(id_pelicula, registro)
+                self._notificar(pelicula, None)
+                eliminadas.append(pelicula)
+            return eliminadas
+
+    # Conversión entre dicts y registros
+
+    def _a_registro(self, pelicula: Dict, pendiente: Optional[_Pendiente] = None) -> RegistroPelicula:
+        """Arma el registro compacto de una película (los campos que falten quedan en None, o pendientes)."""
+        internar = self._cadenas.setdefault   # Así cada género o actor distinto se guarda una sola vez.
+        registro = _nuevo_registro(RegistroPelicula)
+        registro.title = pelicula["title"]
+        registro.year = pelicula.get("year")
+        cast = pelicula.get("cast")
+        registro.cast = tuple([internar(a, a) for a in cast]) if cast else (() if cast is not None else None)
+        genres = pelicula.get("genres")
+        registro.genres = tuple([internar(g, g) for g in genres]) if genres else (() if genres is not None else None)
+        registro.href = pelicula.get("href")
+        extract = pelicula.get("extract")
+        registro.extract = extract.encode("utf-8") if type(extract) is str else extract
+        registro.thumbnail = pelicula.get("thumbnail")
+        registro.thumbnail_width = pelicula.get("thumbnail_width")
+        registro.thumbnail_height = pelicula.get("thumbnail_height")
+        registro.otros = None
+        if not _CAMPOS_CONOCIDOS.issuperset(pelicula):
+            registro.otros = {campo: valor for campo, valor in pelicula.items() if campo not in _CAMPOS_CONOCIDOS}
+        if pendiente is not None:
+            for campo in self._campos_perezosos:
+                if campo not in pelicula:
+                    _asignar(registro, campo, pendiente)
+        return registro
+
+    def _a_dict(self, id_pelicula: int, registro: RegistroPelicula, completa: bool = True) -> Dict:
+        """
+        Arma el dict de una película. Si `completa`, antes carga sus campos perezosos (y los
+        deja cargados en el registro); si no, los que estén pendientes no aparecen en el dict.
+        """
+        if completa and self._campos_perezosos:
+            self._completar(id_pelicula, registro)
+        extract = registro.extract
+        pelicula = {
+            "title": registro.title,
+            "year": registro.year,
+            "cast": list(registro.cast) if registro.cast is not None else None,
+            "genres": list(registro.genres) if registro.genres is not None else None,
+            "href": registro.href,
+            "extract": extract.decode("utf-8") if type(extract) is bytes else extract,
+            "thumbnail": registro.thumbnail,
+            "thumbnail_width": registro.thumbnail_width,
+            "thumbnail_height": registro.thumbnail_height,
+        }
+        if registro.otros:
+            pelicula.update(registro.otros)
+        if not completa and self._campos_perezosos:
+            for campo in self._campos_perezosos:
+                if type(pelicula.get(campo)) is _Pendiente:
+                    del pelicula[campo]
+        return pelicula
+
+    def _textos(self, id_pelicula: int, registro: RegistroPelicula) -> Dict[str, str]:
+        """
+        Textos de la película que van al índice de texto completo. Si el `extract` todavía
+        está pendiente, se lee de los detalles pero NO se guarda en el registro: indexar el
+        catálogo no tiene que dejar cargados todos los campos perezosos.
+        """
+        extract = registro.extract
+        if type(extract) is _Pendiente:
+            extract = extract.detalles(id_pelicula).get("extract")
+        return {
+            "title": registro.title,
+            "cast": "\n".join(registro.cast or ()),
+            "extract": extract.decode("utf-8") if type(extract) is bytes else extract,
+        }
+
+    def _completar(self, id_pelicula: int, registro: RegistroPelicula) -> None:
+        """Carga los campos perezosos pendientes del registro (si tiene)."""
+        pendiente = _pendiente_de(registro)
+        if pendiente is not None:
+            # Las películas cargadas con `cargar` recibieron los ids 0, 1, 2...: el id es su posición.
+            # Si dos hilos la completan a la vez, ambos escriben los mismos valores.
+            for campo, detalle in pendiente.detalles(id_pelicula).items():
+                _asignar(registro, campo, detalle)
+
+    # Mantenimiento interno de los índices
+
+    def _notificar(self, anterior: Optional[Dict], nueva: Optional[Dict]) -> None:
+        if self._retenidas is not None:
+            for suscriptor in self._suscriptores:
+                if suscriptor == self._no_retenido:
+                    suscriptor(anterior, nueva)
+            self._retenidas.append((anterior, nueva))
+            return
+        for suscriptor in self._suscriptores:
+            suscriptor(anterior, nueva)
+
+    def _insertar(self, registro: RegistroPelicula) -> int:
+        id_pelicula = self._siguiente_id
+        self._siguiente_id += 1
+        self._peliculas[id_pelicula] = registro
+        _agregar_titulo(self._por_titulo, normalizar_titulo(registro.title), id_pelicula)
+        self._indexar_secundarios(id_pelicula, registro)
+        return id_pelicula
+
+    def _indexar_en_bloque(self, peliculas: Iterable[Dict], pendiente: Optional[_Pendiente]) -> None:
+        """
+        Igual que llamar a `_insertar` con cada película, pero pensado para la carga inicial:
+        sin llamadas por película y normalizando cada género o actor distinto una sola vez
+        (el dataset los repite muchísimo).
+        """
+        por_titulo, por_anio, por_genero, por_actor = self._por_titulo, self._por_anio, self._por_genero, self._por_actor
+        a_registro = self._a_registro
+        normalizados: Dict[str, str] = {}
+        id_pelicula = self._siguiente_id - 1
+        for id_pelicula, pelicula in enumerate(peliculas, self._siguiente_id):
+            registro = self._peliculas[id_pelicula] = a_registro(pelicula, pendiente)
+            titulo = normalizar_titulo(registro.title)
+            if titulo in por_titulo:
+                _agregar_titulo(por_titulo, titulo, id_pelicula)
+            else:
+                por_titulo[titulo] = id_pelicula
+            anio = registro.year
+            if anio is not None:
+                _agregar_id(por_anio, anio, id_pelicula)
+            for indice, valores in ((por_genero, registro.genres), (por_actor, registro.cast)):
+                if not valores:
+                    continue
+                for valor in valores:
+                    clave = normalizados.get(valor)
+                    if clave is None:
+                        clave = normalizados[valor] = normalizar_texto(valor)
+                    if clave in indice:
+                        _agregar_id(indice, clave, id_pelicula)
+                    else:
+                        indice[clave] = id_pelicula
+        self._siguiente_id = id_pelicula + 1
+
+    def _claves_secundarias(self, registro: RegistroPelicula):
+        """Devuelve pares (índice, clave) en los que aparece la película."""
+        if registro.year is not None:
+            yield self._por_anio, registro.year
+        for genero in set(map(normalizar_texto, registro.genres or ())):
+            yield self._por_genero, genero
+        for actor in set(map(normalizar_texto, registro.cast or ())):
+            yield self._por_actor, actor
+
+    def _indexar_secundarios(self, id_pelicula: int, registro: RegistroPelicula) -> None:
+        for indice, clave in self._claves_secundarias(registro):
+            _agregar_id(indice, clave, id_pelicula)
+        if self._orden_titulo is not None:
+            self._orden_titulo.agregar(self._clave_de_orden("title", id_pelicula, registro))
+            self._orden_anio.agregar(self._clave_de_orden("year", id_pelicula, registro))
+        if self._busqueda is not None:
+            self._busqueda.agregar(id_pelicula, self._textos(id_pelicula, registro))
+        elif self._tocados_durante_busqueda is not None:
+            self._tocados_durante_busqueda.add(id_pelicula)
+
+    def _desindexar_secundarios(self, id_pelicula: int, registro: RegistroPelicula) -> None:
+        for indice, clave in self._claves_secundarias(registro):
+            _quitar_id(indice, clave, id_pelicula)
+        if self._orden_titulo is not None:
+            self._orden_titulo.quitar(self._clave_de_orden("title", id_pelicula, registro))
+            self._orden_anio.quitar(self._clave_de_orden("year", id_pelicula, registro))
+        if self._busqueda is not None:
+            self._busqueda.quitar(id_pelicula, self._textos(id_pelicula, registro))
+        elif self._tocados_durante_busqueda is not None:
+            self._tocados_durante_busqueda.add(id_pelicula)
+
+    def _ids_en_rango_de_anios(self, desde: Optional[int], hasta: Optional[int]) -> Set[int]:
+        """Une los conjuntos de los años dentro de [desde, hasta] (recorre años distintos, no películas)."""
+        ids: Set[int] = set()
+        for anio, ids_anio in self._por_anio.items():
+            if (desde is None or anio >= desde) and (hasta is None or anio <= hasta):
+                ids.update(_ids_de(ids_anio))
+        return ids
+
+    # Índices ordenados
+
+    def _preparar_ordenes(self) -> None:
+        """
+        Arma los índices ordenados si todavía no existen (con el lock tomado: con el catálogo
+        entero es ordenar dos listas de tuplas, bastante menos que el índice de texto completo).
+        Las claves comparten los strings de los títulos con `_por_titulo`.
+        """
+        if self._orden_titulo is not None:
+            return
+        por_titulo, por_anio = [], []
+        for titulo, ids in self._por_titulo.items():
+            for id_pelicula in _ids_de(ids):
+                anio = self._peliculas[id_pelicula].year
+                por_titulo.append((titulo, id_pelicula))
+                por_anio.append((_SIN_ANIO if anio is None else anio, titulo, id_pelicula))
+        self._orden_titulo, self._orden_anio = ListaOrdenada(por_titulo), ListaOrdenada(por_anio)
+
+    def _clave_de_orden(self, orden: str, id_pelicula: int, registro: RegistroPelicula) -> Tuple:
+        titulo = normalizar_titulo(registro.title)
+        if orden == "title":
+            return (titulo, id_pelicula)
+        return (_SIN_ANIO if registro.year is None else registro.year, titulo, id_pelicula)
+
+    def _claves_con_prefijo(self, prefijo: str) -> Iterator[Tuple]:
+        """Claves del índice por título cuyos títulos empiezan con `prefijo`, en orden."""
+        self._preparar_ordenes()
+        prefijo = normalizar_titulo(prefijo)
+        return self._orden_titulo.rango((prefijo,), _siguiente_prefijo(prefijo))
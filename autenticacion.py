@@ -0,0 +1,152 @@
+# AUTENTICACIÓN: CLAVES CON HASH Y TOKENS FIRMADOS
+
+# Las claves de los usuarios no se guardan en texto plano sino como un hash PBKDF2 con sal
+# (verificar una cuesta a propósito unas décimas de segundo, para que probar claves por
+# fuerza bruta sea caro). Para no pagar ese costo en cada petición:
+#   - `POST /auth/token` verifica la clave una vez y entrega un token firmado con HMAC que
+#     vence a los pocos minutos. Verificar el token es recalcular la firma y mirar la fecha:
+#     no hace falta buscar al usuario ni volver a verificar la clave.
+#   - Con HTTP Basic, el resultado de verificar cada usuario+clave se recuerda un rato, así
+#     que un cliente que manda las mismas credenciales en cada petición tampoco paga el hash.
+#
+# El secreto con el que se firman los tokens tiene que ser el mismo en todos los workers (ver
+# `secreto_compartido`); si cambia, los tokens emitidos antes dejan de valer.
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+ITERACIONES_HASH = 600_000       # Iteraciones de PBKDF2-SHA256 (lo que recomienda OWASP).
+DURACION_TOKEN = 15 * 60         # Segundos que vale un token.
+DURACION_VERIFICACION = 5 * 60   # Segundos que se recuerda que un usuario+clave de HTTP Basic es correcto.
+MAX_VERIFICACIONES = 10_000      # Credenciales verificadas que se recuerdan como mucho.
+
+
+
+# CLAVES CON HASH
+
+def hashear_clave(clave: str, iteraciones: int = ITERACIONES_HASH) -> str:
+    """Hash con sal para guardar en la tabla de usuarios: "pbkdf2_sha256$iteraciones$sal$hash"."""
+    sal = secrets.token_bytes(16)
+    resumen = hashlib.pbkdf2_hmac("sha256", clave.encode("utf-8"), sal, iteraciones)
+    return f"pbkdf2_sha256${iteraciones}${_b64(sal)}${_b64(resumen)}"
+
+def clave_coincide(clave: str, guardada: str) -> bool:
+    """Compara una clave con su hash guardado (en tiempo constante)."""
+    try:
+        algoritmo, iteraciones, sal, resumen = guardada.split("$")
+        if algoritmo != "pbkdf2_sha256":
+            return False
+        calculado = hashlib.pbkdf2_hmac("sha256", clave.encode("utf-8"), _desde_b64(sal), int(iteraciones))
+    except ValueError:
+        return False  # Hash mal formado.
+    return hmac.compare_digest(calculado, _desde_b64(resumen))
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+def _desde_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+# Hash con el que se compara cuando el usuario no existe: así tarda lo mismo que una clave incorrecta.
+HASH_DE_RELLENO = f"pbkdf2_sha256${ITERACIONES_HASH}${_b64(bytes(16))}${_b64(bytes(32))}"
+
+
+
+# SECRETO DE LOS TOKENS
+
+def secreto_compartido(ruta: str) -> bytes:
+    """
+    Lee el secreto de `ruta`, o lo crea si no existe. Con varios workers, el primero que
+    arranca lo crea (O_EXCL: no lo pueden crear dos) y los demás leen el mismo.
+    """
+    try:
+        fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(100):
+            with open(ruta, "rb") as f:
+                secreto = f.read()
+            if secreto:
+                return secreto
+            time.sleep(0.01)  # Otro worker lo acaba de crear y todavía no lo escribió.
+        raise RuntimeError(f"El archivo del secreto de los tokens está vacío: {ruta}")
+    secreto = secrets.token_bytes(32)
+    with os.fdopen(fd, "wb") as f:
+        f.write(secreto)
+    return secreto
+
+
+
+# AUTENTICADOR
+
+class Autenticador:
+    """
+    Verifica usuario+clave contra `usuarios` (nombre -> hash de `hashear_clave`) y emite y
+    verifica tokens. `usuarios` se consulta en cada verificación que no está recordada, así
+    que se pueden agregar usuarios sin recrear el autenticador.
+
+    Un usuario borrado (o con la clave cambiada) puede seguir entrando hasta que vencen sus
+    tokens y su verificación recordada: como mucho `duracion_token` segundos.
+    """
+
+    def __init__(self, usuarios: Dict[str, str], secreto: bytes, duracion_token: int = DURACION_TOKEN,
+                 duracion_verificacion: int = DURACION_VERIFICACION, max_verificaciones: int = MAX_VERIFICACIONES,
+                 reloj: Callable[[], float] = time.time):
+        self.usuarios = usuarios
+        self.secreto = secreto
+        self.duracion_token = duracion_token
+        self.duracion_verificacion = duracion_verificacion
+        self.max_verificaciones = max_verificaciones
+        self.reloj = reloj
+        self._lock = threading.Lock()
+        # HMAC de usuario+clave -> (usuario, vencimiento). Se guarda el HMAC y no la clave.
+        self._verificadas: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+
+    # Usuario y clave
+
+    def verificar_clave(self, usuario: str, clave: str) -> bool:
+        huella = hmac.new(self.secreto, f"{usuario}\0{clave}".encode("utf-8"), hashlib.sha256).digest()
+        ahora = self.reloj()
+        with self._lock:
+            recordada = self._verificadas.get(huella)
+            if recordada is not None and recordada[1] > ahora:
+                return True
+        guardada = self.usuarios.get(usuario)
+        if not clave_coincide(clave, guardada or HASH_DE_RELLENO) or guardada is None:
+            return False  # Las claves incorrectas no se recuerdan: cada intento paga el hash.
+        with self._lock:
+            self._verificadas[huella] = (usuario, ahora + self.duracion_verificacion)
+            self._verificadas.move_to_end(huella)
+            while len(self._verificadas) > self.max_verificaciones:
+                self._verificadas.popitem(last=False)
+        return True
+
+    # Tokens
+
+    def emitir_token(self, usuario: str) -> str:
+        """Token "datos.firma": los datos (usuario y vencimiento) en base64 y su HMAC-SHA256."""
+        datos = _b64(json.dumps({"sub": usuario, "exp": int(self.reloj()) + self.duracion_token}).encode("utf-8"))
+        return f"{datos}.{self._firmar(datos)}"
+
+    def verificar_token(self, token: str) -> Optional[str]:
+        """El usuario del token, o None si la firma no coincide o ya venció."""
+        datos, _, firma = token.partition(".")
+        if not firma or not hmac.compare_digest(firma.encode("utf-8"), self._firmar(datos).encode("ascii")):
+            return None
+        try:
+            contenido = json.loads(_desde_b64(datos))
+        except ValueError:
+            return None
+        if contenido.get("exp", 0) <= self.reloj():
+            return None
+        return contenido.get("sub")
+
+    def _firmar(self, datos: str) -> str:
+        return _b64(hmac.new(self.secreto, datos.encode("ascii", errors="replace"), hashlib.sha256).digest())
@@ -0,0 +1,775 @@
+# BENCHMARKS DE LA API DE PELÍCULAS
+
+# Script para medir el rendimiento del servidor sin depender de la red ni del
+# archivo `movies.json`: genera un catálogo sintético y llama a la app en proceso.
+#
+# Uso:
+#   python benchmarks.py titulo --tamanios 36000 1000000 --peticiones 200
+#   python benchmarks.py limitador --ips 10000 1000000
+#   python benchmarks.py limitador-procesos --procesos 4 --segundos 3
+#   python benchmarks.py almacen-procesos --procesos 4 --altas 500
+#   python benchmarks.py arranque --tamanios 36000 1000000
+#   python benchmarks.py memoria --tamanios 36000 1000000
+#   python benchmarks.py busqueda --tamanios 36000 1000000 --peticiones 200
+#   python benchmarks.py lote --cantidad 100000 --backend diario
+#   python benchmarks.py estadisticas --tamanios 36000 1000000 --peticiones 50
+#   python benchmarks.py escrituras --peticiones 500 --fsync siempre
+#   python benchmarks.py autenticacion --peticiones 1000
+#   python benchmarks.py serializacion --tamanios 36000 1000000 --repeticiones 5
+#   python benchmarks.py orden --tamanios 36000 1000000 --peticiones 200
+#   python benchmarks.py sincronizacion --tamanios 36000 1000000 --cambios 100
+
+import argparse
+import gc
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import statistics
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+import main
+from almacen import AlmacenPeliculas, PeliculaDuplicada, normalizar_texto
+from limitador import BackendMemoria, BackendSQLite, LimitadorTokenBucket, ReglaDeLimite
+from json_rapido import orjson
+from persistencia import DiarioCompartido, DiarioDeCambios, cargar_snapshot, escribir_snapshot, serializar_snapshot
+
+
+
+# DATOS SINTÉTICOS
+
+GENEROS = ["Drama", "Comedy", "Action", "Horror", "Romance", "Thriller", "Western",
+           "Science Fiction", "Animated", "Documentary", "Musical", "Crime", "War"]
+
+def generar_peliculas(cantidad: int, semilla: int = 42) -> List[Dict]:
+    """Genera `cantidad` películas con la misma forma que las del dataset de Wikipedia."""
+    rnd = random.Random(semilla)
+    actores = [f"Actor {i}" for i in range(max(100, cantidad // 4))]
+    peliculas = []
+    for i in range(cantidad):
+        peliculas.append({
+            "title": f"Pelicula Sintetica {i}",
+            "year": rnd.randint(1900, 2025),
+            "cast": rnd.sample(actores, rnd.randint(0, 4)),
+            "genres": rnd.sample(GENEROS, rnd.randint(1, 2)),
+            "href": f"Pelicula_Sintetica_{i}",
+            "extract": f"Pelicula Sintetica {i} es una película de prueba generada para los benchmarks.",
+            "thumbnail": None,
+            "thumbnail_width": None,
+            "thumbnail_height": None,
+        })
+    return peliculas
+
+
+
+# UTILIDADES DE MEDICIÓN
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil `p` (0-100) por el método del vecino más cercano."""
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+def medir(funcion: Callable[[], object], repeticiones: int) -> List[float]:
+    """Ejecuta `funcion` varias veces y devuelve la duración de cada llamada en milisegundos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+def imprimir_fila(nombre: str, tiempos: List[float]) -> None:
+    print(f"  {nombre:<28} p50={percentil(tiempos, 50):9.3f} ms   p99={percentil(tiempos, 99):9.3f} ms"
+          f"   media={statistics.mean(tiempos):9.3f} ms")
+
+CREDENCIALES = ("admin", "supersecret")  # Usuario de ejemplo de `main.USUARIOS_DB`.
+
+def cliente_sin_limite() -> TestClient:
+    """TestClient de la app real con el limitador de tasa desactivado (si no, todo sería 429)."""
+    main.limitador = LimitadorTokenBucket([], ReglaDeLimite("sin-limite", 1e12, 10**12))
+    return TestClient(main.app)
+
+
+
+# BENCHMARK: BÚSQUEDA POR TÍTULO
+
+def app_busqueda_lineal(peliculas: List[Dict]) -> FastAPI:
+    """Reproduce el endpoint `/movies/{title}` anterior, que recorría toda la lista."""
+    app_antes = FastAPI()
+
+    @app_antes.get("/movies/{title}", response_model=main.Movie)
+    def get_movie_by_title(title: str):
+        for movie in peliculas:
+            if movie["title"].lower() == title.lower():
+                return movie
+        raise HTTPException(status_code=404, detail="Película no encontrada")
+
+    return app_antes
+
+def benchmark_titulo(tamanios: List[int], peticiones: int) -> None:
+    print("GET /movies/{title} (títulos aleatorios del catálogo)")
+    for tamanio in tamanios:
+        peliculas = generar_peliculas(tamanio)
+        main.movies_db.cargar(peliculas)
+        titulos = [random.choice(peliculas)["title"] for _ in range(peticiones)]
+
+        print(f"\n{tamanio} películas:")
+        for nombre, cliente in (("antes (lista + .lower())", TestClient(app_busqueda_lineal(peliculas))),
+                                ("después (índice por título)", cliente_sin_limite())):
+            pendientes = iter(titulos)
+            tiempos = medir(lambda: cliente.get(f"/movies/{next(pendientes)}"), peticiones)
+            imprimir_fila(nombre, tiempos)
+
+
+
+# BENCHMARK: LIMITADOR DE TASA
+
+class LimitadorVentanaDeslizante:
+    """Reproduce el limitador anterior: un deque de datetimes por IP, sin descartar nunca IPs."""
+
+    def __init__(self, max_peticiones: int = 10, ventana: timedelta = timedelta(seconds=1)):
+        self.max_peticiones = max_peticiones
+        self.ventana = ventana
+        self.historial: Dict[str, deque] = {}
+
+    def __len__(self) -> int:
+        return len(self.historial)
+
+    def consumir(self, ip: str, metodo: str, ruta: str) -> bool:
+        ahora = datetime.utcnow()
+        historial_ip = self.historial.setdefault(ip, deque())
+        while historial_ip and (ahora - historial_ip[0]) > self.ventana:
+            historial_ip.popleft()
+        if len(historial_ip) >= self.max_peticiones:
+            return False
+        historial_ip.append(ahora)
+        return True
+
+def benchmark_limitador(cantidades_ips: List[int], vueltas: int) -> None:
+    print("Costo por petición del limitador (sin HTTP) y memoria de su estado")
+    for cantidad in cantidades_ips:
+        ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(cantidad)]
+        print(f"\n{cantidad} IPs distintas, {vueltas} peticiones por IP:")
+        for nombre, crear in (("antes (deque de datetime)", LimitadorVentanaDeslizante),
+                              ("después (token bucket)", lambda: LimitadorTokenBucket(
+                                  main.limitador.reglas, main.limitador.regla_por_defecto,
+                                  BackendMemoria(main.MAX_IPS_LIMITADOR)))):
+            limitador = crear()
+            inicio = time.perf_counter()
+            for _ in range(vueltas):
+                for ip in ips:
+                    limitador.consumir(ip, "GET", "/movies/count")
+            ns_por_peticion = (time.perf_counter() - inicio) / (cantidad * vueltas) * 1e9
+
+            # Segunda pasada, aparte, para medir memoria sin que tracemalloc afecte los tiempos.
+            limitador = crear()
+            tracemalloc.start()
+            for _ in range(vueltas):
+                for ip in ips:
+                    limitador.consumir(ip, "GET", "/movies/count")
+            memoria = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f"  {nombre:<28} {ns_por_peticion:8.0f} ns/petición   estado: {len(limitador):>8} entradas, "
+                  f"{memoria / 2**20:8.1f} MB")
+
+
+
+def _martillar_limitador(backend: str, archivo: str, segundos: float, cola) -> None:
+    """Proceso hijo: hace peticiones con la misma IP durante `segundos` y reporta cuántas se permitieron."""
+    regla = ReglaDeLimite("lectura", main.MAX_PETICIONES, main.MAX_PETICIONES)
+    if backend == "sqlite":
+        limitador = LimitadorTokenBucket([], regla, BackendSQLite(archivo), reloj=time.time)
+    else:
+        limitador = LimitadorTokenBucket([], regla, BackendMemoria())
+    permitidas = total = 0
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        permitidas += limitador.consumir("192.168.0.10", "GET", "/movies/count").permitido
+        total += 1
+    cola.put((permitidas, total))
+
+def benchmark_limitador_procesos(procesos: int, segundos: float) -> None:
+    """
+    Simula `uvicorn --workers N`: varios procesos aplican el límite a la misma IP a la vez.
+    Con el backend compartido, el total permitido tiene que ser el de un solo proceso.
+    """
+    esperadas = main.MAX_PETICIONES + main.MAX_PETICIONES * segundos
+    print(f"{procesos} procesos, misma IP, {segundos:g} s. Permitidas esperadas con un límite correcto: ~{esperadas:g}")
+    for backend in ("memoria", "sqlite"):
+        with tempfile.TemporaryDirectory() as carpeta:
+            archivo = os.path.join(carpeta, "limitador.sqlite3")
+            if backend == "sqlite":
+                BackendSQLite(archivo)._conectar()  # Crea la tabla antes de que arranquen los procesos.
+            cola = multiprocessing.Queue()
+            hijos = [multiprocessing.Process(target=_martillar_limitador, args=(backend, archivo, segundos, cola))
+                     for _ in range(procesos)]
+            for hijo in hijos:
+                hijo.start()
+            resultados = [cola.get() for _ in hijos]
+            for hijo in hijos:
+                hijo.join()
+        permitidas = sum(r[0] for r in resultados)
+        total = sum(r[1] for r in resultados)
+        print(f"  {backend:<8} permitidas={permitidas:>6}   peticiones={total:>8}   "
+              f"costo medio={segundos * procesos / total * 1e6:7.1f} us/petición")
+
+
+
+# BENCHMARK: ALMACÉN COMPARTIDO ENTRE PROCESOS
+
+def _escribir_en_almacen(carpeta: str, altas: int, cola) -> None:
+    """Proceso hijo: intenta crear las mismas `altas` películas que los demás procesos y reporta qué vio."""
+    almacen = AlmacenPeliculas()
+    diario = DiarioCompartido(almacen, os.path.join(carpeta, "movies.json"), os.path.join(carpeta, "movies.sqlite3"),
+                              cambios_para_compactar=100)
+    diario.recuperar()
+    creadas = 0
+    inicio = time.perf_counter()
+    for i in range(altas):
+        diario.sincronizar()
+        try:
+            with diario.escritura():
+                almacen.agregar({**generar_peliculas(1)[0], "title": f"Pelicula Compartida {i}"})
+            creadas += 1
+        except PeliculaDuplicada:
+            pass
+    segundos = time.perf_counter() - inicio
+    time.sleep(0.5)  # Deja terminar a los demás procesos antes de mirar el resultado final.
+    diario.sincronizar()
+    cola.put((creadas, len(almacen), segundos))
+    diario.cerrar()
+
+def benchmark_almacen_procesos(procesos: int, altas: int, catalogo: int) -> None:
+    """
+    Simula `uvicorn --workers N` con ALMACEN_BACKEND=sqlite: todos los procesos intentan
+    crear los mismos títulos. Cada título tiene que crearse una sola vez, y al final todos
+    los procesos tienen que ver el mismo catálogo.
+    """
+    print(f"{procesos} procesos intentando crear las mismas {altas} películas sobre un catálogo de {catalogo}")
+    with tempfile.TemporaryDirectory() as carpeta:
+        with open(os.path.join(carpeta, "movies.json"), "wb") as f:
+            f.write(serializar_snapshot(generar_peliculas(catalogo)))
+        cola = multiprocessing.Queue()
+        hijos = [multiprocessing.Process(target=_escribir_en_almacen, args=(carpeta, altas, cola))
+                 for _ in range(procesos)]
+        for hijo in hijos:
+            hijo.start()
+        resultados = [cola.get() for _ in hijos]
+        for hijo in hijos:
+            hijo.join()
+    creadas = sum(r[0] for r in resultados)
+    tamanios = sorted({r[1] for r in resultados})
+    print(f"  creadas={creadas} (esperadas {altas})   tamaño visto por cada proceso={tamanios} "
+          f"(esperado {catalogo + altas})")
+    print(f"  escrituras intentadas por segundo (todos los procesos): "
+          f"{procesos * altas / max(r[2] for r in resultados):8.0f}")
+
+
+
+# BENCHMARK: ARRANQUE (CARGA DEL SNAPSHOT)
+
+def benchmark_arranque(tamanios: List[int], repeticiones: int) -> None:
+    """Tiempo de cargar el catálogo en el almacén desde `movies.json` y desde el snapshot binario."""
+    print("Carga del catálogo al arrancar (lectura del archivo + armado del almacén y sus índices)")
+    for tamanio in tamanios:
+        with tempfile.TemporaryDirectory() as carpeta:
+            peliculas = generar_peliculas(tamanio)
+            rutas = {"json": os.path.join(carpeta, "movies.json"), "binario": os.path.join(carpeta, "movies.bin")}
+            for ruta in rutas.values():
+                escribir_snapshot(ruta, peliculas)
+            del peliculas
+
+            print(f"\n{tamanio} películas:")
+            for nombre, ruta in rutas.items():
+                almacen = AlmacenPeliculas()
+                tiempos = []
+                for _ in range(repeticiones):
+                    almacen.cargar([])
+                    gc.collect()
+                    tiempos.extend(medir(lambda: cargar_snapshot(almacen, ruta), 1))
+                # Con el binario, la primera lectura completa de cada película decodifica sus detalles.
+                primera = medir(lambda: list(almacen), 1)[0]
+                print(f"  {nombre:<8} {os.path.getsize(ruta) / 2**20:7.1f} MB   carga: mejor={min(tiempos):8.1f} ms"
+                      f"   media={statistics.mean(tiempos):8.1f} ms   recorrer todo completo después: {primera:8.1f} ms")
+
+
+
+# BENCHMARK: MEMORIA DEL CATÁLOGO
+
+def peliculas_con_textos(cantidad: int) -> List[Dict]:
+    """Como `generar_peliculas`, pero con `extract` y `thumbnail` del largo que tienen en el dataset real."""
+    peliculas = generar_peliculas(cantidad)
+    for i, pelicula in enumerate(peliculas):
+        pelicula["extract"] = (f"{pelicula['title']} es una película estadounidense de {pelicula['year']}, "
+                               f"dirigida por Director {i % 5000}. " * 4)[:380] + " Protagonizada por Añá Pérez."
+        pelicula["thumbnail"] = f"https://upload.wikimedia.org/wikipedia/en/{i % 16:x}/{i % 256:02x}/Poster_{i}.jpg"
+        pelicula["thumbnail_width"], pelicula["thumbnail_height"] = 220, 326
+    return peliculas
+
+def rss_actual() -> int:
+    """Memoria residente actual del proceso en bytes (el máximo alcanzado si no hay /proc)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _medir_memoria(forma: str, ruta: str, con_tracemalloc: bool, cola) -> None:
+    """Proceso hijo (arranca limpio): carga el catálogo de una forma y reporta cuánta memoria quedó ocupada."""
+    gc.collect()
+    if con_tracemalloc:
+        tracemalloc.start()
+    antes = rss_actual()
+    if forma == "lista de dicts":
+        with open(ruta, "rb") as f:
+            catalogo = json.load(f)  # Como lo tenía el servidor antes del almacén.
+    else:
+        catalogo = AlmacenPeliculas()
+        cargar_snapshot(catalogo, ruta)
+        if forma.endswith("(todo leído)"):
+            for _ in catalogo:
+                pass
+    gc.collect()
+    usada = tracemalloc.get_traced_memory()[0] if con_tracemalloc else rss_actual() - antes
+    cola.put(usada)
+
+def benchmark_memoria(tamanios: List[int]) -> None:
+    print("Memoria ocupada por el catálogo cargado (RSS en un proceso limpio y tracemalloc en otro)")
+    contexto = multiprocessing.get_context("spawn")  # Sin heredar la memoria de este proceso.
+    for tamanio in tamanios:
+        with tempfile.TemporaryDirectory() as carpeta:
+            peliculas = peliculas_con_textos(tamanio)
+            ruta_json, ruta_binario = os.path.join(carpeta, "movies.json"), os.path.join(carpeta, "movies.bin")
+            escribir_snapshot(ruta_json, peliculas)
+            escribir_snapshot(ruta_binario, peliculas)
+            del peliculas
+
+            print(f"\n{tamanio} películas:")
+            for forma, ruta in (("lista de dicts", ruta_json), ("almacén desde JSON", ruta_json),
+                                ("almacén desde binario", ruta_binario),
+                                ("almacén desde binario (todo leído)", ruta_binario)):
+                medidas = []
+                for con_tracemalloc in (False, True):
+                    cola = contexto.Queue()
+                    hijo = contexto.Process(target=_medir_memoria, args=(forma, ruta, con_tracemalloc, cola))
+                    hijo.start()
+                    hijo.join()
+                    # tracemalloc casi duplica la memoria: con catálogos grandes el hijo se puede quedar sin memoria.
+                    medidas.append(cola.get() / 2**20 if hijo.exitcode == 0 else float("nan"))
+                rss, traced = medidas
+                print(f"  {forma:<36} RSS={rss:8.1f} MB   tracemalloc={traced:8.1f} MB"
+                      f"   ({traced * 2**20 / tamanio:6.0f} bytes/película)")
+
+
+
+# BENCHMARK: BÚSQUEDA DE TEXTO COMPLETO
+
+def peliculas_con_palabras(cantidad: int, semilla: int = 7) -> List[Dict]:
+    """
+    Como `generar_peliculas`, pero con títulos y `extract` armados con palabras de un
+    vocabulario donde unas pocas son muy comunes y la mayoría raras (como en un texto real).
+    """
+    rnd = random.Random(semilla)
+    vocabulario = [f"{rnd.choice('bcdfglmnprstv')}{rnd.choice('aeiou')}{i:x}" for i in range(50_000)]
+    acumulados = list(itertools.accumulate(1 / (i + 1) for i in range(len(vocabulario))))
+    palabras = lambda k: rnd.choices(vocabulario, cum_weights=acumulados, k=k)
+    peliculas = generar_peliculas(cantidad)
+    for pelicula in peliculas:
+        pelicula["title"] = " ".join(palabras(3)).title() + f" {pelicula['href'][-6:]}"
+        pelicula["extract"] = f"{pelicula['title']} is a {pelicula['year']} film. " + " ".join(palabras(60))
+    return peliculas
+
+def benchmark_busqueda(tamanios: List[int], peticiones: int) -> None:
+    print("GET /movies/search (dos palabras de un título al azar, o el comienzo de una)")
+    for tamanio in tamanios:
+        peliculas = peliculas_con_palabras(tamanio)
+        # Se arma dos veces: tracemalloc hace todo varias veces más lento, así que el tiempo se mide sin él.
+        main.movies_db.cargar(peliculas)
+        gc.collect()
+        tracemalloc.start()
+        main.movies_db.preparar_busqueda()
+        memoria = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        main.movies_db.cargar(peliculas)
+        inicio = time.perf_counter()
+        main.movies_db.preparar_busqueda()
+        armado = time.perf_counter() - inicio
+        main.movies_db.buscar("x")  # La primera búsqueda por prefijo ordena el vocabulario.
+
+        rnd = random.Random(1)
+        consultas = []
+        for _ in range(peticiones):
+            palabras = rnd.choice(peliculas)["title"].split()
+            consultas.append(" ".join(rnd.sample(palabras, 2)) if rnd.random() < 0.5 else rnd.choice(palabras)[:4])
+
+        def recorrer_todo(consulta: str) -> List[Dict]:
+            """Sin índice: buscar el texto en cada película (y ni siquiera ordena por relevancia)."""
+            consulta = consulta.lower()
+            return [p for p in peliculas if consulta in p["title"].lower() or consulta in p["extract"].lower()][:10]
+
+        print(f"\n{tamanio} películas (índice armado en {armado:.1f} s, {memoria / 2**20:.1f} MB):")
+        pendientes = iter(consultas[:max(1, peticiones // 10)])
+        imprimir_fila("antes (recorrer todo)", medir(lambda: recorrer_todo(next(pendientes)), max(1, peticiones // 10)))
+        cliente = cliente_sin_limite()
+        pendientes = iter(consultas)
+        imprimir_fila("después (índice invertido)",
+                      medir(lambda: cliente.get("/movies/search", params={"q": next(pendientes)}), peticiones))
+
+
+
+# BENCHMARK: ALTAS EN LOTE
+
+def benchmark_lote(cantidad: int, muestra: int, backend: str) -> None:
+    """
+    Importa `cantidad` películas nuevas sobre el catálogo de 36k, con el diario de verdad
+    (en una carpeta temporal) y el índice de búsqueda ya armado, como en el servidor.
+    Las altas de a una se miden con una muestra y se extrapolan.
+    """
+    print(f"Importar {cantidad} películas (diario: {backend})")
+    nuevas = [{**pelicula, "title": f"Importada {i}"} for i, pelicula in enumerate(peliculas_con_textos(cantidad))]
+    autenticacion = CREDENCIALES
+    with tempfile.TemporaryDirectory() as carpeta:
+        escribir_snapshot(os.path.join(carpeta, "movies.bin"), generar_peliculas(36000))
+        if backend == "sqlite":
+            main.diario = DiarioCompartido(main.movies_db, os.path.join(carpeta, "movies.bin"),
+                                           os.path.join(carpeta, "movies.sqlite3"))
+        else:
+            main.diario = DiarioDeCambios(main.movies_db, os.path.join(carpeta, "movies.bin"),
+                                          os.path.join(carpeta, "movies.journal.jsonl"))
+        main.diario.recuperar()
+        main.movies_db.preparar_busqueda()
+        cliente = cliente_sin_limite()
+
+        inicio = time.perf_counter()
+        for pelicula in nuevas[:muestra]:
+            cliente.post("/movies", json=pelicula, auth=autenticacion)
+        de_a_una = (time.perf_counter() - inicio) / muestra
+        print(f"  de a una (POST /movies):         {de_a_una * 1000:8.2f} ms por película"
+              f"   -> {de_a_una * cantidad:8.1f} s para {cantidad}"
+              f" (más el límite de {main.MAX_PETICIONES_ESCRITURA} escrituras/s: {cantidad / main.MAX_PETICIONES_ESCRITURA / 3600:.1f} h)")
+
+        for formato, tipo in (("JSON", "application/json"), ("NDJSON", "application/x-ndjson")):
+            lote = [{**pelicula, "title": f"{pelicula['title']} ({formato})"} for pelicula in nuevas]
+            if formato == "JSON":
+                cuerpo = json.dumps(lote, ensure_ascii=False).encode("utf-8")
+            else:
+                cuerpo = "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in lote).encode("utf-8")
+            inicio = time.perf_counter()
+            respuesta = cliente.post("/movies/bulk", content=cuerpo, headers={"Content-Type": tipo}, auth=autenticacion)
+            segundos = time.perf_counter() - inicio
+            print(f"  en lote (POST /movies/bulk, {formato:<6}) {segundos:8.1f} s para {cantidad}"
+                  f"   aplicadas={respuesta.json()['applied']}   ({cantidad / segundos:8.0f} películas/s)")
+        main.diario.cerrar()
+        main.diario = None
+
+
+
+# BENCHMARK: ESTADÍSTICAS DEL CATÁLOGO
+
+def benchmark_estadisticas(tamanios: List[int], peticiones: int) -> None:
+    """
+    GET /movies/stats sin pasar por el cache de respuestas (se vacía antes de cada petición,
+    como pasaría si hubo una escritura), contra contar todo el catálogo en cada petición.
+    """
+    print("GET /movies/stats (cache de respuestas vacío en cada petición)")
+    for tamanio in tamanios:
+        main.movies_db.cargar(generar_peliculas(tamanio))
+        main.estadisticas.resumen()  # El primer pedido cuenta todo (como después de cada `cargar`).
+
+        def recorrer_todo() -> Dict:
+            """Sin contadores: recorrer todas las películas en cada petición."""
+            anios, generos, actores = Counter(), Counter(), Counter()
+            for pelicula in main.movies_db:
+                anios[pelicula["year"]] += 1
+                generos.update({normalizar_texto(g) for g in pelicula["genres"]})
+                actores.update({normalizar_texto(a) for a in pelicula["cast"]})
+            return {"years": sorted(anios.items()), "genres": generos.most_common(), "top_cast": actores.most_common(10)}
+
+        def pedir_estadisticas() -> object:
+            main.cache_respuestas.limpiar()
+            return cliente.get("/movies/stats")
+
+        print(f"\n{tamanio} películas:")
+        imprimir_fila("antes (recorrer todo)", medir(recorrer_todo, max(1, peticiones // 10)))
+        cliente = cliente_sin_limite()
+        imprimir_fila("después (contadores)", medir(pedir_estadisticas, peticiones))
+
+
+
+# BENCHMARK: LATENCIA DE LAS ESCRITURAS
+
+def benchmark_escrituras(peticiones: int, politica_fsync: str) -> None:
+    """
+    Latencia de PUT /movies/{title}/partial con el diario JSONL de verdad (en una carpeta
+    temporal): escribiendo el diario en la misma petición, o dejándolo al escritor en segundo plano.
+    """
+    print(f"PUT /movies/{{title}}/partial (diario JSONL, fsync: {politica_fsync})")
+    autenticacion = CREDENCIALES
+    for nombre, demora in (("antes (en la petición)", None), ("después (escritor aparte)", main.DEMORA_ESCRITURA)):
+        with tempfile.TemporaryDirectory() as carpeta:
+            escribir_snapshot(os.path.join(carpeta, "movies.bin"), generar_peliculas(36000))
+            main.diario = DiarioDeCambios(main.movies_db, os.path.join(carpeta, "movies.bin"),
+                                          os.path.join(carpeta, "movies.journal.jsonl"),
+                                          politica_fsync=politica_fsync, cambios_para_compactar=10**9,
+                                          demora_escritura=demora)
+            main.diario.recuperar()
+            cliente = cliente_sin_limite()
+            anios = itertools.count(1900)
+            imprimir_fila(nombre, medir(lambda: cliente.put("/movies/Pelicula Sintetica 1/partial",
+                                                           json={"year": next(anios)}, auth=autenticacion), peticiones))
+            main.diario.cerrar()
+            main.diario = None
+
+
+
+# BENCHMARK: AUTENTICACIÓN
+
+def benchmark_autenticacion(peticiones: int) -> None:
+    """
+    GET /auth/test con HTTP Basic verificando el hash de la clave en cada petición, con HTTP
+    Basic recordando la verificación, y con un token de POST /auth/token.
+    """
+    print("GET /auth/test")
+    cliente = cliente_sin_limite()
+    recordar = main.autenticador.duracion_verificacion
+    main.autenticador.duracion_verificacion = 0  # Nada se recuerda (tampoco al pedir el token).
+    token = {"Authorization": "Bearer " + cliente.post("/auth/token", auth=CREDENCIALES).json()["access_token"]}
+    imprimir_fila("Basic (hash cada vez)", medir(lambda: cliente.get("/auth/test", auth=CREDENCIALES), max(1, peticiones // 50)))
+    main.autenticador.duracion_verificacion = recordar
+    imprimir_fila("Basic (recordada)", medir(lambda: cliente.get("/auth/test", auth=CREDENCIALES), peticiones))
+    imprimir_fila("token", medir(lambda: cliente.get("/auth/test", headers=token), peticiones))
+
+
+
+# BENCHMARK: SERIALIZACIÓN DEL CATÁLOGO
+
+def benchmark_serializacion(tamanios: List[int], repeticiones: int) -> None:
+    """
+    Codificar el catálogo entero (lo que devuelve GET /movies sin filtros): validando cada
+    película con el modelo como hacía `response_model`, con `json` compacto y con orjson (si
+    está instalado). Al final, GET /movies de punta a punta con el cache de respuestas vacío.
+    """
+    print("Catálogo entero a JSON (lo que devuelve GET /movies)")
+    adaptador = TypeAdapter(List[main.Movie])
+    formas = [
+        ("antes (validar con Pydantic)", lambda peliculas: adaptador.dump_json(adaptador.validate_python(peliculas))),
+        ("json compacto", lambda peliculas: json.dumps(peliculas, ensure_ascii=False, separators=(",", ":")).encode("utf-8")),
+    ]
+    if orjson is not None:
+        formas.append(("orjson", orjson.dumps))
+    else:
+        print("  (orjson no está instalado: se omite)")
+
+    for tamanio in tamanios:
+        peliculas = generar_peliculas(tamanio)
+        main.movies_db.cargar(peliculas)
+        megabytes = len(json.dumps(peliculas, ensure_ascii=False, separators=(",", ":")).encode("utf-8")) / 1e6
+
+        print(f"\n{tamanio} películas ({megabytes:.1f} MB):")
+        for nombre, codificar in formas:
+            tiempos = medir(lambda: codificar(peliculas), repeticiones)
+            imprimir_fila(nombre, tiempos)
+            print(f"  {'':<28} {megabytes / (statistics.median(tiempos) / 1000):9.1f} MB/s")
+
+        cliente = cliente_sin_limite()
+
+        def pedir_todo() -> object:
+            main.cache_respuestas.limpiar()
+            return cliente.get("/movies")
+
+        imprimir_fila("GET /movies (sin cache)", medir(pedir_todo, repeticiones))
+
+
+
+# BENCHMARK: LISTADOS ORDENADOS
+
+def benchmark_orden(tamanios: List[int], peticiones: int) -> None:
+    """
+    GET /movies con `sort` (primera página de 50, cache de respuestas vacío en cada petición):
+    una década ordenada por año, los títulos que empiezan con un prefijo y el catálogo entero
+    ordenado por título (de mayor a menor). Antes no existía en el servidor: la comparación
+    es con recorrer y ordenar el catálogo entero.
+    """
+    print("GET /movies?sort=... (primera página de 50, cache de respuestas vacío)")
+    for tamanio in tamanios:
+        peliculas = generar_peliculas(tamanio)
+        main.movies_db.cargar(peliculas)
+        gc.collect()
+        tracemalloc.start()
+        main.movies_db.pagina_ordenada("title", cantidad=1)  # Arma los índices ordenados.
+        memoria = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        main.movies_db.cargar(peliculas)
+        inicio = time.perf_counter()
+        main.movies_db.pagina_ordenada("title", cantidad=1)
+        armado = time.perf_counter() - inicio
+
+        rnd = random.Random(3)
+        decadas = [1900 + 10 * rnd.randint(0, 11) for _ in range(peticiones)]
+        prefijos = [f"Pelicula Sintetica {rnd.randint(100, 999)}" for _ in range(peticiones)]
+        consultas = {
+            "década por año": [{"year_from": d, "year_to": d + 9, "sort": "year", "limit": 50} for d in decadas],
+            "prefijo por título": [{"title_prefix": p, "sort": "title", "limit": 50} for p in prefijos],
+            "todo por título": [{"sort": "-title", "limit": 50} for _ in range(peticiones)],
+        }
+
+        def recorrer_todo(params: Dict) -> List[Dict]:
+            """Sin índices: filtrar todo el catálogo y ordenar lo que queda."""
+            if "year_from" not in params and "title_prefix" not in params:
+                return sorted(peliculas, key=lambda p: p["title"].lower(), reverse=True)[:50]
+            if "title_prefix" in params:
+                prefijo = params["title_prefix"].lower()
+                elegidas = [p for p in peliculas if p["title"].lower().startswith(prefijo)]
+                return sorted(elegidas, key=lambda p: p["title"].lower())[:50]
+            elegidas = [p for p in peliculas if params["year_from"] <= p["year"] <= params["year_to"]]
+            return sorted(elegidas, key=lambda p: (p["year"], p["title"].lower()))[:50]
+
+        cliente = cliente_sin_limite()
+
+        def pedir(params: Dict) -> object:
+            main.cache_respuestas.limpiar()
+            return cliente.get("/movies", params=params)
+
+        print(f"\n{tamanio} películas (índices armados en {armado:.2f} s, {memoria / 2**20:.1f} MB):")
+        for nombre, lista in consultas.items():
+            pendientes = iter(lista)
+            imprimir_fila(f"{nombre}: antes", medir(lambda: recorrer_todo(next(pendientes)), max(1, peticiones // 10)))
+            pendientes = iter(lista)
+            imprimir_fila(f"{nombre}: después", medir(lambda: pedir(next(pendientes)), peticiones))
+
+
+
+# BENCHMARK: SINCRONIZACIÓN DE UN CLIENTE
+
+def benchmark_sincronizacion(tamanios: List[int], cambios: int) -> None:
+    """
+    Lo que le cuesta a un cliente ponerse al día después de `cambios` escrituras: volver a
+    descargar GET /movies entero (sin cache de respuestas, que las escrituras invalidan) o
+    pedir solo GET /movies/changes desde la versión que tenía.
+    """
+    print(f"Ponerse al día después de {cambios} cambios")
+    for tamanio in tamanios:
+        main.movies_db.cargar(generar_peliculas(tamanio))
+        cliente = cliente_sin_limite()
+        version = main.feed.version
+        for i in range(cambios):
+            main.movies_db.actualizar(f"Pelicula Sintetica {i}", {**main.movies_db.obtener(f"Pelicula Sintetica {i}"), "year": 1900})
+
+        def descargar_todo() -> object:
+            main.cache_respuestas.limpiar()
+            return cliente.get("/movies")
+
+        def pedir_cambios() -> object:
+            return cliente.get("/movies/changes", params={"since": version})
+
+        print(f"\n{tamanio} películas:")
+        for nombre, pedir, repeticiones in (("antes (GET /movies)", descargar_todo, 3),
+                                            ("después (/movies/changes)", pedir_cambios, 100)):
+            imprimir_fila(nombre, medir(pedir, repeticiones))
+            print(f"  {'':<28} {len(pedir().content) / 1e3:9.1f} kB")
+
+
+
+# PUNTO DE ENTRADA DEL SCRIPT
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de la API de películas.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    p_titulo = subparsers.add_parser("titulo", help="Latencia de GET /movies/{title}.")
+    p_titulo.add_argument("--tamanios", type=int, nargs="+", default=[36000, 1000000])
+    p_titulo.add_argument("--peticiones", type=int, default=200)
+
+    p_limitador = subparsers.add_parser("limitador", help="Costo y memoria del limitador de tasa.")
+    p_limitador.add_argument("--ips", type=int, nargs="+", default=[10000, 1000000])
+    p_limitador.add_argument("--vueltas", type=int, default=3)
+
+    p_procesos = subparsers.add_parser("limitador-procesos", help="Límite por IP con varios procesos a la vez.")
+    p_procesos.add_argument("--procesos", type=int, default=4)
+    p_procesos.add_argument("--segundos", type=float, default=3.0)
+
+    p_almacen = subparsers.add_parser("almacen-procesos", help="Consistencia del almacén compartido entre procesos.")
+    p_almacen.add_argument("--procesos", type=int, default=4)
+    p_almacen.add_argument("--altas", type=int, default=500)
+    p_almacen.add_argument("--catalogo", type=int, default=36000)
+
+    p_arranque = subparsers.add_parser("arranque", help="Carga del snapshot JSON vs. binario.")
+    p_arranque.add_argument("--tamanios", type=int, nargs="+", default=[36000, 1000000])
+    p_arranque.add_argument("--repeticiones", type=int, default=3)
+
+    p_memoria = subparsers.add_parser("memoria", help="Memoria del catálogo cargado.")
+    p_memoria.add_argument("--tamanios", type=int, nargs="+", default=[36000, 1000000])
+
+    p_busqueda = subparsers.add_parser("busqueda", help="Latencia de GET /movies/search.")
+    p_busqueda.add_argument("--tamanios", type=int, nargs="+", default=[36000, 1000000])
+    p_busqueda.add_argument("--peticiones", type=int, default=200)
+
+    p_lote = subparsers.add_parser("lote", help="Importar muchas películas: de a una vs. POST /movies/bulk.")
+    p_lote.add_argument("--cantidad", type=int, default=100_000)
+    p_lote.add_argument("--muestra", type=int, default=500)
+    p_lote.add_argument("--backend", choices=["diario", "sqlite"], default="diario")
+
+    p_estadisticas = subparsers.add_parser("estadisticas", help="Latencia de GET /movies/stats.")
+    p_estadisticas.add_argument("--tamanios", type=int, nargs="+", default=[36000, 1000000])
+    p_estadisticas.add_argument("--peticiones", type=int, default=50)
+
+    p_escrituras = subparsers.add_parser("escrituras", help="Latencia de las escrituras con y sin el escritor del diario aparte.")
+    p_escrituras.add_argument("--peticiones", type=int, default=500)
+    p_escrituras.add_argument("--fsync", choices=["siempre", "intervalo", "nunca"], default="siempre")
+
+    p_autenticacion = subparsers.add_parser("autenticacion", help="Costo de verificar HTTP Basic vs. un token.")
+    p_autenticacion.add_argument("--peticiones", type=int, default=1000)
+
+    p_serializacion = subparsers.add_parser("serializacion", help="Codificar el catálogo entero a JSON.")
+    p_serializacion.add_argument("--tamanios", type=int, nargs="+", default=[36000, 1000000])
+    p_serializacion.add_argument("--repeticiones", type=int, default=5)
+
+    p_orden = subparsers.add_parser("orden", help="Latencia de GET /movies con sort y filtros por rango o prefijo.")
+    p_orden.add_argument("--tamanios", type=int, nargs="+", default=[36000, 1000000])
+    p_orden.add_argument("--peticiones", type=int, default=200)
+
+    p_sincronizacion = subparsers.add_parser("sincronizacion", help="Ponerse al día: descargar todo vs. GET /movies/changes.")
+    p_sincronizacion.add_argument("--tamanios", type=int, nargs="+", default=[36000, 1000000])
+    p_sincronizacion.add_argument("--cambios", type=int, default=100)
+
+    args = parser.parse_args()
+    if args.benchmark == "titulo":
+        benchmark_titulo(args.tamanios, args.peticiones)
+    elif args.benchmark == "limitador":
+        benchmark_limitador(args.ips, args.vueltas)
+    elif args.benchmark == "limitador-procesos":
+        benchmark_limitador_procesos(args.procesos, args.segundos)
+    elif args.benchmark == "almacen-procesos":
+        benchmark_almacen_procesos(args.procesos, args.altas, args.catalogo)
+    elif args.benchmark == "arranque":
+        benchmark_arranque(args.tamanios, args.repeticiones)
+    elif args.benchmark == "memoria":
+        benchmark_memoria(args.tamanios)
+    elif args.benchmark == "busqueda":
+        benchmark_busqueda(args.tamanios, args.peticiones)
+    elif args.benchmark == "lote":
+        benchmark_lote(args.cantidad, args.muestra, args.backend)
+    elif args.benchmark == "estadisticas":
+        benchmark_estadisticas(args.tamanios, args.peticiones)
+    elif args.benchmark == "escrituras":
+        benchmark_escrituras(args.peticiones, args.fsync)
+    elif args.benchmark == "autenticacion":
+        benchmark_autenticacion(args.peticiones)
+    elif args.benchmark == "serializacion":
+        benchmark_serializacion(args.tamanios, args.repeticiones)
+    elif args.benchmark == "orden":
+        benchmark_orden(args.tamanios, args.peticiones)
+    elif args.benchmark == "sincronizacion":
+        benchmark_sincronizacion(args.tamanios, args.cambios)
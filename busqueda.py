@@ -0,0 +1,187 @@
+# BÚSQUEDA DE TEXTO COMPLETO
+
+# Índice invertido para `GET /movies/search`: cada palabra apunta a la lista ordenada de
+# documentos (ids de películas) en los que aparece, con cuántas veces aparece en cada uno.
+# Buscar cuesta lo que miden las listas de las palabras de la consulta, no el catálogo.
+#
+#   - Las palabras se pasan a minúsculas y sin tildes ("Pérez" y "perez" son lo mismo).
+#   - El título pesa más que el reparto, y el reparto más que el `extract` (cada aparición
+#     en el título cuenta como 3 en el `extract`). Los resultados se ordenan con BM25.
+#   - La última palabra de la consulta también se busca como prefijo, para autocompletar
+#     mientras se escribe ("matr" encuentra "matrix").
+#   - Las listas de ids se guardan en `array` (4 bytes por id, 2 por frecuencia) y no en
+#     sets: el `extract` agrega unas 60 palabras por película.
+
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+PESOS_CAMPOS = {"title": 3, "cast": 2, "extract": 1}   # Cuánto cuenta cada aparición de una palabra según el campo.
+
+# Parámetros de BM25: cuánto satura repetir una palabra (K1) y cuánto se penalizan los documentos largos (B).
+K1 = 1.2
+B = 0.75
+
+MAX_EXPANSIONES_PREFIJO = 30   # Palabras completas que se prueban como mucho para el prefijo (las más frecuentes).
+PESO_PREFIJO = 0.5             # Las palabras que solo completan el prefijo valen menos que la escrita tal cual.
+# Postings que se recorren como mucho por consulta. Las palabras se procesan de la menos
+# frecuente a la más frecuente, y las que ya no entran en el presupuesto se ignoran: son
+# palabras comunes ("film", "the") que casi no cambian el orden. La primera siempre se procesa.
+PRESUPUESTO_POSTINGS = 20_000
+
+_PALABRA = re.compile(r"\w+")
+_DIACRITICOS = re.compile("[\u0300-\u036f]")   # Marcas que deja NFKD al separar las tildes
+
+
+
+# NORMALIZACIÓN DEL TEXTO
+
+def plegar(texto: str) -> str:
+    """Pasa el texto a minúsculas y le saca las tildes y diéresis ("Añá" -> "ana")."""
+    texto = texto.casefold()
+    if texto.isascii():
+        return texto
+    return _DIACRITICOS.sub("", unicodedata.normalize("NFKD", texto))
+
+def tokenizar(texto: str) -> List[str]:
+    """Palabras del texto ya normalizadas, en orden (con repeticiones)."""
+    return _PALABRA.findall(plegar(texto))
+
+
+
+# ÍNDICE INVERTIDO
+
+class IndiceTextual:
+    """
+    Índice invertido sobre documentos identificados por un int (el id interno del almacén).
+    Cada documento es un dict `campo -> texto`. No es seguro usarlo desde varios hilos:
+    el almacén lo usa con su lock tomado.
+
+    Para sacar un documento hay que pasar los mismos textos con los que se agregó (el
+    índice no los guarda, para no duplicar el `extract` de todo el catálogo).
+    """
+
+    def __init__(self):
+        # palabra -> (ids ordenados, frecuencia ponderada de la palabra en cada uno)
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._largos = array("I")       # id -> largo ponderado del documento (0 si no está)
+        self._documentos = 0
+        self._largo_total = 0
+        # Vocabulario ordenado, para buscar prefijos. Se arma recién con la primera búsqueda
+        # por prefijo (mantenerlo ordenado durante la carga inicial sería cuadrático).
+        self._vocabulario: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return self._documentos
+
+    def agregar(self, id_documento: int, campos: Dict[str, str]) -> None:
+        frecuencias = self._frecuencias(campos)
+        if id_documento >= len(self._largos):
+            self._largos.extend([0] * (id_documento + 1 - len(self._largos)))
+        largo = sum(frecuencias.values())
+        self._largos[id_documento] = largo
+        self._largo_total += largo
+        self._documentos += 1
+
+        for palabra, frecuencia in frecuencias.items():
+            if frecuencia > 0xFFFF:
+                frecuencia = 0xFFFF
+            posting = self._postings.get(palabra)
+            if posting is None:
+                self._postings[palabra] = (array("I", [id_documento]), array("H", [frecuencia]))
+                if self._vocabulario is not None:
+                    insort(self._vocabulario, palabra)
+                continue
+            ids, tfs = posting
+            if id_documento > ids[-1]:   # El caso común: los ids nuevos son siempre los más altos.
+                ids.append(id_documento)
+                tfs.append(frecuencia)
+            else:
+                posicion = bisect_left(ids, id_documento)
+                ids.insert(posicion, id_documento)
+                tfs.insert(posicion, frecuencia)
+
+    def quitar(self, id_documento: int, campos: Dict[str, str]) -> None:
+        self._largo_total -= self._largos[id_documento]
+        self._largos[id_documento] = 0
+        self._documentos -= 1
+
+        for palabra in self._frecuencias(campos):
+            ids, tfs = self._postings[palabra]
+            posicion = bisect_left(ids, id_documento)
+            del ids[posicion]
+            del tfs[posicion]
+            if not ids:
+                del self._postings[palabra]
+                if self._vocabulario is not None:
+                    del self._vocabulario[bisect_left(self._vocabulario, palabra)]
+
+    def buscar(self, consulta: str, limite: int = 10, prefijo: bool = True) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        Devuelve los `limite` documentos con mayor puntaje BM25 para la consulta, como pares
+        (id, puntaje) de mayor a menor, y cuántos documentos coincidieron en total (sin contar
+        los de las palabras que quedaron fuera del presupuesto). Basta con que aparezca una
+        de las palabras.
+        """
+        palabras = tokenizar(consulta)
+        if not palabras or not self._documentos:
+            return [], 0
+
+        # Primero las palabras escritas (las repetidas pesan más) y después las que completan
+        # el prefijo de la última (que pesan menos); dentro de cada grupo, de la menos a la más frecuente.
+        pesos: Dict[str, float] = Counter(p for p in palabras if p in self._postings)
+        por_frecuencia = lambda p: len(self._postings[p][0])
+        orden = sorted(pesos, key=por_frecuencia)
+        if prefijo:
+            completas = [p for p in self._expandir_prefijo(palabras[-1]) if p not in pesos]
+            for palabra in completas:
+                pesos[palabra] = PESO_PREFIJO
+            orden += sorted(completas, key=por_frecuencia)
+
+        acumulados: Dict[int, float] = {}
+        sumar = acumulados.get
+        largos = self._largos
+        # Parte de la normalización por largo de BM25 que no depende del documento.
+        a, c = K1 * (1 - B), K1 * B / (self._largo_total / self._documentos)
+        recorridos = 0
+        for palabra in orden:
+            ids, tfs = self._postings[palabra]
+            if recorridos and recorridos + len(ids) > PRESUPUESTO_POSTINGS:
+                continue  # Puede entrar alguna más rara del grupo siguiente.
+            recorridos += len(ids)
+            # Variante de IDF de BM25 que nunca es negativa (Lucene usa la misma).
+            idf = math.log(1 + (self._documentos - len(ids) + 0.5) / (len(ids) + 0.5))
+            k = pesos[palabra] * idf * (K1 + 1)
+            for id_documento, tf in zip(ids, tfs):
+                acumulados[id_documento] = sumar(id_documento, 0.0) + k * tf / (tf + a + c * largos[id_documento])
+
+        mejores = heapq.nlargest(limite, acumulados, key=acumulados.__getitem__)
+        return [(id_documento, acumulados[id_documento]) for id_documento in mejores], len(acumulados)
+
+    def _frecuencias(self, campos: Dict[str, str]) -> Counter:
+        palabras: List[str] = []
+        for campo, texto in campos.items():
+            if texto:
+                # Repetir la lista según el peso del campo deja todo el conteo en manos de `Counter` (en C).
+                palabras.extend(tokenizar(texto) * PESOS_CAMPOS.get(campo, 1))
+        return Counter(palabras)
+
+    def _expandir_prefijo(self, prefijo: str) -> List[str]:
+        """Palabras del índice que empiezan con `prefijo` (sin contarlo a él), las más frecuentes primero."""
+        if self._vocabulario is None:
+            self._vocabulario = sorted(self._postings)
+        vocabulario = self._vocabulario
+        candidatas = []
+        posicion = bisect_left(vocabulario, prefijo)
+        while posicion < len(vocabulario) and vocabulario[posicion].startswith(prefijo):
+            if vocabulario[posicion] != prefijo:
+                candidatas.append(vocabulario[posicion])
+            posicion += 1
+        if len(candidatas) > MAX_EXPANSIONES_PREFIJO:
+            candidatas = heapq.nlargest(MAX_EXPANSIONES_PREFIJO, candidatas, key=lambda p: len(self._postings[p][0]))
+        return candidatas
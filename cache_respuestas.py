@@ -0,0 +1,180 @@
+# CACHE DE RESPUESTAS YA SERIALIZADAS
+
+# Los endpoints de lectura devuelven siempre lo mismo mientras no haya escrituras, así
+# que se guardan los bytes ya codificados de cada respuesta (clave = ruta + query) en un
+# cache LRU acotado. Cada entrada lleva una "etiqueta" que dice de qué datos depende
+# (por ejemplo "year:1999" o "title:matrix"); cuando el almacén cambia, solo se
+# invalidan las entradas cuyas etiquetas tocó ese cambio.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Dict, Iterable, Optional, Set
+
+from almacen import normalizar_texto, normalizar_titulo
+
+
+# Etiquetas especiales: "all" la invalida cualquier cambio; "count" también (cambia la cantidad o no, da igual).
+ETIQUETA_TODO = "all"
+ETIQUETA_CANTIDAD = "count"
+
+def etiqueta_titulo(titulo: str) -> str:
+    return f"title:{normalizar_titulo(titulo)}"
+
+def etiqueta_anio(anio: int) -> str:
+    return f"year:{anio}"
+
+def etiqueta_genero(genero: str) -> str:
+    return f"genre:{normalizar_texto(genero)}"
+
+def etiqueta_actor(actor: str) -> str:
+    return f"cast:{normalizar_texto(actor)}"
+
+def etiquetas_de_pelicula(movie: Dict) -> Set[str]:
+    """Etiquetas a invalidar cuando cambia esta película."""
+    etiquetas = {etiqueta_titulo(movie["title"])}
+    if movie.get("year") is not None:
+        etiquetas.add(etiqueta_anio(movie["year"]))
+    etiquetas.update(etiqueta_genero(g) for g in movie.get("genres") or ())
+    etiquetas.update(etiqueta_actor(a) for a in movie.get("cast") or ())
+    return etiquetas
+
+
+
+# ENTRADA DEL CACHE
+
+class EntradaCache:
+    """
+    Respuesta ya codificada, lista para volver a enviarse.
+
+    La entrada se crea de nuevo cada vez que sus datos cambian: el segundo en que se empezó
+    a generar (`creada`) sirve de `Last-Modified`. Si en ese mismo segundo hubo un cambio,
+    una versión anterior de la respuesta pudo salir con la misma fecha, y `If-Modified-Since`
+    no las distinguiría: esas entradas no tienen fecha (`modificada` es None) y solo se
+    revalidan por ETag.
+    """
+    __slots__ = ("cuerpo", "etag", "headers", "etiqueta", "creada", "modificada")
+
+    def __init__(self, cuerpo: bytes, headers: Dict[str, str], etiqueta: str,
+                 creada: Optional[float] = None, fecha_confiable: bool = True):
+        self.cuerpo = cuerpo
+        self.etag = '"' + hashlib.blake2b(cuerpo, digest_size=12).hexdigest() + '"'
+        self.headers = headers
+        self.etiqueta = etiqueta
+        self.creada = int(time.time() if creada is None else creada)
+        self.modificada = formatdate(self.creada, usegmt=True) if fecha_confiable else None
+
+
+
+# CACHE LRU
+
+class CacheRespuestas:
+    """
+    Cache LRU acotado por cantidad de entradas y por bytes totales.
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, max_entradas: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, EntradaCache]" = OrderedDict()
+        self._por_etiqueta: Dict[str, Set[str]] = {}  # etiqueta -> claves que dependen de ella
+        self._bytes = 0
+        self._version = 0  # Aumenta con cada invalidación (ver `version` y `guardar`)
+        self._ultimo_cambio = 0.0  # Momento (`time.time()`) de la última invalidación
+
+        # Contadores
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    @property
+    def version(self) -> int:
+        """Versión de los datos: hay que leerla ANTES de generar una respuesta y pasarla a `guardar`."""
+        return self._version
+
+    def hubo_cambios_desde(self, momento: float) -> bool:
+        """Indica si hubo alguna invalidación en el mismo segundo que `momento` o después (ver `EntradaCache`)."""
+        return int(self._ultimo_cambio) >= int(momento)
+
+    def obtener(self, clave: str) -> Optional[EntradaCache]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, clave: str, entrada: EntradaCache, version: int) -> None:
+        """
+        Guarda la entrada, salvo que los datos hayan cambiado desde `version` (la respuesta
+        se generó con datos que quizá ya están viejos) o que no entre en el límite de bytes.
+        """
+        with self._lock:
+            if version != self._version or len(entrada.cuerpo) > self.max_bytes:
+                return
+            self._quitar(clave)
+            self._entradas[clave] = entrada
+            self._por_etiqueta.setdefault(entrada.etiqueta, set()).add(clave)
+            self._bytes += len(entrada.cuerpo)
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                clave_vieja = next(iter(self._entradas))
+                self._quitar(clave_vieja)
+                self.desalojos += 1
+
+    def invalidar(self, etiquetas: Iterable[str]) -> None:
+        """Borra todas las entradas que dependen de alguna de las etiquetas (y siempre las de "all" y "count")."""
+        with self._lock:
+            self._version += 1
+            self._ultimo_cambio = time.time()
+            for etiqueta in {ETIQUETA_TODO, ETIQUETA_CANTIDAD, *etiquetas}:
+                for clave in list(self._por_etiqueta.get(etiqueta, ())):
+                    self._quitar(clave)
+                    self.invalidaciones += 1
+
+    def al_cambiar(self, anterior: Optional[Dict], nueva: Optional[Dict]) -> None:
+        """Suscriptor del almacén: invalida lo que dependía de la versión vieja o de la nueva de la película."""
+        if anterior is None and nueva is None:
+            self.limpiar()  # Se recargó todo el almacén.
+            return
+        etiquetas: Set[str] = set()
+        for movie in (anterior, nueva):
+            if movie is not None:
+                etiquetas |= etiquetas_de_pelicula(movie)
+        self.invalidar(etiquetas)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._ultimo_cambio = time.time()
+            self._entradas.clear()
+            self._por_etiqueta.clear()
+            self._bytes = 0
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entradas),
+                "bytes": self._bytes,
+                "hits": self.aciertos,
+                "misses": self.fallos,
+                "evictions": self.desalojos,
+                "invalidations": self.invalidaciones,
+            }
+
+    def _quitar(self, clave: str) -> None:
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        self._bytes -= len(entrada.cuerpo)
+        claves = self._por_etiqueta.get(entrada.etiqueta)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_etiqueta[entrada.etiqueta]
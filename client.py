@@ -1,9 +1,11 @@
 # IMPORTACIONES 
 
 
-import requests # La librería principal para realizar peticiones HTTP a la API.
+import requests # Para capturar los errores de conexión.
 import sys      # Se usa para poder terminar el programa si no se proporciona una IP.
 
+from cliente_api import CacheLocal, ErrorDeLaAPI, MovieClient  # Las peticiones a la API (con pool de conexiones, reintentos y cache).
+
 
 
 # CONFIGURACIÓN Y VARIABLES GLOBALES
@@ -13,7 +15,12 @@ IP_DEL_SERVIDOR = "PON_AQUI_LA_IP_DE_TU_SERVIDOR"
 
 # Variables globales que se llenarán durante la ejecución.
 BASE_URL = None      # Almacenará la URL completa del servidor 
-SESION_AUTH = None   # "Cache" para las credenciales.
+CLIENTE = None       # MovieClient con el que se hacen todas las peticiones (guarda también las credenciales).
+
+# Cache local de respuestas: lo ya consultado se muestra sin volver a pedirlo durante FRESCURA_CACHE
+# segundos; después se le pregunta al servidor si cambió (si no cambió, no se descarga de nuevo).
+FRESCURA_CACHE = 30
+ARCHIVO_CACHE = None  # Una ruta (ej. "cache_cliente.json") para conservar el cache entre ejecuciones.
 
 
 
@@ -25,7 +32,7 @@ def configurar_servidor():
     Se ejecuta al inicio. Pide la IP del servidor si no está definida y
     realiza una prueba de conexión para verificar que el servidor es accesible.
     """
-    global IP_DEL_SERVIDOR, BASE_URL
+    global IP_DEL_SERVIDOR, BASE_URL, CLIENTE
     
     # Si la IP no ha sido modificada en el código, la pide al usuario.
     if IP_DEL_SERVIDOR == "PON_AQUI_LA_IP_DE_TU_SERVIDOR":
@@ -37,11 +44,12 @@ def configurar_servidor():
         
     # Construye la URL base que usarán todas las demás funciones.
     BASE_URL = f"http://{IP_DEL_SERVIDOR}:8000"
+    CLIENTE = MovieClient(BASE_URL, cache=CacheLocal(frescura=FRESCURA_CACHE, archivo=ARCHIVO_CACHE))
     print(f"\n✅ Servidor configurado para conectarse a: {BASE_URL}")
     
     # Intenta hacer una pequeña petición para ver si el servidor responde.
     try:
-        requests.get(f"{BASE_URL}/movies/count", timeout=3)
+        CLIENTE.pedir("GET", "/movies/count", timeout=3)
         print("✅ ¡Conexión con el servidor exitosa!")
     except requests.exceptions.RequestException:
         print("⚠️  AVISO: No se pudo establecer conexión inicial con el servidor.")
@@ -52,11 +60,9 @@ def gestionar_autenticacion():
     Maneja el login. Si ya hay una sesión válida, la devuelve.
     Si no, pide usuario/contraseña y los verifica contra el endpoint /auth/test.
     """
-    global SESION_AUTH
-    
-    # Si ya nos hemos logueado antes, reutilizamos las credenciales.
-    if SESION_AUTH:
-        return SESION_AUTH
+    # Si ya nos hemos logueado antes, el cliente ya tiene las credenciales.
+    if CLIENTE.auth:
+        return CLIENTE.auth
         
     print("\n--- Se requiere autenticación ---")
     username = input("Usuario: ")
@@ -68,18 +74,15 @@ def gestionar_autenticacion():
     
     print("Verificando credenciales...")
     try:
-        # Llama al endpoint de prueba de la API para validar las credenciales.
-        response = requests.get(f"{BASE_URL}/auth/test", auth=credenciales_nuevas, timeout=5)
-        if response.status_code == 200:
+        # Llama al endpoint de prueba de la API; si son válidas, el cliente las guarda para futuras peticiones.
+        if CLIENTE.iniciar_sesion(*credenciales_nuevas):
             print("¡Autenticación exitosa!")
-            SESION_AUTH = credenciales_nuevas  # Guarda las credenciales para futuras peticiones.
-            return SESION_AUTH
-        elif response.status_code == 401:
-            print("\nError: Autenticación fallida. Revisa las credenciales.")
-            return None
-        else:
-            print(f"\nError inesperado durante la autenticación ({response.status_code}).")
-            return None
+            return CLIENTE.auth
+        print("\nError: Autenticación fallida. Revisa las credenciales.")
+        return None
+    except ErrorDeLaAPI as e:
+        print(f"\nError inesperado durante la autenticación ({e.status_code}).")
+        return None
     except requests.exceptions.RequestException as e:
         print(f"\nError de conexión con el servidor: {e}")
         return None
@@ -89,35 +92,73 @@ def gestionar_autenticacion():
 # FUNCIONES DE INTERACCIÓN CON LA API 
 
 # Cada una de estas funciones corresponde a una acción que el usuario puede realizar.
+# Las peticiones las hace CLIENTE; si la API responde con un error, lanza ErrorDeLaAPI.
+
+def mostrar_error(e):
+    """Muestra el error que devolvió la API. Si las credenciales fallan, las borramos para que las pida de nuevo."""
+    print(f"Error ({e.status_code}): {e.detail}")
+    if e.status_code == 401:
+        CLIENTE.auth = None
 
 def ver_cantidad_peliculas():
     """Llama al endpoint /movies/count para obtener el total de películas."""
     try:
-        response = requests.get(f"{BASE_URL}/movies/count")
-        if response.ok:
-            count = response.json().get("total_movies", "desconocido")
-            print(f"\n📊 Total de películas en la base de datos: {count}")
-        else:
-            print(f"Error al obtener la cantidad ({response.status_code}).")
+        print(f"\n📊 Total de películas en la base de datos: {CLIENTE.cantidad()}")
+    except ErrorDeLaAPI as e:
+        print(f"Error al obtener la cantidad ({e.status_code}).")
     except requests.exceptions.RequestException as e:
         print(f"\nError de conexión: {e}")
 
+def mostrar_pelicula(movie):
+    print(f"\n--- {movie['title']} ({movie['year']}) ---")
+    print(f"Géneros: {', '.join(movie['genres'])}")
+    print(f"Actores: {', '.join(movie['cast'])}")
+    print(f"Resumen: {movie.get('extract', 'No disponible')}")
+
 def buscar_por_titulo():
     """Pide un título al usuario y llama al endpoint /movies/{title} para buscarlo."""
     title = input("Ingrese el título de la película: ")
     try:
-        response = requests.get(f"{BASE_URL}/movies/{title}")
-        if response.ok:
-            movie = response.json()
-            print(f"\n--- {movie['title']} ({movie['year']}) ---")
-            print(f"Géneros: {', '.join(movie['genres'])}")
-            print(f"Actores: {', '.join(movie['cast'])}")
-            print(f"Resumen: {movie.get('extract', 'No disponible')}")
+        movie = CLIENTE.obtener(title)
+        if movie is not None:
+            mostrar_pelicula(movie)
         else:
-            print("Película no encontrada.")
+            sugerir_peliculas(title)
+    except ErrorDeLaAPI as e:
+        print(f"Error al buscar la película ({e.status_code}).")
     except requests.exceptions.RequestException as e:
         print(f"\nError de conexión: {e}")
 
+def sugerir_peliculas(texto):
+    """Si el título no coincide exactamente, usa /movies/search para mostrar los más parecidos."""
+    try:
+        sugerencias = CLIENTE.buscar(texto, limit=5, fields="title,year")
+    except ErrorDeLaAPI:
+        sugerencias = []
+    if not sugerencias:
+        print("Película no encontrada.")
+        return
+    print("\nNo hay una película con ese título exacto. ¿Quisiste decir...?")
+    for movie in sugerencias:
+        print(f"  - {movie['title']} ({movie['year']})")
+
+def buscar_varios_titulos():
+    """Pide varios títulos separados por ";" y los busca todos a la vez (varias peticiones en paralelo)."""
+    titulos = [t.strip() for t in input("Títulos (separados por punto y coma): ").split(";") if t.strip()]
+    if not titulos:
+        print("No se ingresaron títulos."); return
+    try:
+        encontradas = CLIENTE.obtener_varios(titulos)
+    except ErrorDeLaAPI as e:
+        print(f"Error al buscar las películas ({e.status_code})."); return
+    except requests.exceptions.RequestException as e:
+        print(f"\nError de conexión: {e}"); return
+    for title, movie in encontradas.items():
+        if movie is not None:
+            mostrar_pelicula(movie)
+        else:
+            print(f"\n--- {title}: película no encontrada ---")
+
 def buscar_por_anio():
     """Pide un año y llama al endpoint /movies?year=... para filtrar."""
     print("\n--- Buscar películas por año ---")
@@ -130,16 +171,15 @@ def buscar_por_anio():
         print("Error: El año debe ser un número."); return
         
     try:
-        response = requests.get(f"{BASE_URL}/movies", params={'year': year_val})
-        if response.ok:
-            movies = response.json()
-            if not movies:
-                print(f"\nNo se encontraron películas para el año {year_val}."); return
-            print(f"\n--- PELÍCULAS DEL AÑO {year_val} ({len(movies)} encontradas) ---")
-            for movie in movies:
-                print(f"- {movie['title']}")
-        else:
-            print(f"Error en la búsqueda ({response.status_code}).")
+        # Se pide de a páginas: un año con muchas películas no llega en una sola respuesta enorme.
+        movies = list(CLIENTE.paginar(year=year_val, sort="title", fields="title"))
+        if not movies:
+            print(f"\nNo se encontraron películas para el año {year_val}."); return
+        print(f"\n--- PELÍCULAS DEL AÑO {year_val} ({len(movies)} encontradas) ---")
+        for movie in movies:
+            print(f"- {movie['title']}")
+    except ErrorDeLaAPI as e:
+        print(f"Error en la búsqueda ({e.status_code}).")
     except requests.exceptions.RequestException as e:
         print(f"\nError de conexión: {e}")
 
@@ -160,12 +200,10 @@ def agregar_pelicula():
     data = {"title": title.strip(), "year": year, "cast": cast, "genres": genres}
     
     try:
-        response = requests.post(f"{BASE_URL}/movies", json=data, auth=auth)
-        if response.status_code == 201:
-            print("Película agregada con éxito.")
-        else:
-            print(f"Error ({response.status_code}): {response.json()['detail']}")
-            if response.status_code == 401: global SESION_AUTH; SESION_AUTH = None
+        CLIENTE.agregar(data)
+        print("Película agregada con éxito.")
+    except ErrorDeLaAPI as e:
+        mostrar_error(e)
     except requests.exceptions.RequestException as e:
         print(f"\nError de conexión: {e}")
 
@@ -192,12 +230,10 @@ def actualizar_pelicula_parcial():
         print("No se ingresaron datos para actualizar."); return
         
     try:
-        response = requests.put(f"{BASE_URL}/movies/{title_a_actualizar}/partial", json=update_data, auth=auth)
-        if response.ok:
-            print("Película actualizada con éxito.")
-        else:
-            print(f"Error ({response.status_code}): {response.json()['detail']}")
-            if response.status_code == 401: global SESION_AUTH; SESION_AUTH = None
+        CLIENTE.actualizar(title_a_actualizar, update_data)
+        print("Película actualizada con éxito.")
+    except ErrorDeLaAPI as e:
+        mostrar_error(e)
     except requests.exceptions.RequestException as e:
         print(f"\nError de conexión: {e}")
 
@@ -211,13 +247,34 @@ def borrar_pelicula():
         print("Operación cancelada."); return
         
     try:
-        response = requests.delete(f"{BASE_URL}/movies/{title}", auth=auth)
-        if response.ok:
-            print(response.json()["message"])
-        else:
-            print(f"Error ({response.status_code}): {response.json()['detail']}")
-            # Si las credenciales fallan, las borramos para que las pida de nuevo.
-            if response.status_code == 401: global SESION_AUTH; SESION_AUTH = None
+        print(CLIENTE.borrar(title))
+    except ErrorDeLaAPI as e:
+        mostrar_error(e)
+    except requests.exceptions.RequestException as e:
+        print(f"\nError de conexión: {e}")
+
+def importar_peliculas():
+    """Envía un archivo JSON (array de películas) o NDJSON (.ndjson/.jsonl) al endpoint POST /movies/bulk."""
+    auth = gestionar_autenticacion()
+    if not auth: return
+
+    ruta = input("Archivo a importar (.json o .ndjson): ").strip()
+    try:
+        with open(ruta, "rb") as f:
+            contenido = f.read()
+    except OSError as e:
+        print(f"Error: No se pudo leer el archivo ({e})."); return
+    es_ndjson = ruta.lower().endswith((".ndjson", ".jsonl"))
+    atomic = input("¿Importar solo si todas son válidas? (s/n): ").lower() != "n"
+
+    try:
+        resumen = CLIENTE.importar(contenido, ndjson=es_ndjson, atomic=atomic)
+        print(f"\nPelículas: {resumen['total']}   importadas: {resumen['applied']}   con errores: {resumen['failed']}")
+        for resultado in resumen["results"]:
+            if resultado["status"] not in (201, 424):  # 424: válida, pero no se importó por los errores de otras.
+                print(f"  - #{resultado['index']} ({resultado.get('title', '?')}): {resultado['detail']}")
+    except ErrorDeLaAPI as e:
+        mostrar_error(e)
     except requests.exceptions.RequestException as e:
         print(f"\nError de conexión: {e}")
 
@@ -238,7 +295,9 @@ def menu():
         "3": buscar_por_anio,
         "4": agregar_pelicula,
         "5": actualizar_pelicula_parcial,
-        "6": borrar_pelicula
+        "6": borrar_pelicula,
+        "7": importar_peliculas,
+        "8": buscar_varios_titulos
     }
     
     while True:
@@ -249,11 +308,14 @@ def menu():
         print("4. Agregar nueva película (auth)")
         print("5. Actualizar película (auth)")
         print("6. Borrar película (auth)")
+        print("7. Importar películas desde un archivo (auth)")
+        print("8. Buscar varios títulos a la vez")
         print("0. Salir")
         
         op = input("Opción: ")
         
         if op == "0":
+            CLIENTE.cerrar() # Cierra las conexiones abiertas con el servidor (y guarda el cache, si va a disco).
             break # Sale del bucle while y termina el programa.
             
         # Busca la función correspondiente a la opción elegida en el diccionario.
@@ -0,0 +1,707 @@
+# BIBLIOTECA CLIENTE DE LA API DE PELÍCULAS
+
+# `MovieClient` envuelve la API en métodos de Python. Usa una única `requests.Session`, que
+# mantiene un pool de conexiones abiertas (keep-alive): pedir muchas cosas seguidas no abre
+# una conexión TCP nueva cada vez. `AsyncMovieClient` ofrece lo mismo con `httpx` para
+# programas asíncronos.
+#
+# Ambos:
+#   - Reintentan las peticiones que el servidor rechaza por el límite de tasa (429) o porque
+#     todavía está cargando el catálogo (503), esperando lo que indica `Retry-After`, y los
+#     errores de conexión con espera exponencial.
+#   - Convierten las respuestas con error en `ErrorDeLaAPI` (con el código y el detalle del servidor).
+#   - Traen muchas películas por título a la vez (`obtener_varios`), recorren listados
+#     grandes página por página (`paginar`) o en streaming NDJSON (`exportar`).
+#   - Pueden guardar las respuestas de los GET en un `CacheLocal` (ver más abajo).
+#   - Con `iniciar_sesion` piden un token a `POST /auth/token` y lo mandan en lugar de la clave
+#     (lo renuevan solos antes de que venza).
+#   - Piden solo los cambios del catálogo desde una versión (`cambios`), para mantener una
+#     copia local al día sin volver a descargar todo.
+#
+# Uso:
+#   with MovieClient("http://127.0.0.1:8000", auth=("admin", "supersecret")) as cliente:
+#       print(cliente.cantidad())
+#       for pelicula in cliente.paginar(genre=["Drama"], fields="title,year"):
+#           ...
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import httpx  # Solo lo necesita AsyncMovieClient.
+except ImportError:
+    httpx = None
+
+REINTENTOS = 3              # Reintentos como máximo por petición (además del primer intento).
+ESPERA_INICIAL = 0.5        # Segundos antes del primer reintento sin `Retry-After` (después se duplica).
+ESPERA_MAXIMA = 10.0        # Nunca se espera más que esto entre dos intentos.
+ESTADOS_A_REINTENTAR = {429, 503}
+TAMANIO_POOL = 10           # Conexiones abiertas como máximo (y peticiones simultáneas de `obtener_varios`).
+POR_PAGINA = 500            # Películas por página en `paginar`.
+MARGEN_TOKEN = 30.0         # Segundos antes de que venza el token en que ya se pide otro.
+FRESCURA = 30.0             # Segundos en que una respuesta del cache local se usa sin preguntarle al servidor.
+MAX_ENTRADAS_CACHE = 1000   # Respuestas que guarda como mucho el cache local.
+HEADERS_GUARDADOS = ("content-type", "etag", "last-modified", "x-next-cursor", "x-total-count", "link")
+
+
+
+# ERRORES
+
+class ErrorDeLaAPI(Exception):
+    """El servidor respondió con un error. `status_code` es el código HTTP y `detail` el motivo."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"Error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+
+# FUNCIONES AUXILIARES (compartidas por los dos clientes)
+
+def ruta_de_pelicula(titulo: str, sufijo: str = "") -> str:
+    """Ruta de una película, con el título escapado (puede tener "/", "?" o "#")."""
+    return f"/movies/{quote(titulo, safe='')}{sufijo}"
+
+def parametros_de_listado(year: Optional[int] = None, genre: Iterable[str] = (), cast: Iterable[str] = (),
+                          year_from: Optional[int] = None, year_to: Optional[int] = None,
+                          title_prefix: Optional[str] = None, sort: Optional[str] = None,
+                          fields: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+    parametros = {"year": year, "genre": list(genre), "cast": list(cast), "year_from": year_from,
+                  "year_to": year_to, "title_prefix": title_prefix, "sort": sort, "fields": fields, "limit": limit}
+    return {clave: valor for clave, valor in parametros.items() if valor not in (None, [])}
+
+def parametros_de_cambios(desde: Optional[int], epoca: Optional[str], espera: float) -> Dict:
+    parametros = {"since": desde, "epoch": epoca, "wait": espera or None}
+    return {clave: valor for clave, valor in parametros.items() if valor is not None}
+
+def espera_para_reintentar(estado: Optional[int], headers, intento: int) -> Optional[float]:
+    """
+    Cuántos segundos esperar antes de reintentar, o None si no hay que reintentar.
+    `estado` es None si falló la conexión.
+    """
+    if intento >= REINTENTOS or (estado is not None and estado not in ESTADOS_A_REINTENTAR):
+        return None
+    retry_after = headers.get("Retry-After") if headers is not None else None
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), ESPERA_MAXIMA)
+        except ValueError:
+            pass  # Puede venir como fecha HTTP: se usa la espera exponencial.
+    # Espera exponencial con un poco de azar, para que muchos clientes no reintenten todos juntos.
+    return min(ESPERA_INICIAL * 2 ** intento, ESPERA_MAXIMA) * random.uniform(0.5, 1.0)
+
+def error_de(respuesta) -> ErrorDeLaAPI:
+    try:
+        detalle = respuesta.json().get("detail", respuesta.text)
+    except ValueError:
+        detalle = respuesta.text
+    if not isinstance(detalle, str):
+        detalle = json.dumps(detalle, ensure_ascii=False)  # Errores de validación de FastAPI (una lista).
+    return ErrorDeLaAPI(respuesta.status_code, detalle)
+
+def datos_de(respuesta):
+    """El cuerpo JSON de una respuesta exitosa; si no lo es, lanza `ErrorDeLaAPI`."""
+    if not 200 <= respuesta.status_code < 300:
+        raise error_de(respuesta)
+    return respuesta.json()
+
+def resumen_de_lote(respuesta) -> Dict:
+    """Los endpoints /movies/bulk responden 200 o 422 con un resultado por elemento."""
+    if respuesta.status_code in (200, 422):
+        cuerpo = respuesta.json()
+        if "results" in cuerpo:
+            return cuerpo
+    raise error_de(respuesta)
+
+
+
+# CACHE LOCAL
+
+# Guarda las respuestas de los GET (clave = ruta + query) para no volver a pedirlas:
+#   - Durante `frescura` segundos la respuesta guardada se usa sin contactar al servidor.
+#   - Después se pide de nuevo con `If-None-Match` / `If-Modified-Since`: si no cambió, el
+#     servidor responde 304 sin cuerpo y se sigue usando la guardada.
+#   - Las escrituras del propio cliente descartan lo que pueden haber cambiado (listados,
+#     conteos, búsquedas y la película escrita); los cambios de otros clientes se ven a lo
+#     sumo `frescura` segundos más tarde.
+# Con `archivo`, el cache se guarda en disco al cerrar el cliente y se recupera al crearlo.
+
+class RespuestaGuardada:
+    """Respuesta a un GET, recién recibida o sacada del cache local."""
+    __slots__ = ("status_code", "headers", "content", "titulo", "guardada")
+
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes,
+                 titulo: Optional[str] = None, guardada: Optional[float] = None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.titulo = titulo                       # Película de la que depende (solo en GET /movies/{title}).
+        self.guardada = guardada or time.time()    # Cuándo se recibió o se revalidó por última vez.
+
+    @classmethod
+    def de(cls, respuesta, titulo: Optional[str] = None) -> "RespuestaGuardada":
+        """Convierte una respuesta de `requests` o de `httpx`."""
+        headers = {h: respuesta.headers[h] for h in HEADERS_GUARDADOS if h in respuesta.headers}
+        return cls(respuesta.status_code, headers, respuesta.content, titulo and titulo.lower())
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def condiciones(self) -> Dict[str, str]:
+        """Headers para preguntarle al servidor si esta respuesta sigue vigente."""
+        condiciones = {}
+        if "etag" in self.headers:
+            condiciones["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            condiciones["If-Modified-Since"] = self.headers["last-modified"]
+        return condiciones
+
+
+def clave_local(ruta: str, params: Optional[Dict] = None) -> str:
+    """Ruta + query con los parámetros ordenados (como la clave del cache del servidor)."""
+    pares = []
+    for nombre, valor in (params or {}).items():
+        pares.extend((nombre, v) for v in (valor if isinstance(valor, list) else [valor]))
+    return f"{ruta}?{urlencode(sorted(pares))}"
+
+
+class CacheLocal:
+    """Cache LRU de respuestas de la API, del lado del cliente. Es seguro usarlo desde varios hilos."""
+
+    def __init__(self, frescura: float = FRESCURA, max_entradas: int = MAX_ENTRADAS_CACHE, archivo: Optional[str] = None):
+        self.frescura = frescura
+        self.max_entradas = max_entradas
+        self.archivo = archivo
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, RespuestaGuardada]" = OrderedDict()
+
+        # Contadores
+        self.aciertos = 0      # Respuestas servidas sin contactar al servidor.
+        self.revalidadas = 0   # El servidor respondió 304: se usó la guardada.
+        self.descargas = 0     # Respuestas nuevas (o que cambiaron) recibidas enteras.
+
+        if archivo is not None and os.path.exists(archivo):
+            self._leer_archivo()
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def buscar(self, clave: str) -> Tuple[Optional[RespuestaGuardada], bool]:
+        """La respuesta guardada para esa clave (o None) y si todavía se puede usar sin revalidarla."""
+        with self._lock:
+            guardada = self._entradas.get(clave)
+            if guardada is None:
+                return None, False
+            self._entradas.move_to_end(clave)
+            fresca = time.time() - guardada.guardada < self.frescura
+            if fresca:
+                self.aciertos += 1
+            return guardada, fresca
+
+    def registrar(self, clave: str, anterior: Optional[RespuestaGuardada], respuesta,
+                  titulo: Optional[str] = None) -> RespuestaGuardada:
+        """
+        Procesa la respuesta del servidor a un GET pedido con las condiciones de `anterior`.
+        Devuelve la respuesta a usar (la anterior si no cambió) y la guarda si trae ETag o fecha.
+        """
+        with self._lock:
+            if respuesta.status_code == 304 and anterior is not None:
+                self.revalidadas += 1
+                anterior.guardada = time.time()
+                self._entradas[clave] = anterior
+                self._entradas.move_to_end(clave)
+                return anterior
+            nueva = RespuestaGuardada.de(respuesta, titulo)
+            if nueva.status_code == 200 and ("etag" in nueva.headers or "last-modified" in nueva.headers):
+                self.descargas += 1
+                self._entradas[clave] = nueva
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+            else:
+                self._entradas.pop(clave, None)
+            return nueva
+
+    def invalidar(self, titulos: Optional[Iterable[str]] = None) -> None:
+        """
+        Descarta lo que puede haber cambiado al escribir esas películas: sus búsquedas por
+        título y todo lo demás (listados, conteos, búsquedas). Sin `titulos`, descarta todo.
+        """
+        with self._lock:
+            if titulos is None:
+                self._entradas.clear()
+                return
+            afectados = {titulo.lower() for titulo in titulos if titulo}
+            for clave in [c for c, e in self._entradas.items() if e.titulo is None or e.titulo in afectados]:
+                del self._entradas[clave]
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entradas), "hits": self.aciertos,
+                    "revalidated": self.revalidadas, "downloaded": self.descargas}
+
+    # Persistencia en disco
+
+    def persistir(self) -> None:
+        """Escribe el cache en `archivo` (primero en un temporal, para no dejarlo a medias)."""
+        if self.archivo is None:
+            return
+        with self._lock:
+            entradas = [{"key": clave, "headers": dict(e.headers), "body": e.text, "title": e.titulo, "saved": e.guardada}
+                        for clave, e in self._entradas.items()]
+        temporal = f"{self.archivo}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(entradas, f, ensure_ascii=False)
+        os.replace(temporal, self.archivo)
+
+    def _leer_archivo(self) -> None:
+        try:
+            with open(self.archivo, encoding="utf-8") as f:
+                entradas = json.load(f)
+            for e in entradas[-self.max_entradas:]:
+                self._entradas[e["key"]] = RespuestaGuardada(200, e["headers"], e["body"].encode("utf-8"), e["title"], e["saved"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self._entradas.clear()  # Archivo dañado o de otra versión: se empieza de cero.
+
+
+
+# CLIENTE SINCRÓNICO
+
+class MovieClient:
+    """
+    Cliente de la API con un pool de conexiones. Se puede usar desde varios hilos a la vez
+    (`obtener_varios` lo hace). Hay que cerrarlo con `cerrar()` o usarlo con `with`.
+    """
+
+    def __init__(self, base_url: str, auth: Optional[Tuple[str, str]] = None, timeout: float = 10.0,
+                 tamanio_pool: int = TAMANIO_POOL, cache: Optional[CacheLocal] = None):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.timeout = timeout
+        self.tamanio_pool = tamanio_pool
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamanio_pool)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+        self.sesion.auth = auth
+        self._credenciales = auth
+        self.token: Optional[str] = None   # Token de POST /auth/token (ver `iniciar_sesion`).
+        self._token_vence = 0.0
+        self._lock_token = threading.Lock()
+
+    def __enter__(self) -> "MovieClient":
+        return self
+
+    def __exit__(self, *excepcion) -> None:
+        self.cerrar()
+
+    def cerrar(self) -> None:
+        self.sesion.close()
+        if self.cache is not None:
+            self.cache.persistir()
+
+    @property
+    def auth(self) -> Optional[Tuple[str, str]]:
+        return self._credenciales
+
+    @auth.setter
+    def auth(self, credenciales: Optional[Tuple[str, str]]) -> None:
+        """Usuario y clave para HTTP Basic (se olvida el token, si había uno)."""
+        self._credenciales = credenciales
+        self.token = None
+        self.sesion.auth = credenciales
+
+    def pedir(self, metodo: str, ruta: str, **opciones) -> requests.Response:
+        """Hace la petición con reintentos y devuelve la respuesta (sea cual sea su código)."""
+        opciones.setdefault("timeout", self.timeout)
+        con_token = self.token is not None and "auth" not in opciones
+        headers = opciones.get("headers") or {}
+        intento = 0
+        token_renovado = False
+        while True:
+            if con_token:
+                token = self._token_vigente()
+                opciones["headers"] = {**headers, "Authorization": f"Bearer {token}"} if token else headers
+            try:
+                respuesta = self.sesion.request(metodo, self.base_url + ruta, **opciones)
+            except requests.ConnectionError:
+                espera = espera_para_reintentar(None, None, intento)
+                if espera is None:
+                    raise
+            else:
+                if con_token and respuesta.status_code == 401 and not token_renovado:
+                    # El servidor no aceptó el token (por ejemplo, se reinició con otro secreto): se pide otro.
+                    token_renovado = True
+                    self._token_vence = 0.0
+                    respuesta.close()
+                    continue
+                espera = espera_para_reintentar(respuesta.status_code, respuesta.headers, intento)
+                if espera is None:
+                    return respuesta
+                respuesta.close()
+            time.sleep(espera)
+            intento += 1
+
+    def leer(self, ruta: str, params: Optional[Dict] = None, titulo: Optional[str] = None) -> RespuestaGuardada:
+        """GET que pasa por el cache local, si el cliente tiene uno (`titulo`: la película de la que depende)."""
+        if self.cache is None:
+            return RespuestaGuardada.de(self.pedir("GET", ruta, params=params))
+        clave = clave_local(ruta, params)
+        guardada, fresca = self.cache.buscar(clave)
+        if fresca:
+            return guardada
+        condiciones = guardada.condiciones() if guardada is not None else {}
+        respuesta = self.pedir("GET", ruta, params=params, headers=condiciones)
+        return self.cache.registrar(clave, guardada, respuesta, titulo)
+
+    def escribir(self, titulos: Optional[List[str]], metodo: str, ruta: str, **opciones) -> requests.Response:
+        """Petición que modifica esas películas (None: cualquiera); descarta del cache local lo que pudo cambiar."""
+        try:
+            return self.pedir(metodo, ruta, **opciones)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidar(titulos)
+
+    # Autenticación
+
+    def iniciar_sesion(self, usuario: str, clave: str, con_token: bool = True) -> bool:
+        """
+        Verifica las credenciales; si son válidas, se usan desde ahora en adelante. Con `con_token`
+        se pide un token a /auth/token y se manda ese en lugar de la clave (si el servidor no
+        tiene ese endpoint, las credenciales se verifican contra /auth/test y se usa HTTP Basic).
+        """
+        if con_token:
+            respuesta = self.pedir("POST", "/auth/token", auth=(usuario, clave))
+            if respuesta.status_code not in (404, 405):
+                if respuesta.status_code == 401:
+                    return False
+                if not respuesta.ok:
+                    raise error_de(respuesta)
+                self.auth = (usuario, clave)
+                self._guardar_token(respuesta.json())
+                return True
+        respuesta = self.pedir("GET", "/auth/test", auth=(usuario, clave))
+        if respuesta.status_code == 401:
+            return False
+        if not respuesta.ok:
+            raise error_de(respuesta)
+        self.auth = (usuario, clave)
+        return True
+
+    def _guardar_token(self, datos: Dict) -> None:
+        self.token = datos["access_token"]
+        self._token_vence = time.time() + datos["expires_in"]
+        self.sesion.auth = None  # Desde ahora se manda el token y no la clave.
+
+    def _token_vigente(self) -> Optional[str]:
+        """El token, renovado si está por vencer. Si no se puede renovar se vuelve a HTTP Basic (y devuelve None)."""
+        with self._lock_token:
+            if self.token is not None and time.time() >= self._token_vence - MARGEN_TOKEN:
+                respuesta = self.pedir("POST", "/auth/token", auth=self._credenciales)
+                if respuesta.ok:
+                    self._guardar_token(respuesta.json())
+                else:
+                    self.auth = self._credenciales
+            return self.token
+
+    # Lectura
+
+    def cantidad(self) -> int:
+        return datos_de(self.leer("/movies/count"))["total_movies"]
+
+    def estadisticas(self, top: int = 10) -> Dict:
+        return datos_de(self.leer("/movies/stats", {"top": top}))
+
+    def obtener(self, titulo: str) -> Optional[Dict]:
+        """La película con ese título, o None si no existe."""
+        respuesta = self.leer(ruta_de_pelicula(titulo), titulo=titulo)
+        if respuesta.status_code == 404:
+            return None
+        return datos_de(respuesta)
+
+    def obtener_varios(self, titulos: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Trae muchas películas por título, varias a la vez (tantas como conexiones tiene el pool)."""
+        titulos = list(dict.fromkeys(titulos))
+        with ThreadPoolExecutor(max_workers=self.tamanio_pool) as hilos:
+            return dict(zip(titulos, hilos.map(self.obtener, titulos)))
+
+    def listar(self, **filtros) -> List[Dict]:
+        """Una sola petición a GET /movies (ver `parametros_de_listado` para los filtros)."""
+        return datos_de(self.leer("/movies", parametros_de_listado(**filtros)))
+
+    def paginar(self, por_pagina: int = POR_PAGINA, **filtros) -> Iterator[Dict]:
+        """Recorre todas las películas que cumplen los filtros, pidiendo de a `por_pagina` (sigue `X-Next-Cursor`)."""
+        parametros = parametros_de_listado(limit=por_pagina, **filtros)
+        while True:
+            respuesta = self.leer("/movies", dict(parametros))
+            yield from datos_de(respuesta)
+            cursor = respuesta.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return
+            parametros["cursor"] = cursor
+
+    def exportar(self, **filtros) -> Iterator[Dict]:
+        """Todas las películas que cumplen los filtros en una sola respuesta NDJSON, leída a medida que llega."""
+        parametros = {**parametros_de_listado(**filtros), "format": "ndjson"}
+        with self.pedir("GET", "/movies", params=parametros, stream=True) as respuesta:
+            if not respuesta.ok:
+                raise error_de(respuesta)
+            for linea in respuesta.iter_lines():
+                if linea:
+                    yield json.loads(linea)
+
+    def buscar(self, consulta: str, limit: int = 10, prefix: bool = True, fields: Optional[str] = None) -> List[Dict]:
+        parametros = {"q": consulta, "limit": limit, "prefix": str(prefix).lower()}
+        if fields:
+            parametros["fields"] = fields
+        return datos_de(self.leer("/movies/search", parametros))
+
+    def cambios(self, desde: Optional[int] = None, epoca: Optional[str] = None, espera: float = 0) -> Dict:
+        """
+        Los cambios posteriores a la versión `desde` (ver `GET /movies/changes`); sin `desde`,
+        solo la versión y la época actuales. Con `espera`, si no hay cambios espera hasta que
+        haya alguno (long-poll). Un `ErrorDeLaAPI` con código 410 significa que hay que volver
+        a descargar el catálogo.
+        """
+        return datos_de(self.pedir("GET", "/movies/changes", params=parametros_de_cambios(desde, epoca, espera),
+                                   timeout=self.timeout + espera))
+
+    # Escritura (requieren credenciales)
+
+    def agregar(self, pelicula: Dict) -> Dict:
+        return datos_de(self.escribir([pelicula.get("title")], "POST", "/movies", json=pelicula))
+
+    def actualizar(self, titulo: str, cambios: Dict) -> Dict:
+        return datos_de(self.escribir([titulo, cambios.get("title")], "PUT", ruta_de_pelicula(titulo, "/partial"), json=cambios))
+
+    def borrar(self, titulo: str) -> str:
+        return datos_de(self.escribir([titulo], "DELETE", ruta_de_pelicula(titulo)))["message"]
+
+    def importar(self, contenido: bytes, ndjson: bool = False, atomic: bool = True) -> Dict:
+        """Envía un lote (array JSON o NDJSON) a POST /movies/bulk y devuelve el resultado por elemento."""
+        tipo = "application/x-ndjson" if ndjson else "application/json"
+        respuesta = self.escribir(None, "POST", "/movies/bulk", data=contenido, headers={"Content-Type": tipo},
+                                  params={"atomic": str(atomic).lower()})
+        return resumen_de_lote(respuesta)
+
+
+
+# CLIENTE ASÍNCRONO
+
+class AsyncMovieClient:
+    """
+    Lo mismo que `MovieClient`, para usar con `await` (necesita `httpx`). Hay que cerrarlo
+    con `await cerrar()` o usarlo con `async with`.
+    """
+
+    def __init__(self, base_url: str, auth: Optional[Tuple[str, str]] = None, timeout: float = 10.0,
+                 tamanio_pool: int = TAMANIO_POOL, cache: Optional[CacheLocal] = None):
+        if httpx is None:
+            raise RuntimeError("AsyncMovieClient necesita httpx (pip install httpx)")
+        self.tamanio_pool = tamanio_pool
+        self.cache = cache
+        self.timeout = timeout
+        self.http = httpx.AsyncClient(base_url=base_url.rstrip("/"), auth=auth, timeout=timeout,
+                                      limits=httpx.Limits(max_connections=tamanio_pool, max_keepalive_connections=tamanio_pool))
+        self._credenciales = auth
+        self.token: Optional[str] = None
+        self._token_vence = 0.0
+        self._lock_token = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncMovieClient":
+        return self
+
+    async def __aexit__(self, *excepcion) -> None:
+        await self.cerrar()
+
+    async def cerrar(self) -> None:
+        await self.http.aclose()
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.persistir)
+
+    @property
+    def auth(self) -> Optional[Tuple[str, str]]:
+        return self._credenciales
+
+    @auth.setter
+    def auth(self, credenciales: Optional[Tuple[str, str]]) -> None:
+        self._credenciales = credenciales
+        self.token = None
+        self.http.auth = credenciales
+
+    async def pedir(self, metodo: str, ruta: str, **opciones) -> "httpx.Response":
+        con_token = self.token is not None and "auth" not in opciones
+        headers = opciones.get("headers") or {}
+        intento = 0
+        token_renovado = False
+        while True:
+            if con_token:
+                token = await self._token_vigente()
+                opciones["headers"] = {**headers, "Authorization": f"Bearer {token}"} if token else headers
+            try:
+                respuesta = await self.http.request(metodo, ruta, **opciones)
+            except httpx.TransportError:
+                espera = espera_para_reintentar(None, None, intento)
+                if espera is None:
+                    raise
+            else:
+                if con_token and respuesta.status_code == 401 and not token_renovado:
+                    token_renovado = True
+                    self._token_vence = 0.0
+                    continue
+                espera = espera_para_reintentar(respuesta.status_code, respuesta.headers, intento)
+                if espera is None:
+                    return respuesta
+            await asyncio.sleep(espera)
+            intento += 1
+
+    async def leer(self, ruta: str, params: Optional[Dict] = None, titulo: Optional[str] = None) -> RespuestaGuardada:
+        if self.cache is None:
+            return RespuestaGuardada.de(await self.pedir("GET", ruta, params=params))
+        clave = clave_local(ruta, params)
+        guardada, fresca = self.cache.buscar(clave)
+        if fresca:
+            return guardada
+        condiciones = guardada.condiciones() if guardada is not None else {}
+        respuesta = await self.pedir("GET", ruta, params=params, headers=condiciones)
+        return self.cache.registrar(clave, guardada, respuesta, titulo)
+
+    async def escribir(self, titulos: Optional[List[str]], metodo: str, ruta: str, **opciones) -> "httpx.Response":
+        try:
+            return await self.pedir(metodo, ruta, **opciones)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidar(titulos)
+
+    # Autenticación
+
+    async def iniciar_sesion(self, usuario: str, clave: str, con_token: bool = True) -> bool:
+        if con_token:
+            respuesta = await self.pedir("POST", "/auth/token", auth=(usuario, clave))
+            if respuesta.status_code not in (404, 405):
+                if respuesta.status_code == 401:
+                    return False
+                if not respuesta.is_success:
+                    raise error_de(respuesta)
+                self.auth = (usuario, clave)
+                self._guardar_token(respuesta.json())
+                return True
+        respuesta = await self.pedir("GET", "/auth/test", auth=(usuario, clave))
+        if respuesta.status_code == 401:
+            return False
+        if not respuesta.is_success:
+            raise error_de(respuesta)
+        self.auth = (usuario, clave)
+        return True
+
+    def _guardar_token(self, datos: Dict) -> None:
+        self.token = datos["access_token"]
+        self._token_vence = time.time() + datos["expires_in"]
+        self.http.auth = None
+
+    async def _token_vigente(self) -> Optional[str]:
+        async with self._lock_token:
+            if self.token is not None and time.time() >= self._token_vence - MARGEN_TOKEN:
+                respuesta = await self.pedir("POST", "/auth/token", auth=self._credenciales)
+                if respuesta.is_success:
+                    self._guardar_token(respuesta.json())
+                else:
+                    self.auth = self._credenciales
+            return self.token
+
+    # Lectura
+
+    async def cantidad(self) -> int:
+        return datos_de(await self.leer("/movies/count"))["total_movies"]
+
+    async def estadisticas(self, top: int = 10) -> Dict:
+        return datos_de(await self.leer("/movies/stats", {"top": top}))
+
+    async def obtener(self, titulo: str) -> Optional[Dict]:
+        respuesta = await self.leer(ruta_de_pelicula(titulo), titulo=titulo)
+        if respuesta.status_code == 404:
+            return None
+        return datos_de(respuesta)
+
+    async def obtener_varios(self, titulos: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        titulos = list(dict.fromkeys(titulos))
+        # El pool ya limita las conexiones; el semáforo evita crear miles de tareas esperando una.
+        semaforo = asyncio.Semaphore(self.tamanio_pool)
+
+        async def obtener_uno(titulo: str) -> Optional[Dict]:
+            async with semaforo:
+                return await self.obtener(titulo)
+
+        return dict(zip(titulos, await asyncio.gather(*(obtener_uno(titulo) for titulo in titulos))))
+
+    async def listar(self, **filtros) -> List[Dict]:
+        return datos_de(await self.leer("/movies", parametros_de_listado(**filtros)))
+
+    async def paginar(self, por_pagina: int = POR_PAGINA, **filtros) -> AsyncIterator[Dict]:
+        parametros = parametros_de_listado(limit=por_pagina, **filtros)
+        while True:
+            respuesta = await self.leer("/movies", dict(parametros))
+            for pelicula in datos_de(respuesta):
+                yield pelicula
+            cursor = respuesta.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return
+            parametros["cursor"] = cursor
+
+    async def exportar(self, **filtros) -> AsyncIterator[Dict]:
+        parametros = {**parametros_de_listado(**filtros), "format": "ndjson"}
+        async with self.http.stream("GET", "/movies", params=parametros) as respuesta:
+            if not respuesta.is_success:
+                await respuesta.aread()
+                raise error_de(respuesta)
+            async for linea in respuesta.aiter_lines():
+                if linea:
+                    yield json.loads(linea)
+
+    async def buscar(self, consulta: str, limit: int = 10, prefix: bool = True, fields: Optional[str] = None) -> List[Dict]:
+        parametros = {"q": consulta, "limit": limit, "prefix": str(prefix).lower()}
+        if fields:
+            parametros["fields"] = fields
+        return datos_de(await self.leer("/movies/search", parametros))
+
+    async def cambios(self, desde: Optional[int] = None, epoca: Optional[str] = None, espera: float = 0) -> Dict:
+        return datos_de(await self.pedir("GET", "/movies/changes", params=parametros_de_cambios(desde, epoca, espera),
+                                         timeout=self.timeout + espera))
+
+    # Escritura (requieren credenciales)
+
+    async def agregar(self, pelicula: Dict) -> Dict:
+        return datos_de(await self.escribir([pelicula.get("title")], "POST", "/movies", json=pelicula))
+
+    async def actualizar(self, titulo: str, cambios: Dict) -> Dict:
+        return datos_de(await self.escribir([titulo, cambios.get("title")], "PUT", ruta_de_pelicula(titulo, "/partial"), json=cambios))
+
+    async def borrar(self, titulo: str) -> str:
+        return datos_de(await self.escribir([titulo], "DELETE", ruta_de_pelicula(titulo)))["message"]
+
+    async def importar(self, contenido: bytes, ndjson: bool = False, atomic: bool = True) -> Dict:
+        tipo = "application/x-ndjson" if ndjson else "application/json"
+        respuesta = await self.escribir(None, "POST", "/movies/bulk", content=contenido, headers={"Content-Type": tipo},
+                                        params={"atomic": str(atomic).lower()})
+        return resumen_de_lote(respuesta)
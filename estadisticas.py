@@ -0,0 +1,157 @@
+# ESTADÍSTICAS DEL CATÁLOGO
+
+# Contadores por año, década, género y actor que se mantienen al día con cada alta,
+# modificación o baja (se suscriben al almacén, como el cache de respuestas). Así
+# `GET /movies/stats` no recorre el catálogo: arma la respuesta a partir de los contadores.
+#
+# Para el "top N" de actores (hay decenas de miles, casi todos con una sola película) los
+# actores se agrupan además por cantidad de películas: pedir los N con más películas solo
+# recorre los grupos más altos, no todos los actores.
+
+import heapq
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from almacen import AlmacenPeliculas, normalizar_texto
+
+CAMPOS_ESTADISTICAS = ("year", "genres", "cast")   # Lo único que hace falta leer de cada película.
+
+
+
+# RANKING DE CONTEOS
+
+class RankingDeConteos:
+    """
+    Cuenta apariciones por clave y permite pedir las `k` claves con más apariciones en
+    O(k + conteo máximo), sin ordenar todas. Cada clave está en el grupo de su conteo;
+    sumar o restar 1 la mueve al grupo vecino.
+    """
+
+    def __init__(self):
+        self._conteos: Dict[str, int] = {}
+        self._por_conteo: Dict[int, Dict[str, None]] = {}   # conteo -> claves (un dict usado como set)
+        self._maximo = 0
+
+    def __len__(self) -> int:
+        return len(self._conteos)
+
+    def conteo(self, clave: str) -> int:
+        return self._conteos.get(clave, 0)
+
+    def sumar(self, clave: str, delta: int) -> int:
+        """Suma `delta` (1 o -1) al conteo de la clave y devuelve el conteo nuevo (0 = la clave desaparece)."""
+        anterior = self._conteos.get(clave, 0)
+        nuevo = anterior + delta
+        if anterior:
+            grupo = self._por_conteo[anterior]
+            del grupo[clave]
+            if not grupo:
+                del self._por_conteo[anterior]
+        if nuevo > 0:
+            self._conteos[clave] = nuevo
+            self._por_conteo.setdefault(nuevo, {})[clave] = None
+        else:
+            self._conteos.pop(clave, None)
+        if nuevo > self._maximo:
+            self._maximo = nuevo
+        while self._maximo and self._maximo not in self._por_conteo:
+            self._maximo -= 1
+        return nuevo
+
+    def mayores(self, k: int) -> List[Tuple[str, int]]:
+        """Las `k` claves con más apariciones (a igual conteo, en orden alfabético)."""
+        resultado: List[Tuple[str, int]] = []
+        conteo = self._maximo
+        while conteo > 0 and len(resultado) < k:
+            grupo = self._por_conteo.get(conteo)
+            if grupo:
+                resultado.extend((clave, conteo) for clave in heapq.nsmallest(k - len(resultado), grupo))
+            conteo -= 1
+        return resultado
+
+
+
+# ESTADÍSTICAS
+
+class EstadisticasCatalogo:
+    """
+    Histogramas del catálogo, actualizados por cada cambio del almacén.
+    Cuando el almacén se recarga entero (`cargar`), se vuelven a contar desde cero la
+    próxima vez que se piden.
+
+    Los géneros y actores se cuentan sin distinguir mayúsculas/minúsculas (como los
+    filtros de `GET /movies`), y se muestran con la forma en que aparecieron primero.
+    """
+
+    def __init__(self, almacen: AlmacenPeliculas):
+        self.almacen = almacen
+        self._lock = threading.Lock()
+        self._desactualizadas = True   # Hay que contar todo de nuevo antes de responder.
+        self._limpiar()
+
+    def _limpiar(self) -> None:
+        self._total = 0
+        self._por_anio: Dict[int, int] = {}
+        self._por_decada: Dict[int, int] = {}
+        self._generos = RankingDeConteos()
+        self._actores = RankingDeConteos()
+        self._nombres: Dict[str, str] = {}   # clave normalizada -> cómo se muestra
+
+    # Mantenimiento de los contadores
+
+    def al_cambiar(self, anterior: Optional[Dict], nueva: Optional[Dict]) -> None:
+        """Suscriptor del almacén: resta la versión vieja de la película y suma la nueva."""
+        with self._lock:
+            if anterior is None and nueva is None:
+                self._desactualizadas = True  # Se recargó todo el almacén.
+                return
+            if self._desactualizadas:
+                return  # Se va a contar todo de nuevo igual.
+            if anterior is not None:
+                self._contar(anterior, -1)
+            if nueva is not None:
+                self._contar(nueva, 1)
+
+    def _contar(self, movie: Dict, delta: int) -> None:
+        self._total += delta
+        anio = movie.get("year")
+        if anio is not None:
+            for histograma, clave in ((self._por_anio, anio), (self._por_decada, anio // 10 * 10)):
+                histograma[clave] = histograma.get(clave, 0) + delta
+                if not histograma[clave]:
+                    del histograma[clave]
+        # Una película con el mismo género o actor repetido cuenta una vez (igual que en los índices del almacén).
+        for ranking, valores in ((self._generos, movie.get("genres")), (self._actores, movie.get("cast"))):
+            for clave, nombre in {normalizar_texto(v): v for v in reversed(valores or ())}.items():
+                if ranking.sumar(clave, delta) == 0:
+                    self._nombres.pop(clave, None)
+                else:
+                    self._nombres.setdefault(clave, nombre)
+
+    def _recontar(self) -> None:
+        """Cuenta todo el catálogo de nuevo (sin cargar los campos perezosos de las películas)."""
+        self._limpiar()
+        with self.almacen.bloqueo():
+            for id_pelicula in self.almacen.filtrar_ids():
+                self._contar(self.almacen.obtener_por_id(id_pelicula, CAMPOS_ESTADISTICAS), 1)
+        self._desactualizadas = False
+
+    # Consultas
+
+    def resumen(self, top: int = 10) -> Dict:
+        """Todos los histogramas juntos: por año, década y género, y los `top` actores con más películas."""
+        with self.almacen.bloqueo(), self._lock:
+            if self._desactualizadas:
+                self._recontar()
+            return {
+                "total_movies": self._total,
+                "years": [{"year": anio, "count": n} for anio, n in sorted(self._por_anio.items())],
+                "decades": [{"decade": decada, "count": n} for decada, n in sorted(self._por_decada.items())],
+                "genres": self._ranking(self._generos, len(self._generos), "genre"),
+                "top_cast": self._ranking(self._actores, top, "name"),
+                "distinct_genres": len(self._generos),
+                "distinct_cast": len(self._actores),
+            }
+
+    def _ranking(self, ranking: RankingDeConteos, top: int, campo: str) -> List[Dict]:
+        return [{campo: self._nombres[clave], "count": n} for clave, n in ranking.mayores(top)]
@@ -0,0 +1,101 @@
+# FEED DE CAMBIOS (SINCRONIZACIÓN INCREMENTAL)
+
+# Para mantenerse al día con el catálogo, un cliente o una réplica de lectura no necesita
+# volver a descargar todo `GET /movies`: cada alta, modificación o baja incrementa una
+# versión y queda guardada (ya codificada) en un historial acotado en memoria. Se lee con
+# `GET /movies/changes?since=<versión>` (con espera larga opcional) o como un stream de
+# server-sent events. Cada cambio tiene el mismo formato que una línea del diario (ver
+# `persistencia.cambio_de`) más su versión, así que se aplica con `persistencia.aplicar_cambio`.
+#
+# Las esperas no ocupan un hilo: cada una es un future del event loop, que el suscriptor
+# del almacén (llamado desde el hilo que hizo la escritura) despierta con `call_soon_threadsafe`.
+#
+# El historial es por proceso: con varios workers cada uno tiene el suyo, identificado por
+# su `epoca`. Un cliente que ve otra época (otro worker, o el servidor se reinició) tiene que
+# volver a descargar el catálogo, igual que si pide una versión que ya se descartó.
+
+import asyncio
+import secrets
+import threading
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Tuple
+
+from json_rapido import codificar_json
+from persistencia import cambio_de
+
+MAX_CAMBIOS = 10_000   # Cambios que se guardan como mucho (los más viejos se descartan).
+
+
+def _despertar(futuro: asyncio.Future) -> None:
+    if not futuro.done():  # Pudo haber vencido la espera mientras tanto.
+        futuro.set_result(None)
+
+
+class FeedDeCambios:
+    """
+    Versión del catálogo (empieza en 0 y sube 1 con cada cambio) y los últimos `max_cambios`
+    cambios, ya codificados en JSON. Recargar todo el almacén (`cargar`) también sube la
+    versión, pero no se puede expresar como cambios: descarta el historial, y quien venía de
+    antes tiene que volver a descargar el catálogo.
+    """
+
+    def __init__(self, max_cambios: int = MAX_CAMBIOS):
+        self.epoca = secrets.token_hex(8)   # Identifica este historial (cambia con cada proceso).
+        self.version = 0
+        self._base = 0                      # Versión más vieja desde la que todavía se tienen todos los cambios.
+        self._cambios: Deque[Tuple[int, bytes]] = deque(maxlen=max_cambios)
+        self._lock = threading.Lock()
+        self._esperando: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def al_cambiar(self, anterior: Optional[Dict], nueva: Optional[Dict]) -> None:
+        """Suscriptor del almacén: registra el cambio y despierta a los que esperaban uno."""
+        with self._lock:
+            self.version += 1
+            if anterior is None and nueva is None:
+                self._cambios.clear()  # Se recargó todo el almacén.
+                self._base = self.version
+            else:
+                if len(self._cambios) == self._cambios.maxlen:
+                    self._base = self._cambios[0][0]  # Se descarta el más viejo.
+                cambio = {"version": self.version, **cambio_de(anterior, nueva)}
+                self._cambios.append((self.version, codificar_json(cambio)))
+            esperando, self._esperando = self._esperando, []
+        for loop, futuro in esperando:
+            try:
+                loop.call_soon_threadsafe(_despertar, futuro)
+            except RuntimeError:
+                pass  # Su event loop ya se cerró.
+
+    def disponible(self, desde: int) -> bool:
+        """Indica si se tienen todos los cambios posteriores a la versión `desde`."""
+        return self._base <= desde <= self.version
+
+    def cambios_desde(self, desde: int, limite: int) -> Optional[List[Tuple[int, bytes]]]:
+        """
+        Los (hasta `limite`) cambios posteriores a la versión `desde`, como pares (versión,
+        JSON), o None si ya no están (hay que volver a descargar el catálogo).
+        """
+        with self._lock:
+            if not self.disponible(desde):
+                return None
+            # Las versiones guardadas son consecutivas y terminan en `self.version`.
+            inicio = desde - (self.version - len(self._cambios))
+            return list(islice(self._cambios, inicio, inicio + limite))
+
+    async def esperar(self, desde: int, espera: float) -> None:
+        """Espera (sin ocupar un hilo) hasta que haya una versión posterior a `desde`, o `espera` segundos."""
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        with self._lock:
+            if self.version > desde:
+                return
+            self._esperando.append((loop, futuro))
+        try:
+            await asyncio.wait_for(futuro, espera)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if (loop, futuro) in self._esperando:
+                    self._esperando.remove((loop, futuro))
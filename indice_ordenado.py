@@ -0,0 +1,127 @@
+# LISTA ORDENADA POR BLOQUES
+
+# Índice ordenado para los listados de `GET /movies` con `sort=` y para los filtros por
+# rango o por prefijo: encontrar dónde empieza un rango cuesta O(log N) (búsqueda binaria) y
+# recorrer los k resultados cuesta O(k), sin mirar el resto del catálogo.
+#
+# Una única lista ordenada (`bisect.insort`) tendría que mover en promedio la mitad de sus
+# elementos en cada alta o baja: con un millón de películas, una importación en lote se
+# vuelve cuadrática. Por eso las claves se reparten en bloques ordenados de a lo sumo
+# `2 * TAMANIO_BLOQUE` (parecido a las hojas de un árbol B): insertar o quitar mueve solo los
+# elementos de un bloque, y la lista de máximos de cada bloque dice en cuál buscar.
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain, islice, takewhile
+from typing import Any, Iterable, Iterator, List, Optional
+
+TAMANIO_BLOQUE = 1000  # Claves por bloque al armar la lista (un bloque se parte al llegar al doble).
+
+
+class ListaOrdenada:
+    """
+    Conjunto de claves comparables entre sí (en el almacén, tuplas que terminan en el id de
+    la película, así que no se repiten), recorrible en orden. No es seguro para varios hilos:
+    el almacén la usa siempre con su lock tomado.
+    """
+
+    def __init__(self, claves: Iterable[Any] = ()):
+        ordenadas = sorted(claves)
+        self._bloques: List[List[Any]] = [ordenadas[i:i + TAMANIO_BLOQUE] for i in range(0, len(ordenadas), TAMANIO_BLOQUE)]
+        self._maximos: List[Any] = [bloque[-1] for bloque in self._bloques]
+        self._largo = len(ordenadas)
+
+    def __len__(self) -> int:
+        return self._largo
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(self._bloques)
+
+    def agregar(self, clave: Any) -> None:
+        if not self._bloques:
+            self._bloques.append([clave])
+            self._maximos.append(clave)
+            self._largo = 1
+            return
+        i = min(bisect_left(self._maximos, clave), len(self._bloques) - 1)  # Más grande que todas: va al último.
+        bloque = self._bloques[i]
+        insort(bloque, clave)
+        self._maximos[i] = bloque[-1]
+        self._largo += 1
+        if len(bloque) > 2 * TAMANIO_BLOQUE:
+            mitad = len(bloque) // 2
+            self._bloques[i:i + 1] = [bloque[:mitad], bloque[mitad:]]
+            self._maximos[i:i + 1] = [bloque[mitad - 1], bloque[-1]]
+
+    def quitar(self, clave: Any) -> None:
+        """Saca la clave. Lanza `KeyError` si no está."""
+        i = bisect_left(self._maximos, clave)
+        if i < len(self._bloques):
+            bloque = self._bloques[i]
+            j = bisect_left(bloque, clave)
+            if bloque[j] == clave:  # `bloque[-1]` >= clave, así que `j` está dentro del bloque.
+                del bloque[j]
+                self._largo -= 1
+                if bloque:
+                    self._maximos[i] = bloque[-1]
+                else:
+                    del self._bloques[i], self._maximos[i]
+                return
+        raise KeyError(clave)
+
+    def desde(self, clave: Any) -> Iterator[Any]:
+        """Recorre en orden las claves mayores o iguales que `clave` (que puede ser un prefijo de tupla)."""
+        return self._hacia_adelante(clave, bisect_left)
+
+    def despues_de(self, clave: Any) -> Iterator[Any]:
+        """Recorre en orden las claves estrictamente mayores que `clave`."""
+        return self._hacia_adelante(clave, bisect_right)
+
+    def antes_de(self, clave: Optional[Any]) -> Iterator[Any]:
+        """Recorre de mayor a menor las claves estrictamente menores que `clave` (todas si es None)."""
+        if not self._bloques:
+            return iter(())
+        i = len(self._bloques) if clave is None else bisect_left(self._maximos, clave)
+        if i == len(self._bloques):
+            i -= 1
+            j = len(self._bloques[i])  # Todas las del último bloque son menores.
+        else:
+            j = bisect_left(self._bloques[i], clave)
+        bloque = self._bloques[i]
+        # `islice` sobre `reversed` evita copiar el bloque entero para recorrer solo unas pocas claves.
+        primeras = islice(reversed(bloque), len(bloque) - j, None)
+        return chain(primeras, chain.from_iterable(reversed(b) for b in reversed(self._bloques[:i])))
+
+    def rango(self, desde: Optional[Any], hasta: Optional[Any], descendente: bool = False,
+              despues_de: Optional[Any] = None) -> Iterator[Any]:
+        """
+        Recorre las claves de [`desde`, `hasta`) (None: sin límite), de menor a mayor o de mayor a
+        menor. `despues_de` es una clave ya devuelta (un cursor): se sigue a partir de ella, en el
+        sentido del recorrido. Llegar a la primera clave cuesta O(log N), no O(N).
+        """
+        if not descendente:
+            if despues_de is not None and (desde is None or despues_de >= desde):
+                claves = self.despues_de(despues_de)
+            else:
+                claves = iter(self) if desde is None else self.desde(desde)
+            return claves if hasta is None else takewhile(lambda clave: clave < hasta, claves)
+        if despues_de is not None and (hasta is None or despues_de < hasta):
+            hasta = despues_de
+        claves = self.antes_de(hasta)
+        return claves if desde is None else takewhile(lambda clave: clave >= desde, claves)
+
+    def contar(self, desde: Optional[Any], hasta: Optional[Any]) -> int:
+        """Cuántas claves hay en [`desde`, `hasta`) (None: sin límite). Cuesta O(bloques), no O(N)."""
+        return max(0, (self._largo if hasta is None else self._menores_que(hasta)) -
+                   (0 if desde is None else self._menores_que(desde)))
+
+    def _menores_que(self, clave: Any) -> int:
+        i = bisect_left(self._maximos, clave)
+        anteriores = sum(map(len, self._bloques[:i]))
+        return anteriores if i == len(self._bloques) else anteriores + bisect_left(self._bloques[i], clave)
+
+    def _hacia_adelante(self, clave: Any, buscar) -> Iterator[Any]:
+        i = buscar(self._maximos, clave)
+        if i == len(self._bloques):
+            return iter(())
+        bloque = self._bloques[i]
+        return chain(islice(bloque, buscar(bloque, clave), None), chain.from_iterable(self._bloques[i + 1:]))
@@ -0,0 +1,34 @@
+# JSON RÁPIDO (ORJSON SI ESTÁ INSTALADO)
+
+# Codificar el catálogo entero (la respuesta de `GET /movies` sin filtros, el snapshot JSON)
+# es de lo más caro que hace el servidor. `orjson` lo hace varias veces más rápido que el
+# módulo `json`, pero es opcional: si no está instalado se usa `json`, con la misma salida
+# compacta (sin espacios y con los caracteres no ASCII tal cual, en UTF-8).
+#
+# Los datos que se codifican ya fueron validados al escribirse (ver los modelos de `main`):
+# acá no se vuelven a validar, solo se convierten a bytes.
+
+import json
+from typing import Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def codificar_json(valor) -> bytes:
+    """JSON compacto en UTF-8."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(valor)
+        except TypeError:
+            pass  # Algo que orjson no acepta (claves que no son strings, enteros de más de 64 bits...).
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decodificar_json(datos: Union[bytes, str]):
+    """Los errores son `ValueError` (`json.JSONDecodeError`) con los dos decodificadores."""
+    if orjson is not None:
+        return orjson.loads(datos)
+    return json.loads(datos)
@@ -0,0 +1,258 @@
+# LIMITADOR DE SOLICITUDES (TOKEN BUCKET)
+
+# Cada IP tiene una "cubeta" de fichas por regla: se recarga a `tasa` fichas por segundo
+# hasta un máximo de `rafaga`, y cada petición consume una. Si no quedan fichas, la
+# petición se rechaza con 429. El estado por IP son solo dos números (fichas y momento
+# de la última recarga), medidos con un reloj monotónico.
+#
+# Dónde se guardan las cubetas lo decide un "backend" intercambiable:
+#   - BackendMemoria: un OrderedDict por regla, en la memoria del proceso. Es el más
+#     rápido, pero con `uvicorn --workers N` cada proceso tendría su propio límite.
+#   - BackendSQLite: un archivo SQLite compartido por todos los procesos del equipo;
+#     cada petición se resuelve con una única sentencia atómica, así el límite por IP
+#     se respeta aunque las peticiones lleguen a workers distintos. Esa sentencia puede
+#     tener que esperar el lock de escritura de otro worker, así que el servidor la llama
+#     desde un hilo aparte y no desde el event loop (ver `limitador_de_tasa` en `main`).
+# En ambos casos, una cubeta que lleva quieta lo suficiente como para volver a llenarse
+# es idéntica a una nueva, así que se puede descartar para no acumular IPs inactivas.
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+
+
+PETICIONES_ENTRE_LIMPIEZAS = 64  # Cada cuántas peticiones se buscan cubetas inactivas para descartar.
+
+
+
+# REGLAS Y RESULTADOS
+
+class ReglaDeLimite(NamedTuple):
+    """Límite que se aplica a las peticiones cuyo método y ruta coinciden con la regla."""
+    nombre: str
+    tasa: float                                 # Fichas que se recargan por segundo.
+    rafaga: int                                 # Capacidad de la cubeta (peticiones seguidas permitidas).
+    metodos: Optional[FrozenSet[str]] = None    # None = cualquier método.
+    prefijo: str = "/"                          # Prefijo de la ruta.
+
+    def aplica(self, metodo: str, ruta: str) -> bool:
+        return (self.metodos is None or metodo in self.metodos) and ruta.startswith(self.prefijo)
+
+    @property
+    def segundos_para_llenarse(self) -> float:
+        return self.rafaga / self.tasa
+
+
+class ResultadoLimite(NamedTuple):
+    """Resultado de `consumir`: si se permitió la petición y el estado en que quedó la cubeta."""
+    permitido: bool
+    regla: ReglaDeLimite
+    fichas: float           # Fichas que quedan después de esta petición.
+
+    @property
+    def espera(self) -> float:
+        """Segundos hasta que haya una ficha disponible (0 si se permitió)."""
+        return 0.0 if self.permitido else (1 - self.fichas) / self.regla.tasa
+
+    def headers(self) -> dict:
+        """Headers `X-RateLimit-*` (y `Retry-After` si se rechazó) para la respuesta."""
+        headers = {
+            "X-RateLimit-Limit": str(self.regla.rafaga),
+            "X-RateLimit-Remaining": str(int(self.fichas)),
+            "X-RateLimit-Reset": str(math.ceil((self.regla.rafaga - self.fichas) / self.regla.tasa)),
+        }
+        if not self.permitido:
+            headers["Retry-After"] = str(max(1, math.ceil(self.espera)))
+        return headers
+
+
+
+# BACKENDS
+
+class BackendMemoria:
+    """
+    Cubetas en la memoria del proceso: un OrderedDict por regla, ordenado por último uso,
+    para descartar en O(1) las IPs inactivas y respetar un máximo de IPs recordadas.
+
+    No usa locks: está pensado para llamarse desde el middleware, que corre siempre
+    en el hilo del event loop.
+    """
+
+    def __init__(self, max_clientes: int = 100_000):
+        self.max_clientes = max_clientes
+        # regla -> (ip -> [fichas, momento de la última recarga]), la menos usada primero.
+        self._cubetas: Dict[str, "OrderedDict[str, List[float]]"] = {}
+        self._peticiones = 0
+        self.desalojos = 0
+
+    def __len__(self) -> int:
+        return sum(len(tabla) for tabla in self._cubetas.values())
+
+    # `consumir` corre en cada petición, por eso está escrito pensando en el costo:
+    # sin locks, sin objetos de fecha y sin llamadas que se puedan evitar.
+
+    def consumir(self, regla: ReglaDeLimite, ip: str, ahora: float) -> Tuple[bool, float]:
+        """Intenta sacar una ficha de la cubeta. Devuelve (permitido, fichas que quedan)."""
+        tabla = self._cubetas.get(regla.nombre)
+        if tabla is None:
+            tabla = self._cubetas[regla.nombre] = OrderedDict()
+        cubeta = tabla.get(ip)
+        if cubeta is None:
+            cubeta = tabla[ip] = [float(regla.rafaga), ahora]
+        else:
+            tabla.move_to_end(ip)  # Queda al final: es la más reciente.
+            fichas = cubeta[0] + (ahora - cubeta[1]) * regla.tasa
+            cubeta[0] = fichas if fichas < regla.rafaga else regla.rafaga
+            cubeta[1] = ahora
+
+        fichas = cubeta[0]
+        permitido = fichas >= 1
+        if permitido:
+            fichas = cubeta[0] = fichas - 1
+
+        # La limpieza se hace cada tanto (o si se pasó del máximo), no en cada petición.
+        self._peticiones += 1
+        if len(tabla) > self.max_clientes or not self._peticiones % PETICIONES_ENTRE_LIMPIEZAS:
+            self._desalojar(tabla, regla, ahora)
+        return permitido, fichas
+
+    def _desalojar(self, tabla: "OrderedDict[str, List[float]]", regla: ReglaDeLimite, ahora: float) -> None:
+        """Descarta las cubetas inactivas más viejas y, si hace falta, las que exceden `max_clientes`."""
+        inactividad = regla.segundos_para_llenarse
+        while tabla:
+            ip, (_, ultima) = next(iter(tabla.items()))
+            if len(tabla) <= self.max_clientes and ahora - ultima < inactividad:
+                break
+            del tabla[ip]
+            self.desalojos += 1
+
+
+class BackendSQLite:
+    """
+    Cubetas en un archivo SQLite compartido por todos los procesos del equipo.
+
+    Cada petición es una sola sentencia `INSERT ... ON CONFLICT DO UPDATE ... RETURNING`,
+    que SQLite ejecuta de forma atómica: dos workers no pueden gastar la misma ficha.
+    Como el archivo sobrevive a los reinicios, conviene usarlo con un reloj de pared
+    (`time.time`) en vez del monotónico. Dos procesos pueden leer el reloj en un orden y
+    escribir en el otro, por eso el tiempo transcurrido nunca se toma como negativo.
+
+    `consumir` puede esperar hasta `timeout` segundos el lock de otro proceso: es seguro
+    llamarlo desde varios hilos a la vez (comparten la conexión, de a uno por vez).
+    """
+
+    # Fichas de la cubeta después de recargarla hasta `ahora` (las columnas son los valores previos).
+    _RECARGADA = "min(:rafaga, fichas + max(0, :ahora - ultima) * :tasa)"
+
+    _CONSUMIR = f"""
+        INSERT INTO cubetas (regla, ip, fichas, ultima, permitido)
+        VALUES (:regla, :ip, :rafaga - 1, :ahora, 1)
+        ON CONFLICT (regla, ip) DO UPDATE SET
+            fichas = CASE WHEN {_RECARGADA} >= 1 THEN {_RECARGADA} - 1 ELSE {_RECARGADA} END,
+            permitido = {_RECARGADA} >= 1,
+            ultima = max(ultima, :ahora)
+        RETURNING permitido, fichas
+    """
+
+    def __init__(self, ruta: str, max_clientes: int = 100_000, timeout: float = 5.0):
+        self.ruta = ruta
+        self.max_clientes = max_clientes
+        self.timeout = timeout
+        self._conexion: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._peticiones = 0
+        self._lock = threading.Lock()   # La conexión del proceso la usa un hilo a la vez.
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre la conexión de ESTE proceso (no se puede heredar una conexión SQLite a través de un fork)."""
+        if self._conexion is None or self._pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=OFF")  # Perder el estado del limitador en un corte de luz no importa.
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS cubetas (
+                    regla TEXT NOT NULL,
+                    ip TEXT NOT NULL,
+                    fichas REAL NOT NULL,
+                    ultima REAL NOT NULL,
+                    permitido INTEGER NOT NULL,
+                    PRIMARY KEY (regla, ip)
+                ) WITHOUT ROWID
+            """)
+            conexion.execute("CREATE INDEX IF NOT EXISTS cubetas_por_ultima ON cubetas (ultima)")
+            self._conexion, self._pid = conexion, os.getpid()
+        return self._conexion
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conectar().execute("SELECT count(*) FROM cubetas").fetchone()[0]
+
+    def consumir(self, regla: ReglaDeLimite, ip: str, ahora: float) -> Tuple[bool, float]:
+        """Intenta sacar una ficha de la cubeta. Devuelve (permitido, fichas que quedan)."""
+        with self._lock:
+            conexion = self._conectar()
+            permitido, fichas = conexion.execute(self._CONSUMIR, {
+                "regla": regla.nombre, "ip": ip, "ahora": ahora, "rafaga": regla.rafaga, "tasa": regla.tasa,
+            }).fetchone()
+
+            self._peticiones += 1
+            if not self._peticiones % (PETICIONES_ENTRE_LIMPIEZAS * 16):
+                self._desalojar(conexion, regla, ahora)
+        return bool(permitido), fichas
+
+    def _desalojar(self, conexion: sqlite3.Connection, regla: ReglaDeLimite, ahora: float) -> None:
+        """Borra las cubetas que ya se llenaron solas y, si sobran, las usadas hace más tiempo."""
+        conexion.execute("DELETE FROM cubetas WHERE regla = ? AND ultima <= ?",
+                         (regla.nombre, ahora - regla.segundos_para_llenarse))
+        conexion.execute("""
+            DELETE FROM cubetas WHERE (regla, ip) IN (
+                SELECT regla, ip FROM cubetas ORDER BY ultima LIMIT max(0, (SELECT count(*) FROM cubetas) - ?)
+            )
+        """, (self.max_clientes,))
+
+
+
+# LIMITADOR
+
+# Igual que `ResultadoLimite(...)`, pero sin pasar por el `__new__` en Python de las NamedTuple.
+_nuevo_resultado = tuple.__new__
+
+class LimitadorTokenBucket:
+    """
+    Limitador con una cubeta por IP y regla, guardadas en `backend` (en memoria si no se indica).
+    La primera regla de `reglas` que coincide con la petición es la que se aplica;
+    si ninguna coincide, se usa `regla_por_defecto`.
+    """
+
+    def __init__(self, reglas: List[ReglaDeLimite], regla_por_defecto: ReglaDeLimite,
+                 backend=None, reloj: Callable[[], float] = time.monotonic):
+        self.reglas = list(reglas)
+        self.regla_por_defecto = regla_por_defecto
+        self.backend = backend if backend is not None else BackendMemoria()
+        self._reloj = reloj
+        self._reglas_por_metodo: Dict[str, List[ReglaDeLimite]] = {}  # Reglas candidatas para cada método
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    def regla_para(self, metodo: str, ruta: str) -> ReglaDeLimite:
+        candidatas = self._reglas_por_metodo.get(metodo)
+        if candidatas is None:
+            candidatas = self._reglas_por_metodo[metodo] = [
+                regla for regla in self.reglas if regla.metodos is None or metodo in regla.metodos]
+        for regla in candidatas:
+            if ruta.startswith(regla.prefijo):
+                return regla
+        return self.regla_por_defecto
+
+    def consumir(self, ip: str, metodo: str, ruta: str) -> ResultadoLimite:
+        """Intenta consumir una ficha de la cubeta de `ip` para esta petición."""
+        # Caso común (p. ej. GET sin reglas propias): se resuelve la regla sin llamar a `regla_para`.
+        regla = self.regla_para(metodo, ruta) if self._reglas_por_metodo.get(metodo, True) else self.regla_por_defecto
+        permitido, fichas = self.backend.consumir(regla, ip, self._reloj())
+        return _nuevo_resultado(ResultadoLimite, (permitido, regla, fichas))
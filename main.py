@@ -1,20 +1,40 @@
 # Módulos de FastAPI y relacionados
-from fastapi import FastAPI, Depends, HTTPException, status, Request
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from starlette.responses import JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Query
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials, HTTPBearer
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Match
 
 # Módulos de Pydantic para validación de datos
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
 # Módulos de Python estándar y de terceros
 import secrets  # Para comparación segura de contraseñas
-import json     # Para manejar archivos JSON
 import os       # Para interactuar con el sistema operativo (ej. verificar si un archivo existe)
 import requests # Para hacer peticiones HTTP (descargar el JSON inicial)
-from contextlib import asynccontextmanager # Para el gestor de "lifespan" de FastAPI
-from collections import deque              # Para una cola eficiente en el limitador de tasa
-from datetime import datetime, timedelta   # Para manejar tiempos en el limitador de tasa
-from typing import List, Optional, Dict, Deque # Para "type hints" (ayudas de tipado)
+import time     # Reloj para el limitador de tasa compartido
+import base64   # Para codificar los cursores de paginación de forma opaca
+import threading # Para armar el índice de búsqueda en segundo plano al arrancar
+import asyncio   # Para cargar el catálogo sin bloquear el event loop al arrancar
+from bisect import bisect_right # Para ubicar un cursor dentro de la lista ordenada de ids
+from functools import partial              # Para preparar las operaciones de un lote antes de aplicarlas
+from urllib.parse import urlencode         # Para armar la clave del cache de respuestas
+from email.utils import parsedate_to_datetime # Para leer la fecha de `If-Modified-Since`
+from contextlib import asynccontextmanager, nullcontext # Para el gestor de "lifespan" de FastAPI
+from typing import AsyncIterator, List, Optional, Dict, Iterator, Callable, Set, Tuple # Para "type hints" (ayudas de tipado)
+
+# Módulos propios
+from almacen import ORDENES, AlmacenPeliculas, PeliculaDuplicada, PeliculaNoEncontrada, normalizar_titulo # Almacén en memoria con índice por título
+from persistencia import DiarioCompartido, DiarioDeCambios, cargar_snapshot, escribir_atomicamente # Snapshot + diario de cambios (persistencia incremental)
+from limitador import BackendMemoria, BackendSQLite, LimitadorTokenBucket, ReglaDeLimite # Limitador de tasa por IP (token bucket)
+from estadisticas import EstadisticasCatalogo # Histogramas del catálogo mantenidos con cada cambio
+from feed_cambios import FeedDeCambios # Versión del catálogo e historial de cambios para sincronizar clientes
+from autenticacion import Autenticador, secreto_compartido # Claves con hash y tokens firmados
+from json_rapido import codificar_json, decodificar_json # JSON con orjson si está instalado (si no, con `json`)
+from metricas import REGISTRO, PerfiladorPorMuestreo # Métricas para `GET /metrics` y perfilador activable en caliente
+from cache_respuestas import (              # Cache de respuestas ya serializadas, invalidado por las escrituras
+    CacheRespuestas, EntradaCache, ETIQUETA_CANTIDAD, ETIQUETA_TODO,
+    etiqueta_actor, etiqueta_anio, etiqueta_genero, etiqueta_titulo,
+)
 
 
 
@@ -23,17 +43,99 @@ from typing import List, Optional, Dict, Deque # Para "type hints" (ayudas de ti
 # Aca definimos las constantes y variables que se van a usar en la aplicación.
 
 # Configuración de archivos y URLs 
-DATA_FILE = "movies.json"  # Nombre del archivo local que funcionará como base de datos.
+DATA_FILE = "movies.json"  # Archivo descargado con el catálogo original (semilla del snapshot).
 REMOTE_URL = "https://raw.githubusercontent.com/prust/wikipedia-movie-data/master/movies.json" # URL para descargar los datos si no existen.
+SNAPSHOT_FILE = "movies.bin"  # Snapshot binario (rápido de cargar). Se genera a partir de DATA_FILE la primera vez.
+JOURNAL_FILE = "movies.journal.jsonl"  # Diario donde se agrega cada cambio (se compacta periódicamente dentro de SNAPSHOT_FILE).
+# Catálogo chico (mismo formato que movies.json) con el que se responden las lecturas mientras se carga el
+# verdadero, por ejemplo mientras se descarga la primera vez. Es opcional: si no existe, se responde 503.
+FIXTURE_FILE = os.environ.get("FIXTURE_FILE", "movies.fixture.json")
+TIMEOUT_DESCARGA = 60  # Segundos como máximo para descargar el catálogo.
+
+# Configuración de la persistencia
+FSYNC_POLITICA = "intervalo"   # "siempre" (fsync por cada cambio), "intervalo" (como mucho uno por segundo) o "nunca".
+FSYNC_INTERVALO = 1.0          # Segundos entre fsyncs con la política "intervalo".
+CAMBIOS_PARA_COMPACTAR = 1000  # Cantidad de cambios en el diario que disparan una compactación en segundo plano.
+# Segundos que el escritor del diario JSONL espera para juntar los cambios que llegan seguidos y escribirlos
+# juntos, fuera de las peticiones (None: cada petición escribe su cambio). Con "sqlite" no aplica: el
+# cambio tiene que confirmarse en la base antes de soltar el lock compartido entre workers. Si el proceso se cae, se pierden
+# como mucho los cambios de ese lapso; al apagar el servidor normalmente se escribe todo.
+DEMORA_ESCRITURA = 0.05
+# Dónde se guarda el diario: "diario" (archivo JSONL, un solo proceso) o "sqlite" (base compartida
+# por todos los workers, necesario con `uvicorn main:app --workers N`). Se puede cambiar con variables de entorno.
+ALMACEN_BACKEND = os.environ.get("ALMACEN_BACKEND", "diario")
+ALMACEN_ARCHIVO = os.environ.get("ALMACEN_ARCHIVO", "movies.sqlite3")
+
+# Configuración del cache de respuestas
+CACHE_MAX_ENTRADAS = 1024             # Respuestas distintas que se guardan como máximo.
+CACHE_MAX_BYTES = 64 * 1024 * 1024    # Tamaño máximo total de las respuestas guardadas (64 MB).
+
+# Configuración del feed de cambios (`GET /movies/changes`)
+MAX_CAMBIOS_FEED = 10_000             # Cambios que se recuerdan; quien se atrasa más tiene que volver a descargar todo.
+MAX_CAMBIOS_POR_RESPUESTA = 1000      # Cambios que se devuelven como mucho en cada respuesta.
+ESPERA_MAXIMA_CAMBIOS = 30            # Segundos que puede esperar un long-poll.
+LATIDO_SSE = 15                       # Cada cuántos segundos sin cambios el stream SSE manda un comentario (para que no se corte).
 
 # Configuración del Limitador de Solicitudes (Rate Limiter) 
-VENTANA_TIEMPO = timedelta(seconds=1)  # La ventana de tiempo para contar las peticiones (1 segundo).
-MAX_PETICIONES = 10                    # Número máximo de peticiones permitidas dentro de la ventana de tiempo.
+# Cada IP tiene una "cubeta" de fichas que se recarga a MAX_PETICIONES por segundo (token bucket).
+MAX_PETICIONES = 10                    # Peticiones por segundo permitidas por IP (y ráfaga máxima).
+MAX_PETICIONES_ESCRITURA = 2           # Límite más estricto para POST/PUT/DELETE, por segundo.
+RAFAGA_ESCRITURA = 5                   # Escrituras seguidas permitidas antes de aplicar el límite anterior.
+MAX_IPS_LIMITADOR = 100_000            # IPs distintas que el limitador recuerda como máximo (las inactivas se descartan).
+# Dónde se guardan las cubetas: "memoria" (por proceso) o "sqlite" (compartidas entre todos los
+# workers del equipo, necesario con `uvicorn main:app --workers N`). Se puede cambiar con variables de entorno.
+LIMITADOR_BACKEND = os.environ.get("LIMITADOR_BACKEND", "memoria")
+LIMITADOR_ARCHIVO = os.environ.get("LIMITADOR_ARCHIVO", "limitador.sqlite3")
+
+# Configuración de la autenticación
+# Archivo con el secreto que firma los tokens de `POST /auth/token`. Sin archivo, cada proceso
+# inventa el suyo: alcanza con un solo worker, pero con `--workers N` hay que indicarlo para que
+# todos acepten los tokens de los demás. Se puede cambiar con variables de entorno.
+TOKEN_SECRETO_ARCHIVO = os.environ.get("TOKEN_SECRETO_ARCHIVO")
 
 #"Bases de datos" en memoria 
-USUARIOS_DB: Dict[str, str] = {"admin": "supersecret"} # Diccionario que simula una DB de usuarios para autenticación.
-historial_peticiones: Dict[str, Deque[datetime]] = {}  # Diccionario para almacenar los timestamps de las peticiones de cada IP.
-movies_db: List[Dict] = []                             # Lista que contendrá todas las películas una vez cargadas en memoria.
+# Diccionario que simula una DB de usuarios para autenticación: usuario -> hash de la clave
+# (se genera con `python -c "from autenticacion import hashear_clave; print(hashear_clave('clave'))"`).
+USUARIOS_DB: Dict[str, str] = {
+    "admin": "pbkdf2_sha256$600000$mkfoppTtW3Q8gtjH3popVQ$-MMT98EYzcnDyEuSoSm7sgotE1c1K9iLb5vHCXTTjBc",  # supersecret
+}
+# Estado del limitador: una cubeta por IP y regla (las escrituras tienen su propia regla, más estricta).
+REGLAS_LIMITADOR = [ReglaDeLimite("escritura", MAX_PETICIONES_ESCRITURA, RAFAGA_ESCRITURA, frozenset({"POST", "PUT", "PATCH", "DELETE"}))]
+REGLA_LECTURA = ReglaDeLimite("lectura", MAX_PETICIONES, MAX_PETICIONES)
+if LIMITADOR_BACKEND == "sqlite":
+    # El backend compartido usa el reloj de pared: el monotónico no es comparable después de un reinicio.
+    limitador = LimitadorTokenBucket(REGLAS_LIMITADOR, REGLA_LECTURA, BackendSQLite(LIMITADOR_ARCHIVO, MAX_IPS_LIMITADOR), reloj=time.time)
+else:
+    limitador = LimitadorTokenBucket(REGLAS_LIMITADOR, REGLA_LECTURA, BackendMemoria(MAX_IPS_LIMITADOR))
+movies_db = AlmacenPeliculas()                         # Almacén que contendrá todas las películas (indexadas por título) una vez cargadas en memoria.
+diario = None                                          # DiarioDeCambios o DiarioCompartido, se crea al cargar los datos.
+cargando_datos = threading.Event()                     # Marcado mientras el catálogo se carga en segundo plano.
+hay_catalogo_de_prueba = False                         # Si se cargó FIXTURE_FILE para responder mientras tanto.
+error_de_carga: Optional[str] = None                   # Por qué falló la carga del catálogo (si falló).
+cache_respuestas = CacheRespuestas(CACHE_MAX_ENTRADAS, CACHE_MAX_BYTES) # Respuestas de lectura ya codificadas.
+movies_db.suscribir(cache_respuestas.al_cambiar)       # Cada escritura invalida solo las respuestas que afecta.
+estadisticas = EstadisticasCatalogo(movies_db)           # Conteos por año, década, género y actor.
+movies_db.suscribir(estadisticas.al_cambiar)            # Cada escritura actualiza los conteos, sin recorrer el catálogo.
+feed = FeedDeCambios(MAX_CAMBIOS_FEED)                  # Versión del catálogo y últimos cambios, para sincronizar.
+movies_db.suscribir(feed.al_cambiar)
+perfilador = PerfiladorPorMuestreo()                   # Apagado hasta que se pida con `POST /debug/profiler/start`.
+autenticador = Autenticador(USUARIOS_DB, secreto_compartido(TOKEN_SECRETO_ARCHIVO) if TOKEN_SECRETO_ARCHIVO
+                            else secrets.token_bytes(32))  # Verifica claves (recordando las correctas) y tokens.
+
+# Métricas que se calculan al exportar `GET /metrics` (las de las peticiones se definen con su middleware).
+REGISTRO.calculada("movies_store_movies", "Películas en el almacén.", lambda: len(movies_db))
+REGISTRO.calculada("movies_catalog_version", "Versión del catálogo (sube con cada cambio).", lambda: feed.version)
+REGISTRO.calculada("movies_catalog_loading", "1 mientras el catálogo se carga en segundo plano.", lambda: int(cargando_datos.is_set()))
+REGISTRO.calculada("movies_snapshot_bytes", "Tamaño del snapshot en disco.",
+                   lambda: os.path.getsize(SNAPSHOT_FILE) if os.path.exists(SNAPSHOT_FILE) else 0)
+for dato, tipo, ayuda in (("entries", "gauge", "Respuestas guardadas en el cache."),
+                          ("bytes", "gauge", "Bytes de las respuestas guardadas en el cache."),
+                          ("hits", "counter", "Peticiones respondidas desde el cache."),
+                          ("misses", "counter", "Peticiones que no estaban en el cache."),
+                          ("evictions", "counter", "Respuestas desalojadas del cache por falta de lugar."),
+                          ("invalidations", "counter", "Respuestas invalidadas por escrituras.")):
+    nombre = f"movies_response_cache_{dato}" + ("_total" if tipo == "counter" else "")
+    REGISTRO.calculada(nombre, ayuda, lambda dato=dato: cache_respuestas.estadisticas()[dato], tipo)
 
 
 
@@ -44,19 +146,37 @@ movies_db: List[Dict] = []                             # Lista que contendrá to
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    Función que se ejecuta al arrancar el servidor.
-    Se encarga de llamar a `initialize_data` para cargar las películas en memoria.
+    Función que se ejecuta al arrancar y al apagar el servidor.
+    Al arrancar empieza a cargar las películas en segundo plano (`arrancar_datos`): el servidor
+    atiende desde el primer momento, con el catálogo de prueba mientras tanto (si existe);
+    al apagar, espera a que termine la carga y baja a disco lo que quede pendiente del diario de cambios.
     """
-    initialize_data()
+    global hay_catalogo_de_prueba
+    cargando_datos.set()
+    if os.path.exists(FIXTURE_FILE):
+        cargar_snapshot(movies_db, FIXTURE_FILE)  # Es chico: se carga antes de atender.
+        hay_catalogo_de_prueba = True
+    carga = asyncio.create_task(arrancar_datos())
     yield  # El servidor se ejecuta mientras el código está en este punto.
-    
+    await carga
+    perfilador.detener()
+    if diario is not None:
+        await asyncio.to_thread(diario.cerrar)
+
+
+# Respuesta JSON que codifica con `json_rapido` (orjson si está instalado). Es la que usan
+# todos los endpoints que devuelven dicts o listas.
+class RespuestaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        return codificar_json(content)
 
 # instancia principal de la aplicación FastAPI 
 # se crea la aplicación y se le asigna un título, descripción y el gestor de lifespan.
 app = FastAPI(
     title="API de Películas",
-    description=f"Una API para gestionar una colección de películas. Límite: {MAX_PETICIONES} solicitudes por segundo por IP.",
-    lifespan=lifespan
+    description=f"Una API para gestionar una colección de películas. Límite: {MAX_PETICIONES} solicitudes por segundo por IP ({MAX_PETICIONES_ESCRITURA} para escrituras).",
+    lifespan=lifespan,
+    default_response_class=RespuestaJSON,
 )
 
 
@@ -65,66 +185,188 @@ app = FastAPI(
 
 # función que procesa CADA petición antes de que llegue al endpoint, y también procesa cada respuesta antes de ser enviada al cliente.
 
+@app.middleware("http")
+async def catalogo_disponible(request: Request, call_next):
+    """
+    Mientras el catálogo se carga (ver `lifespan`), las lecturas de /movies se responden con
+    el catálogo de prueba, marcadas con `X-Catalog-Source: fixture`, y las escrituras se
+    rechazan con 503: irían a un almacén que está por ser reemplazado. Si la carga falló,
+    todo /movies responde 503 con el motivo.
+    """
+    if not cargando_datos.is_set() or not request.url.path.startswith("/movies"):
+        return await call_next(request)
+    if request.method not in ("GET", "HEAD") or not hay_catalogo_de_prueba or error_de_carga:
+        return RespuestaJSON(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": error_de_carga or "El catálogo se está cargando. Intente de nuevo en unos segundos."},
+            headers={"Retry-After": "1"},
+        )
+    response = await call_next(request)
+    response.headers["X-Catalog-Source"] = "fixture"
+    return response
+
+@app.middleware("http")
+async def sincronizar_almacen(request: Request, call_next):
+    """
+    Con varios workers, aplica al almacén de este proceso los cambios que hicieron los demás
+    antes de atender la petición. Ver si hubo cambios es una consulta barata a SQLite y se
+    hace acá; aplicarlos puede esperar el lock de escritura de otro worker o recargar todo el
+    catálogo, así que se hace en otro hilo para no frenar el event loop. Mientras el catálogo
+    se carga no se sincroniza: de eso se encarga la carga misma.
+    Se registra antes que el limitador, así corre solo para las peticiones que este deja pasar.
+    """
+    if diario is not None and not cargando_datos.is_set() and diario.hay_cambios_ajenos():
+        await asyncio.to_thread(diario.sincronizar)
+    return await call_next(request)
+
 @app.middleware("http")
 async def limitador_de_tasa(request: Request, call_next):
     """
     Este middleware revisa la IP de cada petición y comprueba si ha superado el límite.
+    Agrega a la respuesta los headers `X-RateLimit-*` (y `Retry-After` si la rechaza).
+    Con el backend SQLite la consulta puede esperar (hasta su `timeout`) a que otro worker
+    suelte el lock, así que se hace en otro hilo: el event loop sigue atendiendo mientras
+    tanto. El backend en memoria no espera nada y se consulta acá mismo.
     """
-    ip = request.client.host
-    ahora = datetime.utcnow()
-    historial_ip = historial_peticiones.setdefault(ip, deque())
-
-    # Elimina los timestamps de peticiones que ya son más antiguos que la ventana de tiempo.
-    while historial_ip and (ahora - historial_ip[0]) > VENTANA_TIEMPO:
-        historial_ip.popleft()
+    if isinstance(limitador.backend, BackendSQLite):
+        resultado = await asyncio.to_thread(limitador.consumir, request.client.host, request.method, request.url.path)
+    else:
+        resultado = limitador.consumir(request.client.host, request.method, request.url.path)
 
-    # si el número de peticiones restantes es mayor o igual al máximo, deniega la petición.
-    if len(historial_ip) >= MAX_PETICIONES:
-        return JSONResponse(
+    # Si la cubeta de la IP no tiene fichas, deniega la petición.
+    if not resultado.permitido:
+        RECHAZOS_LIMITADOR.sumar(plantilla_de_ruta(request.scope), resultado.regla.nombre)
+        return RespuestaJSON(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            content={"detail": f"Límite de solicitudes alcanzado ({MAX_PETICIONES} por segundo)."},
+            content={"detail": f"Límite de solicitudes alcanzado ({resultado.regla.tasa:g} por segundo)."},
+            headers=resultado.headers(),
         )
 
-    # Si no se supera el límite, registra el timestamp de la petición actual.
-    historial_ip.append(ahora)
-    
     # Deja que la petición continúe su curso normal hacia el endpoint.
     response = await call_next(request)
+    response.headers.update(resultado.headers())
     return response
 
 
 
+# MÉTRICAS DE LAS PETICIONES
+
+PETICIONES = REGISTRO.contador("movies_http_requests_total", "Peticiones atendidas, por método, ruta y código de estado.",
+                               ("method", "route", "status"))
+DURACION_PETICIONES = REGISTRO.histograma("movies_http_request_duration_seconds",
+                                          "Tiempo hasta terminar de enviar la respuesta, por método y ruta.", ("method", "route"))
+RECHAZOS_LIMITADOR = REGISTRO.contador("movies_rate_limit_rejections_total",
+                                       "Peticiones rechazadas por el limitador de tasa, por ruta y regla.", ("route", "rule"))
+
+def plantilla_de_ruta(scope: Dict) -> str:
+    """
+    Ruta declarada que atiende la petición (por ejemplo "/movies/{title}" y no el título
+    pedido), para que las métricas no tengan una serie distinta por película.
+    """
+    ruta = scope.get("route")
+    if ruta is None:  # No llegó al router (la respondió un middleware): se busca a mano.
+        ruta = next((candidata for candidata in app.router.routes if candidata.matches(scope)[0] != Match.NONE), None)
+    return ruta.path if ruta is not None else "sin_ruta"
+
+class MedirPeticiones:
+    """
+    Middleware ASGI que cuenta las peticiones y mide cuánto tardan, por ruta. Es ASGI "puro"
+    (y no `@app.middleware`) para costar casi nada y para medir hasta el último byte de las
+    respuestas en streaming. Se agrega último, así envuelve a todos los demás.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inicio = time.perf_counter()
+        estado = 500  # Si la app falla sin responder, es lo que termina recibiendo el cliente.
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            ruta = plantilla_de_ruta(scope)
+            PETICIONES.sumar(scope["method"], ruta, str(estado))
+            DURACION_PETICIONES.observar(time.perf_counter() - inicio, scope["method"], ruta)
+
+app.add_middleware(MedirPeticiones)
+
+
+
 # FUNCIONES AUXILIARES (Manejo de Datos) 
 
 
+async def arrancar_datos():
+    """
+    Carga el catálogo sin bloquear el event loop: la descarga y la lectura de los archivos
+    (`initialize_data`) corren en otro hilo. Al terminar deja de responder con el catálogo
+    de prueba y empieza a armar el índice de búsqueda.
+    """
+    global error_de_carga
+    try:
+        await asyncio.to_thread(initialize_data)
+    except Exception as e:
+        error_de_carga = str(e)  # /movies sigue respondiendo 503, con este detalle.
+        print(error_de_carga)
+        return
+    cargando_datos.clear()
+    # El índice de texto completo tarda unos segundos: se arma sin demorar el arranque
+    # (si llega una búsqueda antes, esa petición espera a que termine).
+    threading.Thread(target=movies_db.preparar_busqueda, name="indice-busqueda", daemon=True).start()
+
 def initialize_data():
     """
-    Carga los datos en la variable `movies_db`.
-    Si el archivo `movies.json` no existe, lo descarga de la web.
+    Carga los datos en el almacén `movies_db` (que arma su índice por título).
+    Usa el snapshot binario si existe; si no, `movies.json` (y si tampoco existe, lo descarga de la web).
+    Después reaplica los cambios del diario y deja al diario registrando los nuevos.
     """
-    global movies_db
-    if not os.path.exists(DATA_FILE):
+    global diario
+    if not os.path.exists(SNAPSHOT_FILE) and not os.path.exists(DATA_FILE):
         print("Archivo de datos no encontrado. Descargando desde la web...") 
         try:
-            response = requests.get(REMOTE_URL)
+            response = requests.get(REMOTE_URL, timeout=TIMEOUT_DESCARGA)
             response.raise_for_status() # Lanza un error si la descarga falló.
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(response.json(), f, indent=2, ensure_ascii=False)
+            # Se escribe de forma atómica: con varios workers, otro proceso podría estar leyéndolo.
+            escribir_atomicamente(DATA_FILE, codificar_json(decodificar_json(response.content)))
         except requests.RequestException as e:
             raise Exception(f"CRÍTICO: No se pudo descargar el archivo de películas: {e}")
     
-    # Carga el contenido del archivo JSON en la lista en memoria.
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        movies_db = json.load(f)
-    
-    
-def save_data():
+    # Carga el snapshot (movies.bin, o movies.json la primera vez) + el diario en el almacén en memoria.
+    # Desde acá, cada cambio del almacén se agrega al diario: ya no hace falta reescribir todo el archivo.
+    if diario is not None:
+        diario.cerrar()  # Si se recarga en caliente, el diario anterior deja de registrar cambios.
+    if ALMACEN_BACKEND == "sqlite":
+        diario = DiarioCompartido(
+            movies_db, SNAPSHOT_FILE, ALMACEN_ARCHIVO,
+            politica_fsync=FSYNC_POLITICA,
+            cambios_para_compactar=CAMBIOS_PARA_COMPACTAR,
+            archivo_semilla=DATA_FILE,
+        )
+    else:
+        diario = DiarioDeCambios(
+            movies_db, SNAPSHOT_FILE, JOURNAL_FILE,
+            politica_fsync=FSYNC_POLITICA,
+            intervalo_fsync=FSYNC_INTERVALO,
+            cambios_para_compactar=CAMBIOS_PARA_COMPACTAR,
+            archivo_semilla=DATA_FILE,
+            demora_escritura=DEMORA_ESCRITURA,
+        )
+    diario.recuperar()  # Al recargar el almacén se limpia también el cache de respuestas.
+
+def escritura():
     """
-    Guarda el estado actual de la lista `movies_db` en el archivo `movies.json`.
-    Se llama cada vez que hay una modificación (añadir, borrar, actualizar).
+    Bloque en el que los endpoints protegidos leen y modifican el almacén sin que otra
+    escritura (de este worker o de otro) se meta en el medio.
     """
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(movies_db, f, indent=2, ensure_ascii=False)
+    return diario.escritura() if diario is not None else nullcontext()
 
 
 
@@ -145,6 +387,12 @@ class Movie(BaseModel):
     thumbnail_width: Optional[int] = None
     thumbnail_height: Optional[int] = None
 
+CAMPOS_MOVIE = list(Movie.model_fields) # Campos de una película, en el orden en que se devuelven.
+
+# Resultado de una búsqueda de texto completo: la película y su puntaje (mayor = más relevante)
+class MovieSearchResult(Movie):
+    score: float = Field(..., description="Relevancia según BM25")
+
 # Modelo para actualizar una película (todos los campos son opcionales) 
 class MovieUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1)
@@ -152,18 +400,24 @@ class MovieUpdate(BaseModel):
     cast: Optional[List[str]] = None
     genres: Optional[List[str]] = None
 
+# Elemento de `PATCH /movies/bulk`: a qué película (por su título actual) y qué campos cambiar
+class MovieBulkUpdate(BaseModel):
+    title: str = Field(..., min_length=1, description="Título actual de la película")
+    changes: MovieUpdate
+
 # Configuración de Autenticación 
-security = HTTPBasic() # Define que usaremos el esquema de autenticación HTTP Basic.
+# Los endpoints protegidos aceptan HTTP Basic (usuario y contraseña en cada petición) o un token
+# obtenido con `POST /auth/token` (`Authorization: Bearer ...`), que es más barato de verificar.
+security = HTTPBasic(auto_error=False)        # Esquema HTTP Basic (no falla solo: puede venir un token).
+seguridad_token = HTTPBearer(auto_error=False)  # Esquema "Bearer" para los tokens.
 
-def verificar_credenciales(credentials: HTTPBasicCredentials = Depends(security)) -> str:
+def verificar_usuario_y_clave(credentials: Optional[HTTPBasicCredentials] = Depends(security)) -> str:
     """
-    Función de dependencia que se encarga de validar el usuario y contraseña.
-    Es usada en los endpoints protegidos.
+    Función de dependencia que valida el usuario y contraseña (solo HTTP Basic).
+    La usa `POST /auth/token` para emitir un token.
     """
-    # Busca el usuario en nuestra "base de datos"
-    password_correcta = USUARIOS_DB.get(credentials.username)
-    # Compara la contraseña de forma segura para evitar "timing attacks"
-    if not password_correcta or not secrets.compare_digest(credentials.password, password_correcta):
+    # Compara contra el hash guardado (recordando por un rato las credenciales correctas)
+    if credentials is None or not autenticador.verificar_clave(credentials.username, credentials.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales incorrectas",
@@ -171,6 +425,332 @@ def verificar_credenciales(credentials: HTTPBasicCredentials = Depends(security)
         )
     return credentials.username # Si es correcto, devuelve el nombre del usuario.
 
+def verificar_credenciales(token: Optional[HTTPAuthorizationCredentials] = Depends(seguridad_token),
+                           credentials: Optional[HTTPBasicCredentials] = Depends(security)) -> str:
+    """
+    Función de dependencia que se encarga de validar el token o el usuario y contraseña.
+    Es usada en los endpoints protegidos.
+    """
+    if token is None:
+        return verificar_usuario_y_clave(credentials)
+    # El token se verifica solo con su firma y su vencimiento, sin buscar al usuario.
+    usuario = autenticador.verificar_token(token.credentials)
+    if usuario is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido o vencido",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return usuario
+
+
+
+# PAGINACIÓN, PROYECCIÓN Y STREAMING DE RESPUESTAS
+
+# Las películas guardadas ya fueron validadas al escribirse, así que los listados se arman
+# directamente con los campos pedidos, sin pasar de nuevo cada una por el modelo `Movie`.
+
+TAMANIO_BLOQUE_NDJSON = 1000  # Películas que se serializan juntas en cada trozo del streaming NDJSON.
+
+def parsear_campos(fields: Optional[str]) -> List[str]:
+    """Convierte el parámetro `fields` ("title,year") en la lista de campos a devolver."""
+    if not fields:
+        return CAMPOS_MOVIE
+    campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+    desconocidos = [campo for campo in campos if campo not in CAMPOS_MOVIE]
+    if desconocidos or not campos:
+        raise HTTPException(status_code=400, detail=f"Campos no válidos: {', '.join(desconocidos)}. Opciones: {', '.join(CAMPOS_MOVIE)}")
+    return campos
+
+def proyectar(movie: Dict, campos: List[str]) -> Dict:
+    """Devuelve solo los `campos` pedidos de la película (los que falten salen como null)."""
+    return {campo: movie.get(campo) for campo in campos}
+
+def codificar_cursor(id_pelicula: int) -> str:
+    """Arma el cursor opaco que apunta a "después de esta película"."""
+    return base64.urlsafe_b64encode(f"id:{id_pelicula}".encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str) -> int:
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefijo, id_pelicula = texto.split(":")
+        if prefijo != "id":
+            raise ValueError(prefijo)
+        return int(id_pelicula)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def codificar_cursor_de_orden(orden: str, clave: Tuple) -> str:
+    """Cursor de un listado ordenado con `sort`: "después de esta clave de orden" (ver `almacen.ORDENES`)."""
+    return base64.urlsafe_b64encode(orden.encode() + b":" + codificar_json(list(clave))).decode().rstrip("=")
+
+def decodificar_cursor_de_orden(cursor: str, orden: str) -> Tuple:
+    try:
+        prefijo, _, clave = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).partition(b":")
+        clave = decodificar_json(clave)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    tipos = ORDENES[orden]
+    # El cursor tiene que ser del mismo orden que el listado: si no, las claves no se pueden comparar.
+    if prefijo != orden.encode() or type(clave) is not list or len(clave) != len(tipos) \
+            or any(type(v) is not t for v, t in zip(clave, tipos)):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return tuple(clave)
+
+def generar_ndjson(ids: List[int], campos: List[str]) -> Iterator[bytes]:
+    """
+    Serializa las películas de a bloques, una por línea, a medida que se envían.
+    Así exportar todo el catálogo no arma un único JSON gigante en memoria.
+    """
+    for inicio in range(0, len(ids), TAMANIO_BLOQUE_NDJSON):
+        lineas = []
+        for id_pelicula in ids[inicio:inicio + TAMANIO_BLOQUE_NDJSON]:
+            movie = movies_db.obtener_por_id(id_pelicula, campos)
+            if movie is not None:  # Pudo haberse borrado mientras se enviaba la respuesta.
+                lineas.append(codificar_json(proyectar(movie, campos)))
+        if lineas:
+            yield b"\n".join(lineas) + b"\n"
+
+
+
+# CACHE DE RESPUESTAS
+
+def clave_de_cache(request: Request) -> str:
+    """Ruta + parámetros de la query (ordenados, para que el orden en la URL no importe)."""
+    return f"{request.url.path}?{urlencode(sorted(request.query_params.multi_items()))}"
+
+def etag_coincide(request: Request, etag: str) -> bool:
+    """Indica si el `If-None-Match` del cliente incluye el ETag actual."""
+    pedidos = {e.strip().removeprefix("W/") for e in request.headers.get("if-none-match", "").split(",")}
+    return etag in pedidos or "*" in pedidos
+
+def sin_cambios(request: Request, entrada: EntradaCache) -> bool:
+    """
+    Indica si el cliente ya tiene esta versión: por ETag (`If-None-Match`) o, si no manda
+    ninguno, por fecha (`If-Modified-Since`). La fecha tiene resolución de un segundo, así
+    que el ETag es más confiable: si vienen los dos, manda el ETag (como pide HTTP). Una
+    entrada creada en el mismo segundo que un cambio no tiene fecha y no se valida por fecha.
+    """
+    if "if-none-match" in request.headers:
+        return etag_coincide(request, entrada.etag)
+    desde = request.headers.get("if-modified-since")
+    if desde is None or entrada.modificada is None:
+        return False
+    try:
+        return entrada.creada <= parsedate_to_datetime(desde).timestamp()
+    except (TypeError, ValueError):
+        return False  # Fecha inválida: se ignora el header.
+
+def headers_de_version() -> Dict[str, str]:
+    """Versión y época actuales del catálogo (ver el feed de cambios)."""
+    return {"X-Catalog-Version": str(feed.version), "X-Catalog-Epoch": feed.epoca}
+
+def responder_con_cache(request: Request, etiqueta: str, generar: Callable[[], Tuple[object, Dict[str, str]]],
+                        con_version: bool = False) -> Response:
+    """
+    Devuelve la respuesta cacheada para esta ruta + query, o la genera con `generar()`
+    (que devuelve el contenido y los headers) y la guarda. Responde 304 si el cliente ya
+    tiene la misma versión (`If-None-Match` o `If-Modified-Since`).
+
+    Con `con_version` agrega `X-Catalog-Version`/`X-Catalog-Epoch` al responder, no al
+    generar: una entrada que sigue en el cache es la vigente en la versión actual, aunque
+    se haya generado muchas versiones antes (los cambios que no la tocan no la invalidan).
+    La versión se lee antes que el cache: el cache se invalida antes de que el feed suba de
+    versión (se suscribió antes al almacén), así que la entrada incluye todo hasta ahí.
+    """
+    version_catalogo = headers_de_version() if con_version else {}
+    clave = clave_de_cache(request)
+    entrada = cache_respuestas.obtener(clave)
+    if entrada is None:
+        inicio = time.time()
+        version = cache_respuestas.version
+        contenido, headers = generar()
+        entrada = EntradaCache(codificar_json(contenido), headers, etiqueta, creada=inicio,
+                               fecha_confiable=not cache_respuestas.hubo_cambios_desde(inicio))
+        cache_respuestas.guardar(clave, entrada, version)
+
+    headers = {**entrada.headers, **version_catalogo, "ETag": entrada.etag}
+    if entrada.modificada is not None:
+        headers["Last-Modified"] = entrada.modificada
+    if sin_cambios(request, entrada):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(entrada.cuerpo, media_type="application/json", headers=headers)
+
+def etiqueta_de_listado(year: Optional[int], genre: List[str], cast: List[str]) -> str:
+    """
+    Etiqueta de la que depende un listado. Alcanza con una: cualquier película que entre o
+    salga del listado tiene que tener (antes o después del cambio) ese año, género o actor.
+    """
+    if year is not None:
+        return etiqueta_anio(year)
+    if genre:
+        return etiqueta_genero(genre[0])
+    if cast:
+        return etiqueta_actor(cast[0])
+    return ETIQUETA_TODO
+
+
+
+# ESCRITURAS EN LOTE
+
+# `POST/PATCH/DELETE /movies/bulk` reciben muchas operaciones en una sola petición (un array
+# JSON, o NDJSON con un elemento por línea). Primero se validan todos los elementos, después
+# se planifican sobre una vista del catálogo que incluye los cambios anteriores del mismo lote
+# (así se detectan, por ejemplo, dos altas con el mismo título) y recién entonces se aplican,
+# todas dentro de un único bloque `escritura()`: el diario las baja a disco juntas.
+# Si algún elemento tiene errores no se aplica ninguno, salvo que se pida `atomic=false`.
+
+MAX_ELEMENTOS_LOTE = 200_000   # Elementos que se aceptan como mucho en un mismo lote.
+TIPOS_NDJSON = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+class ErrorDeElemento(Exception):
+    """Un elemento del lote no se puede aplicar. Lleva el código HTTP que tendría la operación sola."""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class EstadoDelLote:
+    """
+    Cómo va quedando el catálogo a medida que se planifican las operaciones de un lote, sin
+    modificar el almacén: guarda solo los títulos que tocó el lote y para el resto consulta
+    el almacén. Se usa dentro del mismo bloque `escritura()` en el que después se aplica todo.
+    """
+    REPETIDA = object()  # El título sigue existiendo (otra película con el mismo nombre), pero no se sabe cuál es.
+
+    def __init__(self):
+        self._tocadas: Dict[str, object] = {}   # título normalizado -> película como quedaría, None o REPETIDA
+        self._borradas: Set[str] = set()         # Títulos de los que el lote ya borró todas las películas
+
+    def existe(self, titulo: str) -> bool:
+        clave = normalizar_titulo(titulo)
+        if clave in self._tocadas:
+            return self._tocadas[clave] is not None
+        return movies_db.existe(titulo)
+
+    def obtener(self, titulo: str) -> Optional[Dict]:
+        clave = normalizar_titulo(titulo)
+        if clave not in self._tocadas:
+            return movies_db.obtener(titulo)
+        pelicula = self._tocadas[clave]
+        if pelicula is EstadoDelLote.REPETIDA:
+            raise ErrorDeElemento(409, "Hay varias películas con ese título y una ya se modificó en este lote")
+        return pelicula
+
+    def guardar(self, pelicula: Dict) -> None:
+        self._tocadas[normalizar_titulo(pelicula["title"])] = pelicula
+
+    def quitar(self, titulo: str, todas: bool) -> None:
+        """Saca la película `titulo` (o todas las que tienen ese título, como hace un DELETE)."""
+        clave = normalizar_titulo(titulo)
+        if todas:
+            self._borradas.add(clave)
+        # Si el almacén tiene otras películas con ese título (y el lote no las borró), siguen ahí.
+        repetida = not todas and clave not in self._borradas and movies_db.cantidad_con_titulo(titulo) > 1
+        self._tocadas[clave] = EstadoDelLote.REPETIDA if repetida else None
+
+async def leer_cuerpo(request: Request) -> bytes:
+    """Dependencia que lee el cuerpo crudo: el lote se parsea en el hilo del endpoint, no en el event loop."""
+    return await request.body()
+
+def parsear_lote(request: Request, cuerpo: bytes) -> List:
+    """Convierte el cuerpo (array JSON, o NDJSON según el `Content-Type`) en la lista de elementos."""
+    tipo = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    try:
+        if tipo in TIPOS_NDJSON:
+            elementos = [decodificar_json(linea) for linea in cuerpo.splitlines() if linea.strip()]
+        else:
+            elementos = decodificar_json(cuerpo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"El cuerpo no es JSON ni NDJSON válido: {e}")
+    if not isinstance(elementos, list):
+        raise HTTPException(status_code=400, detail="Se esperaba un array JSON (o NDJSON, un elemento por línea)")
+    if len(elementos) > MAX_ELEMENTOS_LOTE:
+        raise HTTPException(status_code=413, detail=f"Un lote puede tener como máximo {MAX_ELEMENTOS_LOTE} elementos")
+    return elementos
+
+def validar_elemento(modelo, elemento) -> BaseModel:
+    """Valida un elemento con el modelo de Pydantic; si no es válido, informa el primer error."""
+    try:
+        return modelo.model_validate(elemento)
+    except ValidationError as e:
+        error = e.errors()[0]
+        campo = ".".join(str(parte) for parte in error["loc"])
+        raise ErrorDeElemento(422, f"{campo}: {error['msg']}" if campo else error["msg"])
+
+def ejecutar_lote(elementos: List, validar: Callable, planear: Callable, atomic: bool, status_ok: int) -> RespuestaJSON:
+    """
+    Valida cada elemento con `validar(elemento)`, lo planifica con `planear(estado, valor)` (que
+    devuelve el título y la operación a aplicar, o lanza `ErrorDeElemento`) y aplica todo junto.
+    Devuelve un resultado por elemento, en el mismo orden en que llegaron.
+    """
+    resultados: List[Dict] = []
+    validos = []
+    for indice, elemento in enumerate(elementos):   # La validación no necesita el lock de escritura.
+        try:
+            validos.append((indice, validar(elemento)))
+            resultados.append({"index": indice, "status": status_ok})
+        except ErrorDeElemento as e:
+            resultados.append({"index": indice, "status": e.status_code, "detail": e.detail})
+
+    with escritura():
+        estado = EstadoDelLote()
+        operaciones = []
+        for indice, valor in validos:
+            try:
+                titulo, operacion = planear(estado, valor)
+                resultados[indice]["title"] = titulo
+                operaciones.append(operacion)
+            except ErrorDeElemento as e:
+                resultados[indice].update(status=e.status_code, detail=e.detail)
+
+        fallidos = len(elementos) - len(operaciones)
+        if fallidos and atomic:
+            for resultado in resultados:
+                if resultado["status"] == status_ok:
+                    resultado.update(status=status.HTTP_424_FAILED_DEPENDENCY,
+                                     detail="No se aplicó porque otros elementos del lote tienen errores")
+            operaciones = []
+        for operacion in operaciones:
+            operacion()
+
+    contenido = {"total": len(elementos), "applied": len(operaciones), "failed": fallidos, "results": resultados}
+    return RespuestaJSON(contenido, status_code=422 if fallidos and atomic else 200)
+
+def planear_alta(estado: EstadoDelLote, movie: Movie) -> Tuple[str, Callable]:
+    if estado.existe(movie.title):
+        raise ErrorDeElemento(400, "La película ya existe")
+    pelicula = movie.dict()
+    estado.guardar(pelicula)
+    return movie.title, partial(movies_db.agregar, pelicula)
+
+def planear_modificacion(estado: EstadoDelLote, cambio: MovieBulkUpdate) -> Tuple[str, Callable]:
+    update_data = cambio.changes.dict(exclude_unset=True)
+    if not update_data:
+        raise ErrorDeElemento(400, "No se enviaron datos para actualizar")
+    actual = estado.obtener(cambio.title)
+    if actual is None:
+        raise ErrorDeElemento(404, "Película no encontrada")
+    nueva = validar_elemento(Movie, {**actual, **update_data}).dict()
+    renombrada = normalizar_titulo(nueva["title"]) != normalizar_titulo(cambio.title)
+    if renombrada:
+        if estado.existe(nueva["title"]):
+            raise ErrorDeElemento(400, "Ya existe otra película con ese nuevo título.")
+        estado.quitar(cambio.title, todas=False)
+    estado.guardar(nueva)
+    return nueva["title"], partial(movies_db.actualizar, cambio.title, nueva)
+
+def validar_titulo(titulo) -> str:
+    if not isinstance(titulo, str) or not titulo:
+        raise ErrorDeElemento(422, "Cada elemento tiene que ser el título (un string no vacío) de la película a borrar")
+    return titulo
+
+def planear_baja(estado: EstadoDelLote, titulo: str) -> Tuple[str, Callable]:
+    if not estado.existe(titulo):
+        raise ErrorDeElemento(404, "Película no encontrada")
+    estado.quitar(titulo, todas=True)
+    return titulo, partial(movies_db.eliminar, titulo)
+
 
 
 # ENDPOINTS DE LA API
@@ -181,78 +761,335 @@ def test_authentication(usuario: str = Depends(verificar_credenciales)):
     """Verifica si las credenciales proporcionadas son válidas."""
     return {"status": "ok", "message": "Autenticación exitosa", "usuario": usuario}
 
+### Endpoint para obtener un token de acceso (Protegido, con usuario y contraseña) ###
+@app.post("/auth/token", tags=["Autenticación"])
+def create_token(usuario: str = Depends(verificar_usuario_y_clave)):
+    """
+    Devuelve un token que vale por unos minutos en lugar del usuario y contraseña
+    (`Authorization: Bearer <token>`). Verificarlo es mucho más barato que verificar la clave.
+    """
+    return {"access_token": autenticador.emitir_token(usuario), "token_type": "bearer",
+            "expires_in": autenticador.duracion_token}
+
 ### Endpoint para obtener la cantidad total de películas (Público) ###
 @app.get("/movies/count", tags=["Público"])
-def get_movies_count():
+def get_movies_count(request: Request):
     """Devuelve la cantidad total de películas en la base de datos."""
-    return {"total_movies": len(movies_db)}
+    return responder_con_cache(request, ETIQUETA_CANTIDAD, lambda: ({"total_movies": len(movies_db)}, {}))
+
+### Endpoint con las estadísticas del catálogo (Público) ###
+@app.get("/movies/stats", tags=["Público"])
+def get_movies_stats(request: Request, top: int = Query(10, ge=1, le=1000, description="Cantidad de actores del ranking")):
+    """
+    Devuelve la cantidad de películas por año, por década y por género, y los `top` actores
+    con más películas. Se arma con contadores que se actualizan en cada escritura, sin
+    recorrer el catálogo.
+    """
+    return responder_con_cache(request, ETIQUETA_CANTIDAD, lambda: (estadisticas.resumen(top), {}))
+
+### Endpoint con las estadísticas del cache de respuestas (Público) ###
+@app.get("/cache/stats", tags=["Público"])
+def get_cache_stats():
+    """Devuelve los contadores del cache de respuestas (aciertos, fallos, desalojos, invalidaciones)."""
+    return cache_respuestas.estadisticas()
+
+### Endpoint con las métricas del servidor en formato Prometheus (Público) ###
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Público"])
+def get_metrics():
+    """
+    Métricas de este proceso en el formato de texto de Prometheus: peticiones y tiempos por
+    ruta, rechazos del limitador, escrituras del diario, tamaño del almacén y del cache.
+    """
+    return PlainTextResponse(REGISTRO.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+### Endpoints del perfilador por muestreo (Protegido) ###
+@app.post("/debug/profiler/start", tags=["Protegido"])
+def start_profiler(interval: float = Query(0.01, ge=0.001, le=1.0, description="Segundos entre muestras"),
+                   usuario: str = Depends(verificar_credenciales)):
+    """Empieza a muestrear las pilas de llamadas de todos los hilos del proceso. Requiere autenticación."""
+    if not perfilador.iniciar(interval):
+        raise HTTPException(status_code=409, detail="El perfilador ya está andando.")
+    return perfilador.estado()
+
+@app.get("/debug/profiler", response_class=PlainTextResponse, tags=["Protegido"])
+def get_profiler(limit: Optional[int] = Query(None, ge=1, description="Cantidad de pilas (las más frecuentes)"),
+                 usuario: str = Depends(verificar_credenciales)):
+    """
+    Devuelve las pilas muestreadas hasta ahora en formato "folded" (`f1;f2;f3 cantidad`, para
+    flamegraph.pl o speedscope), sin detener el perfilador. Requiere autenticación.
+    """
+    estado = perfilador.estado()
+    return PlainTextResponse(perfilador.pilas(limit), headers={"X-Profiler-Samples": str(estado["samples"]),
+                                                               "X-Profiler-Running": str(estado["running"]).lower()})
 
-### Endpoint para obtener todas las películas o filtrar por año (Público) ###
+@app.post("/debug/profiler/stop", response_class=PlainTextResponse, tags=["Protegido"])
+def stop_profiler(usuario: str = Depends(verificar_credenciales)):
+    """Detiene el perfilador y devuelve las pilas muestreadas (como `GET /debug/profiler`). Requiere autenticación."""
+    perfilador.detener()
+    return PlainTextResponse(perfilador.pilas(), headers={"X-Profiler-Samples": str(perfilador.estado()["samples"])})
+
+### Endpoint para obtener todas las películas o filtrarlas (Público) ###
 @app.get("/movies", response_model=List[Movie], tags=["Público"])
-def get_all_movies(year: Optional[int] = None):
-    """Devuelve una lista de todas las películas. Opcionalmente, filtra por año de estreno."""
-    if year is None:
-        return movies_db
-    return [movie for movie in movies_db if movie.get("year") == year]
+def get_all_movies(
+    request: Request,
+    year: Optional[int] = None,
+    genre: List[str] = Query([], description="Género (se puede repetir: deben cumplirse todos)"),
+    cast: List[str] = Query([], description="Actor/actriz (se puede repetir: deben cumplirse todos)"),
+    year_from: Optional[int] = Query(None, description="Año de estreno mínimo (inclusive)"),
+    year_to: Optional[int] = Query(None, description="Año de estreno máximo (inclusive)"),
+    limit: Optional[int] = Query(None, ge=1, description="Cantidad máxima de películas a devolver"),
+    offset: int = Query(0, ge=0, description="Cantidad de películas a saltear"),
+    title_prefix: Optional[str] = Query(None, min_length=1, description="Solo los títulos que empiezan así (sin distinguir mayúsculas)"),
+    sort: Optional[str] = Query(None, pattern=f"^-?({'|'.join(ORDENES)})$", description="Orden: `title`, o `year` (y dentro de cada año por título). Con `-` adelante, descendente. Sin `sort`, en orden de alta"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en `X-Next-Cursor` para pedir la página siguiente"),
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por coma (ej: title,year)"),
+    formato: str = Query("json", alias="format", pattern="^(json|ndjson)$", description="`ndjson`: una película por línea, en streaming"),
+):
+    """
+    Devuelve una lista de todas las películas. Opcionalmente, filtra por año de estreno,
+    rango de años, género, actores y/o prefijo del título (los filtros se combinan). Los
+    filtros se resuelven con los índices del almacén, sin recorrer todo el catálogo.
+
+    Con `sort` las películas se ordenan por título o por año usando índices ordenados: un
+    rango de años ordenado por año o un prefijo ordenado por título sale directamente del
+    índice, sin ordenar nada en cada petición, y cada página se lee desde el cursor.
+
+    Se puede paginar con `limit`/`offset` o con el cursor de `X-Next-Cursor` (también en el
+    header `Link`), elegir los campos con `fields` y pedir `format=ndjson` para exportar en streaming.
+    """
+    campos = parsear_campos(fields)
+    filtros = dict(year=year, genres=genre, cast=cast, year_from=year_from, year_to=year_to, title_prefix=title_prefix)
+
+    def generar_pagina() -> Tuple[object, Dict[str, str]]:
+        if sort is None:
+            ids = movies_db.filtrar_ids(**filtros)
+            inicio = (bisect_right(ids, decodificar_cursor(cursor)) if cursor else 0) + offset
+            fin = len(ids) if limit is None else min(len(ids), inicio + limit)
+            pagina, total, hay_mas = ids[inicio:fin], len(ids), fin < len(ids)
+        else:
+            # La página sale del índice ordenado a partir del cursor, sin copiar el resto del listado.
+            orden, descendente = sort.lstrip("-"), sort.startswith("-")
+            despues_de = decodificar_cursor_de_orden(cursor, orden) if cursor else None
+            claves, total, hay_mas = movies_db.pagina_ordenada(orden, descendente, despues_de, offset, limit, **filtros)
+            pagina = [clave[-1] for clave in claves]
+
+        headers = {"X-Total-Count": str(total)}
+        if pagina and hay_mas:
+            siguiente = codificar_cursor(pagina[-1]) if sort is None else codificar_cursor_de_orden(orden, claves[-1])
+            # El link es relativo para que la respuesta se pueda cachear sin depender del host.
+            url_siguiente = request.url.remove_query_params("offset").include_query_params(cursor=siguiente)
+            headers["X-Next-Cursor"] = siguiente
+            headers["Link"] = f'<{url_siguiente.path}?{url_siguiente.query}>; rel="next"'
+        return pagina, headers
+
+    if formato == "ndjson":
+        # El streaming no se cachea: la idea es justamente no tener todo el catálogo serializado en memoria.
+        # La versión se lee antes de armar la página: la respuesta incluye al menos los cambios hasta ella.
+        version = headers_de_version()
+        pagina, headers = generar_pagina()
+        return StreamingResponse(generar_ndjson(pagina, campos), media_type="application/x-ndjson",
+                                 headers={**headers, **version})
+
+    def generar_json() -> Tuple[object, Dict[str, str]]:
+        pagina, headers = generar_pagina()
+        movies = (movies_db.obtener_por_id(id_pelicula, campos) for id_pelicula in pagina)
+        return [proyectar(movie, campos) for movie in movies if movie is not None], headers
+
+    return responder_con_cache(request, etiqueta_de_listado(year, genre, cast), generar_json, con_version=True)
+
+### Endpoint de búsqueda de texto completo (Público) ###
+@app.get("/movies/search", response_model=List[MovieSearchResult], tags=["Público"])
+def search_movies(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Palabras a buscar en el título, el reparto y el resumen"),
+    limit: int = Query(10, ge=1, le=100, description="Cantidad máxima de resultados"),
+    prefix: bool = Query(True, description="Buscar también la última palabra como prefijo (para autocompletar)"),
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por coma (ej: title,year)"),
+):
+    """
+    Busca películas por palabras sueltas (sin distinguir mayúsculas ni tildes) en el título,
+    el reparto y el resumen, y devuelve las más relevantes primero. Usa un índice invertido,
+    así que no recorre el catálogo. `X-Total-Count` indica cuántas películas coincidieron.
+    """
+    campos = parsear_campos(fields)
+
+    def generar() -> Tuple[object, Dict[str, str]]:
+        resultados, total = movies_db.buscar(q, limit, prefix)
+        encontradas = []
+        for id_pelicula, puntaje in resultados:
+            movie = movies_db.obtener_por_id(id_pelicula, campos)
+            if movie is not None:
+                encontradas.append({**proyectar(movie, campos), "score": round(puntaje, 4)})
+        return encontradas, {"X-Total-Count": str(total)}
+
+    # Cualquier alta, baja o cambio altera las frecuencias de las palabras, y con ellas los puntajes.
+    return responder_con_cache(request, ETIQUETA_TODO, generar)
+
+### Endpoints del feed de cambios (Públicos) ###
+# Un cliente se sincroniza así: anota la versión (`X-Catalog-Version` de `GET /movies`, o
+# `version` de esta respuesta), descarga el catálogo y desde ahí pide solo los cambios.
+
+def verificar_version(since: int, epoch: Optional[str]) -> None:
+    """410 si el cliente viene de otra época o de una versión cuyos cambios ya no se tienen."""
+    if (epoch is not None and epoch != feed.epoca) or not feed.disponible(since):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Los cambios desde esa versión ya no están disponibles: hay que volver a descargar el catálogo.",
+            headers=headers_de_version(),
+        )
+
+@app.get("/movies/changes", tags=["Público"])
+async def get_movie_changes(
+    since: Optional[int] = Query(None, ge=0, description="Versión que ya tiene el cliente (sin `since`: la actual, sin cambios)"),
+    epoch: Optional[str] = Query(None, description="Época de esa versión: si no es la del servidor, responde 410"),
+    limit: int = Query(MAX_CAMBIOS_POR_RESPUESTA, ge=1, le=MAX_CAMBIOS_POR_RESPUESTA, description="Cantidad máxima de cambios"),
+    wait: float = Query(0, ge=0, le=ESPERA_MAXIMA_CAMBIOS, description="Segundos a esperar un cambio si no hay ninguno (long-poll)"),
+):
+    """
+    Devuelve los cambios posteriores a la versión `since`, en orden. Cada uno tiene su
+    `version` y es como una línea del diario: `{"op": "put", "title": <título anterior o
+    null>, "movie": {...}}` o `{"op": "delete", "title": ...}`. `next` es el `since` a usar en
+    la próxima petición (si vinieron `limit` cambios, puede haber más).
+
+    Con `wait`, si no hay cambios la respuesta espera hasta que haya alguno (o pasen esos
+    segundos). Responde 410 si esa versión es de antes del historial que se guarda (o de otra
+    época): hay que volver a descargar el catálogo.
+    """
+    desde = feed.version if since is None else since
+    verificar_version(desde, epoch)
+    if wait:
+        await feed.esperar(desde, wait)
+    cambios = feed.cambios_desde(desde, limit)
+    if cambios is None:
+        verificar_version(desde, epoch)  # Se descartaron mientras esperaba (o se recargó el catálogo).
+    siguiente = cambios[-1][0] if cambios else desde
+    # Los cambios ya están codificados: se arma el JSON sin volver a decodificarlos.
+    cuerpo = b'{"epoch":"%s","version":%d,"next":%d,"changes":[%s]}' % (
+        feed.epoca.encode(), feed.version, siguiente, b",".join(cambio for _, cambio in cambios))
+    return Response(cuerpo, media_type="application/json")
+
+@app.get("/movies/changes/stream", tags=["Público"])
+async def stream_movie_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Versión que ya tiene el cliente (sin `since`: la actual)"),
+    epoch: Optional[str] = Query(None, description="Época de esa versión: si no es la del servidor, responde 410"),
+):
+    """
+    Los mismos cambios que `GET /movies/changes`, como server-sent events (`text/event-stream`):
+    un evento `change` por cambio, con su versión como `id`, a medida que ocurren. Al
+    reconectarse, `EventSource` manda el último id en `Last-Event-ID` y el stream sigue desde
+    ahí. Si el cliente se atrasa más que el historial (o se recarga el catálogo), recibe un
+    evento `reset` y el stream termina: hay que volver a descargar el catálogo.
+    """
+    ultimo_id = request.headers.get("last-event-id", "")
+    desde = int(ultimo_id) if ultimo_id.isdigit() else (feed.version if since is None else since)
+    verificar_version(desde, epoch)
+
+    async def eventos() -> AsyncIterator[bytes]:
+        version = desde
+        while True:
+            cambios = feed.cambios_desde(version, MAX_CAMBIOS_POR_RESPUESTA)
+            if cambios is None:
+                yield b"event: reset\ndata: %s\n\n" % codificar_json({"epoch": feed.epoca, "version": feed.version})
+                return
+            if cambios:
+                yield b"".join(b"id: %d\nevent: change\ndata: %s\n\n" % cambio for cambio in cambios)
+                version = cambios[-1][0]
+                continue
+            await feed.esperar(version, LATIDO_SSE)
+            if feed.version == version:
+                yield b": sin cambios\n\n"  # Comentario SSE: mantiene viva la conexión (y los proxies no la cortan).
+
+    headers = {"Cache-Control": "no-cache", "X-Catalog-Epoch": feed.epoca, "X-Accel-Buffering": "no"}
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers=headers)
 
 ### Endpoint para obtener una película por su título (Público) ###
 @app.get("/movies/{title}", response_model=Movie, tags=["Público"])
-def get_movie_by_title(title: str):
+def get_movie_by_title(title: str, request: Request):
     """Busca y devuelve una única película por su título (no distingue mayúsculas/minúsculas)."""
-    for movie in movies_db:
-        if movie["title"].lower() == title.lower():
-            return movie
-    raise HTTPException(status_code=404, detail="Película no encontrada")
+    def generar() -> Tuple[object, Dict[str, str]]:
+        movie = movies_db.obtener(title)
+        if movie is None:
+            raise HTTPException(status_code=404, detail="Película no encontrada")
+        return proyectar(movie, CAMPOS_MOVIE), {}
+
+    return responder_con_cache(request, etiqueta_titulo(title), generar)
 
 ### Endpoint para añadir una nueva película (Protegido) ###
 @app.post("/movies", response_model=Movie, status_code=status.HTTP_201_CREATED, tags=["Protegido"])
 def add_movie(new_movie: Movie, usuario: str = Depends(verificar_credenciales)):
     """Añade una nueva película a la base de datos. Requiere autenticación."""
-    if any(movie["title"].lower() == new_movie.title.lower() for movie in movies_db):
+    try:
+        with escritura():
+            movie = movies_db.agregar(new_movie.dict())
+    except PeliculaDuplicada:
         raise HTTPException(status_code=400, detail="La película ya existe")
-    movies_db.append(new_movie.dict())
-    save_data()
-    return new_movie
+    # Ya se validó al recibirla: se devuelve sin pasar otra vez por `response_model`.
+    return RespuestaJSON(movie, status_code=status.HTTP_201_CREATED)
+
+### Endpoints para escribir muchas películas en una sola petición (Protegidos) ###
+# Se declaran antes que `DELETE /movies/{title}`, que si no tomaría "bulk" como un título.
+DESCRIPCION_ATOMIC = "Si es false, se aplican los elementos válidos aunque otros tengan errores"
+
+@app.post("/movies/bulk", tags=["Protegido"])
+def add_movies_bulk(request: Request, cuerpo: bytes = Depends(leer_cuerpo),
+                    atomic: bool = Query(True, description=DESCRIPCION_ATOMIC),
+                    usuario: str = Depends(verificar_credenciales)):
+    """
+    Añade muchas películas de una vez: un array JSON de películas, o NDJSON (una por línea,
+    con `Content-Type: application/x-ndjson`). Devuelve el resultado de cada una.
+    """
+    return ejecutar_lote(parsear_lote(request, cuerpo), lambda e: validar_elemento(Movie, e), planear_alta, atomic, 201)
+
+@app.patch("/movies/bulk", tags=["Protegido"])
+def update_movies_bulk(request: Request, cuerpo: bytes = Depends(leer_cuerpo),
+                       atomic: bool = Query(True, description=DESCRIPCION_ATOMIC),
+                       usuario: str = Depends(verificar_credenciales)):
+    """
+    Actualiza muchas películas de una vez. Cada elemento es `{"title": <título actual>,
+    "changes": {...}}` con los mismos campos que `PUT /movies/{title}/partial`.
+    """
+    return ejecutar_lote(parsear_lote(request, cuerpo), lambda e: validar_elemento(MovieBulkUpdate, e),
+                         planear_modificacion, atomic, 200)
+
+@app.delete("/movies/bulk", tags=["Protegido"])
+def delete_movies_bulk(request: Request, cuerpo: bytes = Depends(leer_cuerpo),
+                       atomic: bool = Query(True, description=DESCRIPCION_ATOMIC),
+                       usuario: str = Depends(verificar_credenciales)):
+    """Elimina muchas películas de una vez. El cuerpo es la lista de títulos a borrar."""
+    return ejecutar_lote(parsear_lote(request, cuerpo), validar_titulo, planear_baja, atomic, 200)
 
 ### Endpoint para borrar una película (Protegido) ###
 @app.delete("/movies/{title}", status_code=status.HTTP_200_OK, tags=["Protegido"])
 def delete_movie(title: str, usuario: str = Depends(verificar_credenciales)):
     """Elimina una película de la base de datos por su título. Requiere autenticación."""
-    global movies_db
-    original_count = len(movies_db)
-    movies_db = [movie for movie in movies_db if movie["title"].lower() != title.lower()]
-    if len(movies_db) == original_count:
+    try:
+        with escritura():
+            movies_db.eliminar(title)
+    except PeliculaNoEncontrada:
         raise HTTPException(status_code=404, detail="Película no encontrada")
-    save_data()
     return {"message": f"Película '{title}' eliminada exitosamente"}
 
 ### Endpoint para actualizar parcialmente una película (Protegido) ###
 @app.put("/movies/{title}/partial", response_model=Movie, tags=["Protegido"])
 def update_movie_partial(title: str, movie_update: MovieUpdate, usuario: str = Depends(verificar_credenciales)):
     """Actualiza uno o más campos de una película existente. Requiere autenticación."""
-    movie_to_update = None
-    movie_index = -1
-    original_title = None
-
-    for i, movie in enumerate(movies_db):
-        if movie["title"].lower() == title.lower():
-            movie_to_update = movie
-            movie_index = i
-            original_title = movie["title"]
-            break
-            
-    if not movie_to_update:
-        raise HTTPException(status_code=404, detail="Película no encontrada")
-
     update_data = movie_update.dict(exclude_unset=True) # Solo incluye los campos que el cliente envió.
     if not update_data:
         raise HTTPException(status_code=400, detail="No se enviaron datos para actualizar")
-    
-    # Si se cambia el título, verificar que no choque con otra película existente.
-    if 'title' in update_data and any(m['title'].lower() == update_data['title'].lower() for m in movies_db if m['title'].lower() != original_title.lower()):
-        raise HTTPException(status_code=400, detail="Ya existe otra película con ese nuevo título.")
-        
-    updated_movie_model = Movie(**{**movie_to_update, **update_data}) # Fusiona datos viejos y nuevos y valida.
-    movies_db[movie_index] = updated_movie_model.dict()
-    save_data()
-    return movies_db[movie_index]
\ No newline at end of file
+
+    # Leer, fusionar y guardar dentro del mismo bloque: nadie puede modificar la película en el medio.
+    with escritura():
+        movie_to_update = movies_db.obtener(title)
+        if movie_to_update is None:
+            raise HTTPException(status_code=404, detail="Película no encontrada")
+
+        updated_movie_model = Movie(**{**movie_to_update, **update_data}) # Fusiona datos viejos y nuevos y valida.
+        try:
+            # El almacén verifica (con su índice) que el nuevo título no choque con otra película existente.
+            updated_movie = movies_db.actualizar(title, updated_movie_model.dict())
+        except PeliculaNoEncontrada:
+            raise HTTPException(status_code=404, detail="Película no encontrada")
+        except PeliculaDuplicada:
+            raise HTTPException(status_code=400, detail="Ya existe otra película con ese nuevo título.")
+    return RespuestaJSON(updated_movie)
\ No newline at end of file
@@ -0,0 +1,254 @@
+# MÉTRICAS (FORMATO DE PROMETHEUS) Y PERFILADOR POR MUESTREO
+
+# Contadores, medidores e histogramas en memoria que `GET /metrics` exporta en el formato de
+# texto de Prometheus (https://prometheus.io/docs/instrumenting/exposition_formats/), sin
+# depender de `prometheus_client`. Registrar un valor cuesta una búsqueda en un dict y un
+# lock sin competencia: se puede hacer en cada petición.
+#
+# Los módulos que quieren medir algo crean sus métricas en `REGISTRO` al importarse (ver
+# `persistencia`) y las actualizan directamente. Los valores que ya existen en otro lado
+# (por ejemplo la cantidad de películas) se registran con una función que se llama recién
+# al exportar.
+#
+# Además hay un perfilador por muestreo que se puede prender y apagar con el servidor
+# andando: cada tanto mira en qué función está cada hilo y cuenta las pilas que encuentra.
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Límites de los histogramas de duración, en segundos (los que usa Prometheus por defecto).
+LIMITES_DURACION = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Etiquetas = Tuple[str, ...]
+
+
+
+# FUNCIONES AUXILIARES
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+def _serie(nombre: str, etiquetas: Sequence[str], valores: Etiquetas, extra: str = "") -> str:
+    pares = [f'{etiqueta}="{_escapar(valor)}"' for etiqueta, valor in zip(etiquetas, valores)]
+    if extra:
+        pares.append(extra)
+    return f"{nombre}{{{','.join(pares)}}}" if pares else nombre
+
+
+
+# MÉTRICAS
+
+class Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def exportar(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}", *self._lineas()]
+
+    def _lineas(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Contador(Metrica):
+    """Valor que solo crece (peticiones atendidas, bytes escritos...), uno por combinación de etiquetas."""
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Etiquetas, float] = {}
+
+    def sumar(self, *etiquetas: str, cantidad: float = 1) -> None:
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + cantidad
+
+    def valor(self, *etiquetas: str) -> float:
+        return self._valores.get(etiquetas, 0)
+
+    def _lineas(self) -> List[str]:
+        with self._lock:
+            valores = sorted(self._valores.items())
+        return [f"{_serie(self.nombre, self.etiquetas, clave)} {_numero(valor)}" for clave, valor in valores]
+
+
+class Histograma(Metrica):
+    """
+    Cuenta las observaciones por intervalo (`le`: menor o igual que el límite), más su suma.
+    Al exportar, los intervalos se acumulan como pide Prometheus.
+    """
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), limites: Sequence[float] = LIMITES_DURACION):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(limites)
+        # etiquetas -> [cantidad en cada intervalo..., cantidad por encima del último, suma]
+        self._series: Dict[Etiquetas, List[float]] = {}
+
+    def observar(self, valor: float, *etiquetas: str) -> None:
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [0] * (len(self.limites) + 1) + [0.0]
+            serie[bisect_left(self.limites, valor)] += 1
+            serie[-1] += valor
+
+    def cantidad(self, *etiquetas: str) -> int:
+        serie = self._series.get(etiquetas)
+        return sum(serie[:-1]) if serie else 0
+
+    def _lineas(self) -> List[str]:
+        with self._lock:
+            series = sorted((clave, list(serie)) for clave, serie in self._series.items())
+        lineas = []
+        for clave, serie in series:
+            acumulado = 0
+            for limite, cantidad in zip(self.limites + (float("inf"),), serie):
+                acumulado += cantidad
+                le = 'le="' + _numero(limite) + '"'
+                lineas.append(f"{_serie(self.nombre + '_bucket', self.etiquetas, clave, le)} {acumulado}")
+            lineas.append(f"{_serie(self.nombre + '_sum', self.etiquetas, clave)} {_numero(serie[-1])}")
+            lineas.append(f"{_serie(self.nombre + '_count', self.etiquetas, clave)} {acumulado}")
+        return lineas
+
+
+class MetricaCalculada(Metrica):
+    """Métrica cuyo valor se pide a una función al exportar (cantidad de películas, entradas del cache...)."""
+
+    def __init__(self, nombre: str, ayuda: str, tipo: str, funcion: Callable[[], float]):
+        super().__init__(nombre, ayuda)
+        self.tipo = tipo
+        self.funcion = funcion
+
+    def _lineas(self) -> List[str]:
+        return [f"{self.nombre} {_numero(self.funcion())}"]
+
+
+
+# REGISTRO
+
+class RegistroDeMetricas:
+    """Conjunto de métricas que se exportan juntas. Registrar dos veces el mismo nombre devuelve la misma métrica."""
+
+    def __init__(self):
+        self._metricas: Dict[str, Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: Metrica) -> Metrica:
+        with self._lock:
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                   limites: Sequence[float] = LIMITES_DURACION) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def calculada(self, nombre: str, ayuda: str, funcion: Callable[[], float], tipo: str = "gauge") -> MetricaCalculada:
+        """Reemplaza la anterior con el mismo nombre (la función puede depender de objetos que se recrean)."""
+        metrica = MetricaCalculada(nombre, ayuda, tipo, funcion)
+        with self._lock:
+            self._metricas[nombre] = metrica
+        return metrica
+
+    def exportar(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return "\n".join(linea for metrica in metricas for linea in metrica.exportar()) + "\n"
+
+
+REGISTRO = RegistroDeMetricas()   # Registro global del proceso (lo que exporta `GET /metrics`).
+
+
+
+# PERFILADOR POR MUESTREO
+
+class PerfiladorPorMuestreo:
+    """
+    Cada `intervalo` segundos anota la pila de llamadas de cada hilo (menos la suya). Mientras
+    está apagado no cuesta nada; prendido, cuesta más cuanto más corto es el intervalo (cada
+    muestra toma el GIL para recorrer las pilas).
+
+    El resultado está en formato "folded" (una pila por línea, `funcion;funcion;... cantidad`),
+    el que usan flamegraph.pl y speedscope para dibujar gráficos de llama.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        self._pilas: Counter = Counter()
+        self._muestras = 0
+        self.intervalo = 0.01
+        self.desde: Optional[float] = None
+
+    @property
+    def activo(self) -> bool:
+        return self._hilo is not None
+
+    def iniciar(self, intervalo: float = 0.01) -> bool:
+        """Empieza a muestrear (descarta las muestras anteriores). Devuelve False si ya estaba andando."""
+        with self._lock:
+            if self._hilo is not None:
+                return False
+            self.intervalo = intervalo
+            self.desde = time.time()
+            self._pilas = Counter()
+            self._muestras = 0
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._muestrear, name="perfilador", daemon=True)
+            self._hilo.start()
+            return True
+
+    def detener(self) -> None:
+        with self._lock:
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None:
+            self._detener.set()
+            hilo.join()
+
+    def estado(self) -> Dict:
+        return {"running": self.activo, "interval": self.intervalo, "samples": self._muestras, "since": self.desde}
+
+    def pilas(self, limite: Optional[int] = None) -> str:
+        """Las pilas registradas en formato "folded", las más frecuentes primero."""
+        with self._lock:
+            pilas = self._pilas.most_common(limite)
+        return "".join(f"{pila} {cantidad}\n" for pila, cantidad in pilas)
+
+    def _muestrear(self) -> None:
+        propio = threading.get_ident()
+        nombres = {}
+        while not self._detener.wait(self.intervalo):
+            nombres_hilos = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+            muestra = []
+            for ident, frame in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                llamadas = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    nombre = nombres.get(codigo)
+                    if nombre is None:
+                        modulo = frame.f_globals.get("__name__", "?")
+                        nombre = nombres[codigo] = f"{modulo}:{codigo.co_name}"
+                    llamadas.append(nombre)
+                    frame = frame.f_back
+                llamadas.append(nombres_hilos.get(ident, str(ident)))
+                muestra.append(";".join(reversed(llamadas)))
+            with self._lock:
+                self._pilas.update(muestra)
+                self._muestras += 1
@@ -0,0 +1,715 @@
+# PERSISTENCIA: SNAPSHOT + DIARIO DE CAMBIOS (WRITE-AHEAD LOG)
+
+# En vez de reescribir todo `movies.json` en cada POST/PUT/DELETE, cada cambio se
+# agrega como una línea JSON al final de un "diario" (archivo JSONL). Escribir
+# cuesta entonces O(tamaño de la película) y no O(tamaño del catálogo).
+#
+# Cada tanto, un hilo en segundo plano "compacta": escribe una foto completa del
+# almacén (snapshot) en un archivo temporal, lo renombra atómicamente sobre el
+# snapshot y descarta el diario viejo. Al arrancar se carga el snapshot y se
+# vuelven a aplicar los cambios del diario.
+#
+# El snapshot puede ser JSON o binario (ver `snapshot_binario`), según su extensión.
+# Si todavía no existe, se arranca desde un archivo "semilla" (el `movies.json`
+# descargado) y se genera el snapshot con una compactación.
+#
+# Formato de las líneas del diario:
+#   {"seq": n, "op": "put", "title": <título anterior o null>, "movie": {...}}   (alta o modificación)
+#   {"seq": n, "op": "delete", "title": <título>}                                 (baja)
+# Aplicar dos veces un mismo cambio NO siempre deja el almacén igual (por ejemplo, después
+# de renombrar X -> Y y luego Z -> X, volver a aplicar el primero renombra la X nueva). Por
+# eso cada cambio lleva un `seq` creciente y el snapshot guarda el del último cambio que
+# incluye: si el proceso se cae entre escribir el snapshot y descartar el diario, al
+# arrancar se saltean los cambios que el snapshot ya tiene.
+#
+# Con `demora_escritura`, DiarioDeCambios no escribe el archivo en la petición que hizo el
+# cambio: lo deja en una cola y un hilo escritor espera esos segundos para juntar los
+# cambios que lleguen seguidos y bajarlos todos con una sola escritura (y un solo fsync).
+# A cambio, si el proceso se cae, se pierden los cambios de esa última demora.
+#
+# Hay dos implementaciones con la misma interfaz:
+#   - DiarioDeCambios: el diario es un archivo JSONL. Sirve para un solo proceso.
+#   - DiarioCompartido: el diario es una tabla de una base SQLite (en modo WAL) que
+#     comparten todos los workers de `uvicorn --workers N`. Cada worker tiene su copia
+#     del almacén en memoria y, antes de atender una petición, aplica los cambios que
+#     hayan hecho los demás. Las escrituras se serializan con el lock de escritura de SQLite.
+
+import gc
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from almacen import AlmacenPeliculas, Detalles, PeliculaNoEncontrada
+from json_rapido import codificar_json, decodificar_json
+from metricas import REGISTRO
+from snapshot_binario import es_snapshot_binario, leer_snapshot_binario, serializar_snapshot_binario
+
+
+# Políticas de fsync del diario:
+#   "siempre":  fsync después de cada cambio (lo más seguro, lo más lento).
+#   "intervalo": como mucho un fsync cada `intervalo_fsync` segundos.
+#   "nunca":    se deja que el sistema operativo decida cuándo bajar los datos a disco.
+POLITICAS_FSYNC = ("siempre", "intervalo", "nunca")
+
+# Métricas de la persistencia (ver `metricas`), separadas por backend ("diario" o "sqlite").
+CAMBIOS_REGISTRADOS = REGISTRO.contador("movies_journal_changes_total", "Cambios registrados en el diario.", ("backend",))
+BYTES_REGISTRADOS = REGISTRO.contador("movies_journal_bytes_total", "Bytes de los cambios registrados en el diario.", ("backend",))
+DURACION_BAJADA = REGISTRO.histograma("movies_journal_flush_seconds",
+                                      "Duración de cada bajada del diario a disco (escritura, flush y fsync, o COMMIT).", ("backend",))
+FSYNCS = REGISTRO.contador("movies_journal_fsyncs_total", "fsyncs del diario JSONL.")
+DURACION_COMPACTACION = REGISTRO.histograma("movies_snapshot_compaction_seconds",
+                                            "Duración de cada compactación (escritura del snapshot completo).", ("backend",))
+
+
+
+# FUNCIONES AUXILIARES
+
+def escribir_atomicamente(ruta: str, datos: bytes) -> None:
+    """Escribe `datos` en un temporal, hace fsync y lo renombra sobre `ruta` (nunca queda a medias)."""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+    sincronizar_directorio(ruta)
+
+def sincronizar_directorio(ruta: str) -> None:
+    """Hace fsync del directorio que contiene `ruta`, para que el renombrado sobreviva a un corte de luz."""
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(ruta)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def serializar_snapshot(peliculas: List[Dict], seq: Optional[int] = None,
+                        pendientes: Optional[List[Optional[Tuple[Detalles, int]]]] = None) -> bytes:
+    """
+    JSON compacto (sin sangría: lo lee el servidor, no una persona). Sin `seq` es una lista
+    de películas, como `movies.json`; con `seq`, `{"seq": ..., "movies": [...]}`.
+    Los campos perezosos que indique `pendientes` (ver `AlmacenPeliculas.instantanea`) se
+    decodifican solo para escribirlos: no quedan cargados en el almacén.
+    """
+    if pendientes is not None:
+        peliculas = [pelicula if pendiente is None else {**pelicula, **pendiente[0](pendiente[1])}
+                     for pelicula, pendiente in zip(peliculas, pendientes)]
+    if seq is None:
+        return codificar_json(peliculas)
+    return codificar_json({"seq": seq, "movies": peliculas})
+
+def escribir_snapshot(ruta: str, peliculas: List[Dict], seq: Optional[int] = None,
+                      pendientes: Optional[List[Optional[Tuple[Detalles, int]]]] = None) -> None:
+    """
+    Escribe el snapshot en JSON o en binario, según la extensión de `ruta`. `seq` es el del
+    último cambio del diario que ya está en `peliculas` (ver `cargar_snapshot`), y
+    `pendientes` los campos perezosos que les faltan (ver `AlmacenPeliculas.instantanea`).
+    """
+    if es_snapshot_binario(ruta):
+        escribir_atomicamente(ruta, serializar_snapshot_binario(peliculas, seq, pendientes))
+    else:
+        escribir_atomicamente(ruta, serializar_snapshot(peliculas, seq, pendientes))
+
+@contextmanager
+def recolector_pausado() -> Iterator[None]:
+    """
+    Pausa el recolector de ciclos de Python. Al cargar el catálogo se crean cientos de miles
+    de dicts, listas y sets que van a vivir todo el proceso: las pasadas del recolector que
+    disparan no liberan nada y cuestan casi tanto como la carga misma.
+    """
+    estaba_activo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if estaba_activo:
+            gc.enable()
+
+def cargar_snapshot(almacen: AlmacenPeliculas, ruta: str, ruta_semilla: Optional[str] = None) -> Optional[int]:
+    """
+    Carga el snapshot en el almacén y devuelve el `seq` del último cambio que incluye (None
+    si no lo tiene, como `movies.json`). Si todavía no existe, carga `ruta_semilla` (por
+    ejemplo el `movies.json` original, cuando el snapshot es binario y nunca se generó).
+    Con un snapshot binario, los campos pesados quedan para cuando se pidan.
+    """
+    if ruta_semilla is not None and not os.path.exists(ruta):
+        ruta = ruta_semilla
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    with recolector_pausado():
+        if es_snapshot_binario(ruta):
+            peliculas, detalles, seq = leer_snapshot_binario(datos)
+            almacen.cargar(peliculas, detalles)
+        else:
+            peliculas, seq = decodificar_json(datos), None
+            if isinstance(peliculas, dict):
+                peliculas, seq = peliculas["movies"], peliculas["seq"]
+            almacen.cargar(peliculas)
+    return seq
+
+def cambio_de(anterior: Optional[Dict], nueva: Optional[Dict]) -> Dict:
+    """Arma la línea del diario que corresponde a una notificación del almacén."""
+    if nueva is None:
+        return {"op": "delete", "title": anterior["title"]}
+    return {"op": "put", "title": anterior["title"] if anterior else None, "movie": nueva}
+
+def aplicar_cambio(almacen: AlmacenPeliculas, cambio: Dict) -> None:
+    """
+    Aplica una línea del diario sobre el almacén. Tolera que la película ya esté agregada o
+    borrada, pero no es idempotente en general: cada cambio tiene que aplicarse una sola vez
+    (ver el `seq` de las líneas del diario).
+    """
+    if cambio["op"] == "delete":
+        try:
+            almacen.eliminar(cambio["title"])
+        except PeliculaNoEncontrada:
+            pass  # Ya estaba borrada en el snapshot.
+        return
+
+    pelicula = cambio["movie"]
+    for titulo in (cambio.get("title"), pelicula["title"]):
+        if titulo is not None and almacen.existe(titulo):
+            almacen.actualizar(titulo, pelicula)
+            return
+    almacen.agregar(pelicula)
+
+
+
+# DIARIO DE CAMBIOS
+
+class DiarioDeCambios:
+    """
+    Mantiene `archivo_snapshot` + `archivo_diario` sincronizados con un `AlmacenPeliculas`.
+    Se suscribe al almacén, así que cada alta/modificación/baja queda registrada sin que
+    los endpoints tengan que hacer nada.
+    """
+
+    def __init__(self, almacen: AlmacenPeliculas, archivo_snapshot: str, archivo_diario: str,
+                 politica_fsync: str = "intervalo", intervalo_fsync: float = 1.0,
+                 cambios_para_compactar: int = 1000, archivo_semilla: Optional[str] = None,
+                 demora_escritura: Optional[float] = None):
+        if politica_fsync not in POLITICAS_FSYNC:
+            raise ValueError(f"Política de fsync desconocida: {politica_fsync!r} (opciones: {POLITICAS_FSYNC})")
+        self.almacen = almacen
+        self.archivo_snapshot = archivo_snapshot
+        self.archivo_semilla = archivo_semilla  # Se carga si todavía no hay snapshot (ver `cargar_snapshot`)
+        self.archivo_diario = archivo_diario
+        self.archivo_compactando = f"{archivo_diario}.compactando"  # Diario "congelado" durante una compactación
+        self.politica_fsync = politica_fsync
+        self.intervalo_fsync = intervalo_fsync
+        self.cambios_para_compactar = cambios_para_compactar
+        self.demora_escritura = demora_escritura   # None: cada cambio se escribe en la misma petición
+
+        self._archivo = None
+        self._seq = 0                   # `seq` del último cambio registrado (o aplicado al recuperar)
+        self._cambios_sin_compactar = 0
+        self._escrituras_abiertas = 0   # Bloques `escritura()` en curso (el lock del almacén es reentrante)
+        self._ultimo_fsync = time.monotonic()
+        self._fsync_pendiente = False   # Hay datos escritos que todavía no pasaron por un fsync
+        # Escritor en segundo plano (solo con `demora_escritura`)
+        self._pendientes: List[bytes] = []          # Líneas registradas que todavía no se escribieron
+        self._hay_pendientes = threading.Condition()
+        self._lock_archivo = threading.Lock()       # El escritor y la compactación no usan el archivo a la vez
+        self._escritor: Optional[threading.Thread] = None
+        self._cerrando = False
+        self._compactando = threading.Lock()   # Evita dos compactaciones simultáneas
+        self._hilo_compactacion: Optional[threading.Thread] = None
+
+    # Arranque y apagado
+
+    def recuperar(self) -> None:
+        """
+        Carga el snapshot en el almacén y reaplica los diarios pendientes.
+        Después empieza a registrar los cambios nuevos del almacén.
+        """
+        self._seq = cargar_snapshot(self.almacen, self.archivo_snapshot, self.archivo_semilla) or 0
+
+        pendientes = 0
+        for ruta in (self.archivo_compactando, self.archivo_diario):
+            pendientes += self._reaplicar(ruta)
+
+        self._archivo = open(self.archivo_diario, "ab")
+        self.almacen.suscribir(self._registrar)
+        if self.demora_escritura is not None:
+            self._cerrando = False
+            self._escritor = threading.Thread(target=self._escribir_en_segundo_plano, name="escritor-diario", daemon=True)
+            self._escritor.start()
+
+        # Si se cortó una compactación a medias, se termina ahora para no arrastrar dos diarios.
+        if os.path.exists(self.archivo_compactando):
+            self.compactar()
+        else:
+            self._cambios_sin_compactar = pendientes
+            if not os.path.exists(self.archivo_snapshot):
+                self.compactar_en_segundo_plano()  # Se arrancó desde la semilla: se genera el snapshot.
+
+    @contextmanager
+    def escritura(self) -> Iterator[None]:
+        """
+        Bloque en el que un endpoint lee y modifica el almacén sin que otra escritura se
+        meta en el medio (por ejemplo, entre leer una película y guardar su versión editada).
+        Los cambios del bloque se bajan a disco juntos al final (un solo flush y, según la
+        política, un solo fsync), aunque sean miles. Con el escritor en segundo plano, el
+        bloque no espera al disco.
+        """
+        with self.almacen.bloqueo():
+            self._escrituras_abiertas += 1
+            try:
+                yield
+            finally:
+                self._escrituras_abiertas -= 1
+                if not self._escrituras_abiertas and self._archivo is not None and self._escritor is None:
+                    self._bajar_a_disco()
+
+    def hay_cambios_ajenos(self) -> bool:
+        """Con un solo proceso no hay cambios ajenos que aplicar."""
+        return False
+
+    def sincronizar(self) -> None:
+        """Con un solo proceso no hay cambios ajenos que aplicar."""
+
+    def cerrar(self) -> None:
+        """
+        Espera a que termine la compactación en curso, deja de registrar cambios y baja el
+        diario a disco (incluidos los cambios que el escritor en segundo plano tenía en cola).
+        """
+        if self._hilo_compactacion is not None:
+            self._hilo_compactacion.join()
+        with self.almacen.bloqueo():
+            if self._archivo is not None:
+                self.almacen.desuscribir(self._registrar)
+                if self._escritor is not None:
+                    with self._hay_pendientes:
+                        self._cerrando = True
+                        self._hay_pendientes.notify()
+                    self._escritor.join()  # Escribe todo lo que tenía en cola antes de terminar.
+                    self._escritor = None
+                with self._lock_archivo:
+                    self._escribir_pendientes()  # Por si el escritor terminó con un error.
+                self._archivo.flush()
+                os.fsync(self._archivo.fileno())
+                self._archivo.close()
+                self._archivo = None
+
+    # Registro de cambios
+
+    def _registrar(self, anterior: Optional[Dict], nueva: Optional[Dict]) -> None:
+        """Suscriptor del almacén: agrega el cambio al diario (se llama con el almacén bloqueado)."""
+        if anterior is None and nueva is None:
+            return  # Recarga completa: no es un cambio que haya que registrar.
+        self._seq += 1
+        linea = codificar_json({"seq": self._seq, **cambio_de(anterior, nueva)}) + b"\n"
+        CAMBIOS_REGISTRADOS.sumar("diario")
+        BYTES_REGISTRADOS.sumar("diario", cantidad=len(linea))
+        if self._escritor is not None:
+            with self._hay_pendientes:
+                self._pendientes.append(linea)
+                if len(self._pendientes) == 1:
+                    self._hay_pendientes.notify()
+        else:
+            self._archivo.write(linea)
+            if not self._escrituras_abiertas:
+                self._bajar_a_disco()  # Si no, se baja al terminar el bloque `escritura()`.
+
+        self._cambios_sin_compactar += 1
+        if self._cambios_sin_compactar >= self.cambios_para_compactar:
+            self.compactar_en_segundo_plano()
+
+    def _bajar_a_disco(self) -> None:
+        inicio = time.perf_counter()
+        self._archivo.flush()
+        if self.politica_fsync == "siempre" or (
+                self.politica_fsync == "intervalo" and time.monotonic() - self._ultimo_fsync >= self.intervalo_fsync):
+            os.fsync(self._archivo.fileno())
+            FSYNCS.sumar()
+            self._ultimo_fsync = time.monotonic()
+            self._fsync_pendiente = False
+        else:
+            self._fsync_pendiente = self.politica_fsync == "intervalo"
+        DURACION_BAJADA.observar(time.perf_counter() - inicio, "diario")
+
+    # Escritor en segundo plano
+
+    def _escribir_en_segundo_plano(self) -> None:
+        """
+        Hilo escritor: espera a que haya cambios en cola, deja pasar `demora_escritura` para
+        juntar los que lleguen seguidos (una ráfaga de escrituras termina en una sola escritura
+        del archivo) y los baja a disco. Con la política "intervalo", también hace el fsync
+        que haya quedado pendiente cuando se cumple el intervalo, aunque no lleguen más cambios.
+        """
+        while True:
+            with self._hay_pendientes:
+                if not self._pendientes and not self._cerrando:
+                    espera = None
+                    if self._fsync_pendiente:
+                        espera = max(0.0, self.intervalo_fsync - (time.monotonic() - self._ultimo_fsync))
+                    self._hay_pendientes.wait(espera)
+                cerrando = self._cerrando
+            if not cerrando and self._pendientes:
+                time.sleep(self.demora_escritura)
+            with self._lock_archivo:
+                self._escribir_pendientes()
+            if cerrando:
+                return
+
+    def _escribir_pendientes(self) -> None:
+        """Escribe las líneas en cola (hay que llamarla con `_lock_archivo` tomado)."""
+        with self._hay_pendientes:
+            lineas, self._pendientes = self._pendientes, []
+        if lineas:
+            try:
+                self._archivo.write(b"".join(lineas))
+            except BaseException:
+                with self._hay_pendientes:
+                    self._pendientes[:0] = lineas  # Quedan en cola para el próximo intento.
+                raise
+        if lineas or self._fsync_pendiente:
+            self._bajar_a_disco()
+
+    def _reaplicar(self, ruta: str) -> int:
+        """
+        Aplica las líneas de un diario sobre el almacén y devuelve cuántas aplicó. Saltea las
+        que el snapshot ya incluye (`seq` menor o igual al suyo); las líneas sin `seq` son de
+        diarios escritos antes de que existiera y se aplican siempre.
+        """
+        if not os.path.exists(ruta):
+            return 0
+        aplicados = 0
+        with open(ruta, "r+b") as f:
+            posicion = 0
+            for linea in f:
+                try:
+                    if not linea.endswith(b"\n"):
+                        raise ValueError("línea incompleta")
+                    cambio = decodificar_json(linea)
+                except ValueError:
+                    # Última línea cortada por una caída: el cambio nunca se confirmó.
+                    # Se recorta para que los cambios nuevos no queden pegados a ella.
+                    f.truncate(posicion)
+                    break
+                seq = cambio.pop("seq", None)
+                if seq is None or seq > self._seq:
+                    aplicar_cambio(self.almacen, cambio)
+                    aplicados += 1
+                    if seq is not None:
+                        self._seq = seq
+                posicion += len(linea)
+        return aplicados
+
+    # Compactación
+
+    def compactar_en_segundo_plano(self) -> None:
+        """Lanza una compactación en un hilo aparte (si no hay otra en curso)."""
+        if self._compactando.locked():
+            return
+        self._hilo_compactacion = threading.Thread(target=self.compactar, name="compactacion-diario", daemon=True)
+        self._hilo_compactacion.start()
+
+    def compactar(self) -> None:
+        """Escribe un snapshot completo del almacén y descarta los diarios que ya contiene."""
+        if not self._compactando.acquire(blocking=False):
+            return
+        inicio = time.perf_counter()
+        try:
+            with self.almacen.bloqueo(), self._lock_archivo:
+                # Se congela el diario actual y se empieza uno nuevo. Todo lo que está en el
+                # diario congelado ya está aplicado en el almacén, así que entra en la foto.
+                self._escribir_pendientes()
+                self._archivo.close()
+                if os.path.exists(self.archivo_compactando):
+                    # Quedó uno de una compactación anterior interrumpida: se le suma el actual.
+                    with open(self.archivo_diario, "rb") as origen, open(self.archivo_compactando, "ab") as destino:
+                        destino.write(origen.read())
+                    os.remove(self.archivo_diario)
+                else:
+                    os.replace(self.archivo_diario, self.archivo_compactando)
+                self._archivo = open(self.archivo_diario, "ab")
+                self._cambios_sin_compactar = 0
+                peliculas, pendientes = self.almacen.instantanea()  # Sin cargar los campos perezosos.
+                seq = self._seq
+
+            # La serialización y escritura del snapshot se hace fuera del lock: las escrituras
+            # pueden seguir llegando al diario nuevo mientras tanto. Si el proceso se cae antes
+            # de borrar el diario congelado, el `seq` del snapshot evita reaplicarlo al arrancar.
+            escribir_snapshot(self.archivo_snapshot, peliculas, seq, pendientes)
+            os.remove(self.archivo_compactando)
+            DURACION_COMPACTACION.observar(time.perf_counter() - inicio, "diario")
+        finally:
+            self._compactando.release()
+
+
+
+# DIARIO COMPARTIDO ENTRE PROCESOS (SQLITE)
+
+# Equivalencia entre las políticas de fsync y el modo `synchronous` de SQLite.
+SYNCHRONOUS_POR_POLITICA = {"siempre": "FULL", "intervalo": "NORMAL", "nunca": "OFF"}
+
+class DiarioCompartido:
+    """
+    Diario de cambios en una base SQLite compartida por todos los procesos del equipo.
+
+    - La tabla `cambios` numera cada cambio con un `seq` creciente y global.
+    - Cada proceso recuerda el último `seq` que aplicó a su almacén; `sincronizar()` aplica
+      los que falten. Para no consultar la tabla en cada petición se usa `PRAGMA data_version`,
+      que solo cambia cuando otra conexión confirmó algo.
+    - `escritura()` toma el lock de escritura de SQLite (`BEGIN IMMEDIATE`), se pone al día y
+      recién ahí deja que el endpoint valide y modifique: así dos workers no pueden, por
+      ejemplo, crear a la vez dos películas con el mismo título.
+    - Dentro de `escritura()` el almacén solo le avisa los cambios a este diario; al resto de
+      los suscriptores (feed, cache de respuestas, estadísticas) se les avisan después del
+      COMMIT, así nunca se publica un cambio que terminó descartado por un ROLLBACK.
+    - Compactar escribe el snapshot con el lock de escritura tomado. El snapshot guarda hasta
+      qué cambio incluye y `estado.seq_snapshot` lo repite al confirmar: si el proceso se cae
+      entre reemplazar el archivo y el COMMIT, manda el del archivo. Los cambios se borran
+      recién en la compactación siguiente (`estado.seq_borrado`), para que un worker que
+      estuvo un rato sin peticiones pueda ponerse al día sin recargar todo.
+
+    Locks (siempre se toman en este orden): SQLite -> `_lock_lectura` -> lock del almacén.
+    """
+
+    def __init__(self, almacen: AlmacenPeliculas, archivo_snapshot: str, archivo_base: str,
+                 politica_fsync: str = "intervalo", cambios_para_compactar: int = 1000, timeout: float = 30.0,
+                 archivo_semilla: Optional[str] = None):
+        if politica_fsync not in POLITICAS_FSYNC:
+            raise ValueError(f"Política de fsync desconocida: {politica_fsync!r} (opciones: {POLITICAS_FSYNC})")
+        self.almacen = almacen
+        self.archivo_snapshot = archivo_snapshot
+        self.archivo_semilla = archivo_semilla
+        self.archivo_base = archivo_base
+        self.politica_fsync = politica_fsync
+        self.cambios_para_compactar = cambios_para_compactar
+        self.timeout = timeout
+
+        # Una conexión para leer (sincronizar) y otra para escribir, cada una con su lock de hilos.
+        self._lectura = self._conectar()
+        self._escritura = self._conectar()
+        self._lock_lectura = threading.Lock()
+        self._lock_escritura = threading.Lock()
+        self._hilo_escritor: Optional[int] = None   # Hilo que está dentro de `escritura()`
+        self._ultimo_seq = 0
+        self._data_version: Optional[int] = None
+        self._cargado = False            # Si el almacén ya tiene el snapshot de esta base cargado.
+        self._aplicando_ajenos = False   # Mientras se aplican cambios de otros procesos no se registran.
+        self._seq_propios: List[int] = []
+        self._hilo_compactacion: Optional[threading.Thread] = None
+        self._crear_tablas()
+
+    def _conectar(self) -> sqlite3.Connection:
+        conexion = sqlite3.connect(self.archivo_base, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute(f"PRAGMA synchronous={SYNCHRONOUS_POR_POLITICA[self.politica_fsync]}")
+        return conexion
+
+    def _crear_tablas(self) -> None:
+        with self._lock_escritura:
+            self._escritura.executescript("""
+                CREATE TABLE IF NOT EXISTS cambios (seq INTEGER PRIMARY KEY AUTOINCREMENT, cambio TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS estado (clave TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+                INSERT OR IGNORE INTO estado VALUES ('seq_snapshot', 0), ('seq_borrado', 0);
+            """)
+
+    def _leer_estado(self, clave: str) -> int:
+        return self._lectura.execute("SELECT valor FROM estado WHERE clave = ?", (clave,)).fetchone()[0]
+
+    # Arranque y apagado
+
+    def recuperar(self) -> None:
+        """Carga el snapshot y los cambios posteriores; después empieza a registrar los cambios nuevos."""
+        self._cargado = False
+        with self.escritura():
+            pass  # Al tomar el lock de escritura se carga todo (ver `_sincronizar`).
+        self.almacen.suscribir(self._registrar)
+        if not os.path.exists(self.archivo_snapshot):
+            self.compactar_en_segundo_plano()  # Se arrancó desde la semilla: se genera el snapshot.
+
+    def _cargar_completo(self) -> None:
+        """
+        Recarga el almacén desde el snapshot + la tabla de cambios. Hay que llamarla con
+        `_lock_lectura` y con el lock de escritura de SQLite tomados: como compactar también
+        necesita ese lock, nadie puede reemplazar el snapshot mientras se lee.
+        """
+        self._data_version = self._lectura.execute("PRAGMA data_version").fetchone()[0]
+        self._lectura.execute("BEGIN")
+        try:
+            seq_snapshot = self._leer_estado("seq_snapshot")
+            self._aplicando_ajenos = True
+            try:
+                seq_archivo = cargar_snapshot(self.almacen, self.archivo_snapshot, self.archivo_semilla)
+                # La semilla y los snapshots viejos no tienen `seq`: vale el de la tabla `estado`.
+                self._ultimo_seq = seq_snapshot if seq_archivo is None else seq_archivo
+                self._aplicar_pendientes()
+            finally:
+                self._aplicando_ajenos = False
+        finally:
+            self._lectura.execute("COMMIT")
+        self._cargado = True
+
+    def cerrar(self) -> None:
+        if self._hilo_compactacion is not None:
+            self._hilo_compactacion.join()
+        self.almacen.desuscribir(self._registrar)
+        self._lectura.close()
+        self._escritura.close()
+
+    # Sincronización con los demás procesos
+
+    def hay_cambios_ajenos(self) -> bool:
+        """
+        Indica (sin esperar ningún lock) si otro proceso confirmó algo desde la última
+        sincronización: solo consulta `PRAGMA data_version`. Si otro hilo de este proceso
+        ya está sincronizando o escribiendo, devuelve False: ese hilo se encarga.
+        """
+        if not self._lock_lectura.acquire(blocking=False):
+            return False
+        try:
+            return not self._cargado or self._lectura.execute("PRAGMA data_version").fetchone()[0] != self._data_version
+        finally:
+            self._lock_lectura.release()
+
+    def sincronizar(self) -> None:
+        """
+        Aplica los cambios que confirmaron otros procesos. Es barato si no hubo ninguno.
+        Si otro hilo de este proceso ya está sincronizando o escribiendo, no espera: ese hilo se encarga.
+        """
+        if not self._lock_lectura.acquire(blocking=False):
+            return
+        try:
+            al_dia = self._sincronizar(puede_recargar=False)
+        finally:
+            self._lock_lectura.release()
+        if not al_dia:
+            with self.escritura():
+                pass  # Recargar todo requiere el lock de escritura (ver `_cargar_completo`).
+
+    def _sincronizar(self, puede_recargar: bool) -> bool:
+        """
+        Igual que `sincronizar`, con `_lock_lectura` ya tomado. Si hace falta recargar todo
+        y no se tiene el lock de escritura de SQLite (`puede_recargar`), devuelve False.
+        """
+        data_version = self._lectura.execute("PRAGMA data_version").fetchone()[0]
+        if self._cargado and data_version == self._data_version:
+            return True
+        self._lectura.execute("BEGIN")
+        try:
+            # Si otro proceso ya borró cambios que este todavía no aplicó, hay que recargar todo.
+            necesita_recarga = not self._cargado or self._leer_estado("seq_borrado") > self._ultimo_seq
+            if not necesita_recarga:
+                self._data_version = data_version
+                self._aplicando_ajenos = True
+                try:
+                    self._aplicar_pendientes()
+                finally:
+                    self._aplicando_ajenos = False
+        finally:
+            self._lectura.execute("COMMIT")
+        if necesita_recarga:
+            if not puede_recargar:
+                return False
+            self._cargar_completo()
+        return True
+
+    def _aplicar_pendientes(self) -> None:
+        filas = self._lectura.execute("SELECT seq, cambio FROM cambios WHERE seq > ? ORDER BY seq", (self._ultimo_seq,))
+        with self.almacen.bloqueo():
+            for seq, cambio in filas:
+                aplicar_cambio(self.almacen, decodificar_json(cambio))
+                self._ultimo_seq = seq
+
+    # Escritura
+
+    @contextmanager
+    def escritura(self) -> Iterator[None]:
+        """
+        Bloque en el que un endpoint lee y modifica el almacén con exclusión mutua entre
+        TODOS los procesos: toma el lock de escritura de SQLite y aplica antes los cambios ajenos.
+        """
+        with self._lock_escritura:
+            self._escritura.execute("BEGIN IMMEDIATE")
+            try:
+                with self._lock_lectura:
+                    self._sincronizar(puede_recargar=True)
+                with self.almacen.bloqueo():
+                    self._hilo_escritor = threading.get_ident()
+                    self._seq_propios = []
+                    # El feed, el cache y las estadísticas se enteran de los cambios recién después del COMMIT.
+                    self.almacen.retener_notificaciones(self._registrar)
+                    try:
+                        yield
+                    finally:
+                        self._hilo_escritor = None
+                        retenidas = self.almacen.soltar_notificaciones()
+                with self._lock_lectura:
+                    inicio = time.perf_counter()
+                    self._escritura.execute("COMMIT")
+                    if self._seq_propios:
+                        DURACION_BAJADA.observar(time.perf_counter() - inicio, "sqlite")
+                    # Los cambios propios ya están en el almacén: no hay que volver a aplicarlos.
+                    if self._seq_propios:
+                        self._ultimo_seq = self._seq_propios[-1]
+                # Si algo falla antes de acá, los avisos se descartan: el almacén se recarga (y eso sí se avisa).
+                self.almacen.notificar_retenidas(retenidas, self._registrar)
+                # Se compacta cuando el `seq` cruza un múltiplo de `cambios_para_compactar`.
+                compactar = bool(self._seq_propios) and \
+                    self._ultimo_seq % self.cambios_para_compactar < len(self._seq_propios)
+            except BaseException:
+                if self._escritura.in_transaction:
+                    self._escritura.execute("ROLLBACK")
+                if self._seq_propios:
+                    self._cargado = False  # El almacén tiene cambios que no se guardaron: se recarga en la próxima sincronización.
+                raise
+
+        if compactar:
+            self.compactar_en_segundo_plano()
+
+    def _registrar(self, anterior: Optional[Dict], nueva: Optional[Dict]) -> None:
+        """Suscriptor del almacén: guarda el cambio en la transacción de `escritura()` en curso."""
+        if self._aplicando_ajenos or (anterior is None and nueva is None):
+            return
+        if self._hilo_escritor != threading.get_ident():
+            raise RuntimeError("Con el diario compartido, las escrituras deben hacerse dentro de `escritura()`")
+        cambio = codificar_json(cambio_de(anterior, nueva))
+        cursor = self._escritura.execute("INSERT INTO cambios (cambio) VALUES (?)", (cambio.decode("utf-8"),))
+        self._seq_propios.append(cursor.lastrowid)
+        CAMBIOS_REGISTRADOS.sumar("sqlite")
+        BYTES_REGISTRADOS.sumar("sqlite", cantidad=len(cambio))
+
+    # Compactación
+
+    def compactar_en_segundo_plano(self) -> None:
+        if self._hilo_compactacion is not None and self._hilo_compactacion.is_alive():
+            return
+        self._hilo_compactacion = threading.Thread(target=self.compactar, name="compactacion-compartida", daemon=True)
+        self._hilo_compactacion.start()
+
+    def compactar(self) -> None:
+        """
+        Escribe el snapshot y borra los cambios que ya contenía el snapshot anterior. Usa su
+        propia conexión y tiene el lock de escritura de SQLite tomado todo el tiempo, así
+        ningún otro worker compacta ni escribe a la vez (las lecturas siguen funcionando).
+        """
+        conexion = self._conectar()
+        try:
+            conexion.execute("BEGIN IMMEDIATE")
+            inicio = time.perf_counter()
+            try:
+                with self._lock_lectura:
+                    self._sincronizar(puede_recargar=True)
+                    with self.almacen.bloqueo():
+                        seq = self._ultimo_seq
+                        peliculas, pendientes = self.almacen.instantanea()  # Sin cargar los campos perezosos.
+                escribir_snapshot(self.archivo_snapshot, peliculas, seq, pendientes)
+                anterior = conexion.execute("SELECT valor FROM estado WHERE clave = 'seq_snapshot'").fetchone()[0]
+                conexion.execute("DELETE FROM cambios WHERE seq <= ?", (anterior,))
+                conexion.executemany("UPDATE estado SET valor = ? WHERE clave = ?",
+                                     [(seq, "seq_snapshot"), (anterior, "seq_borrado")])
+                conexion.execute("COMMIT")
+                DURACION_COMPACTACION.observar(time.perf_counter() - inicio, "sqlite")
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+        finally:
+            conexion.close()
@@ -0,0 +1,121 @@
+# SNAPSHOT BINARIO DEL CATÁLOGO
+
+# Leer `movies.json` (JSON, ~36k películas) con `json.load` y armar un dict
+# por película es lo que más tarda al arrancar cada worker. Este módulo guarda la
+# misma información en un formato binario pensado para cargarse rápido:
+#
+#   MAGIA (8 bytes) | largo del encabezado (8 bytes, little endian) | encabezado | detalles
+#
+#   - El encabezado es un pickle (protocolo 5) con el catálogo "por columnas": una lista
+#     por campo liviano (título, año, reparto, géneros, ...), más los desplazamientos de
+#     los detalles de cada película. Deserializar unas pocas listas grandes es mucho más
+#     rápido que parsear texto JSON.
+#     El encabezado guarda también el `seq` del último cambio del diario que incluye la foto
+#     (ver `persistencia`), o None.
+#   - Los detalles son los campos pesados que casi nunca se filtran (`extract` y
+#     `thumbnail`): un JSON chico por película, uno detrás de otro. No se decodifican al
+#     arrancar, sino la primera vez que se pide cada película completa.
+#
+# Los detalles se podrían leer con mmap, pero el archivo se lee entero a memoria (son
+# bytes, no objetos de Python): en Windows no se puede reemplazar un archivo mapeado,
+# y la compactación necesita reemplazar el snapshot mientras el servidor sigue andando.
+
+import pickle
+import struct
+from array import array
+from itertools import repeat
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from json_rapido import codificar_json, decodificar_json
+
+MAGIA = b"PELIS\x00\x01\n"
+_LARGO = struct.Struct("<Q")
+
+CAMPOS_PEREZOSOS = ("extract", "thumbnail")   # Se cargan recién cuando se piden.
+
+
+class DetallesPerezosos:
+    """
+    Campos pesados de las películas de un snapshot binario, todavía sin decodificar.
+    `detalles(i)` devuelve los de la película en la posición `i` del snapshot.
+    """
+
+    campos = CAMPOS_PEREZOSOS
+
+    def __init__(self, datos: bytes, desplazamientos: array):
+        self._datos = datos
+        self._desplazamientos = desplazamientos
+
+    def __len__(self) -> int:
+        return len(self._desplazamientos) - 1
+
+    def __call__(self, posicion: int) -> Dict:
+        return dict(zip(self.campos, decodificar_json(self.crudos(posicion))))
+
+    def crudos(self, posicion: int) -> bytes:
+        """Los detalles de la película en la posición `posicion`, todavía codificados (como están en el archivo)."""
+        desde, hasta = self._desplazamientos[posicion], self._desplazamientos[posicion + 1]
+        return self._datos[desde:hasta]
+
+
+def es_snapshot_binario(ruta: str) -> bool:
+    """El formato del snapshot se decide por la extensión: `.json` es JSON, cualquier otra es binario."""
+    return not ruta.lower().endswith(".json")
+
+
+def serializar_snapshot_binario(peliculas: List[Dict], seq: Optional[int] = None,
+                                pendientes: Optional[List[Optional[Tuple[Callable[[int], Dict], int]]]] = None) -> bytes:
+    """
+    `pendientes` (opcional, paralela a `peliculas`) indica de dónde sacar los campos perezosos
+    de las películas que no los traen (ver `AlmacenPeliculas.instantanea`): si vienen de otro
+    snapshot binario, se copian tal cual, sin decodificarlos.
+    """
+    campos = []   # Campos livianos, en el orden en que aparecen (iguales para todas las películas del dataset).
+    for pelicula in peliculas:
+        for campo in pelicula:
+            if campo not in CAMPOS_PEREZOSOS and campo not in campos:
+                campos.append(campo)
+
+    # Las listas (reparto, géneros) se guardan como tuplas. Como el almacén comparte los strings
+    # repetidos, pickle los escribe una sola vez y al cargarlos vuelven a quedar compartidos.
+    columnas = {campo: [tuple(valor) if type(valor) is list else valor for valor in
+                        (pelicula.get(campo) for pelicula in peliculas)] for campo in campos}
+    desplazamientos = array("Q", [0])
+    partes = []
+    for pelicula, pendiente in zip(peliculas, pendientes or repeat(None)):
+        if pendiente is None:
+            parte = codificar_json([pelicula.get(campo) for campo in CAMPOS_PEREZOSOS])
+        else:
+            detalles, posicion = pendiente
+            if isinstance(detalles, DetallesPerezosos):
+                parte = detalles.crudos(posicion)
+            else:
+                parte = codificar_json([detalles(posicion).get(campo) for campo in CAMPOS_PEREZOSOS])
+        partes.append(parte)
+        desplazamientos.append(desplazamientos[-1] + len(parte))
+
+    encabezado = pickle.dumps({"columnas": columnas, "desplazamientos": desplazamientos, "seq": seq}, protocol=5)
+    return b"".join([MAGIA, _LARGO.pack(len(encabezado)), encabezado, *partes])
+
+
+def leer_snapshot_binario(datos: bytes) -> Tuple[Iterator[Dict], DetallesPerezosos, Optional[int]]:
+    """
+    Devuelve las películas sin los campos perezosos, en el orden del snapshot, los
+    detalles para completarlas y el `seq` guardado con la foto. Solo hay que leer snapshots escritos por este servidor:
+    el encabezado es un pickle.
+
+    Las películas se arman de a una a medida que se recorren: así el almacén puede pasarlas
+    a su representación interna sin tener todos los dicts intermedios en memoria a la vez.
+    """
+    if not datos.startswith(MAGIA):
+        raise ValueError("El archivo no es un snapshot binario de películas")
+    (largo,) = _LARGO.unpack_from(datos, len(MAGIA))
+    inicio = len(MAGIA) + _LARGO.size
+    encabezado = pickle.loads(memoryview(datos)[inicio:inicio + largo])
+
+    columnas = encabezado["columnas"]
+    campos = tuple(columnas)
+    peliculas = (dict(zip(campos, fila)) for fila in zip(*columnas.values()))
+    # Solo se conserva la parte de los detalles (una copia), no el archivo entero.
+    detalles = DetallesPerezosos(datos[inicio + largo:], encabezado["desplazamientos"])
+    return peliculas, detalles, encabezado.get("seq")  # Los snapshots viejos no tienen `seq`.
@@ -1,38 +1,432 @@
-import asyncio
-import httpx
-
-# --- PARÁMETROS DE LA PRUEBA ---
-URL_A_PROBAR = "http://127.0.0.1:8000/movies"
-TOTAL_PETICIONES = 100  # Número total de peticiones a enviar en una ráfaga
-
-async def main():
-    """
-    Lanza una ráfaga de peticiones y cuenta éxitos vs. rechazos.
-    """
-    print(f"Lanzando {TOTAL_PETICIONES} peticiones a {URL_A_PROBAR}...")
-
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        # 1. Prepara una lista de tareas de petición.
-        tasks = [client.get(URL_A_PROBAR) for _ in range(TOTAL_PETICIONES)]
-        
-        # 2. Lanza todas las tareas concurrentemente y espera los resultados.
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # 3. Cuenta los resultados de forma simple.
-    exitos = 0
-    rechazos = 0
-
-    for resp in responses:
-        # Si la respuesta es un objeto Response y su código es 200, es un éxito.
-        if isinstance(resp, httpx.Response) and resp.status_code == 200:
-            exitos += 1
-        else:
-            # Cualquier otra cosa (otro código de estado o una excepción) es un rechazo.
-            rechazos += 1
-
-    print("\n--- Resultados ---")
-    print(f"Peticiones Aceptadas (200 OK): {exitos}")
-    print(f"Peticiones Rechazadas (Otros): {rechazos}")
-
-if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+# GENERADOR DE CARGA PARA LA API DE PELÍCULAS
+
+# Manda peticiones a la API según una "mezcla" de endpoints y mide cómo responde: códigos
+# de estado, latencias (p50/p95/p99/máx.) por endpoint y peticiones por segundo a lo largo
+# de la prueba. Los resultados se pueden guardar en JSON o CSV para comparar corridas.
+#
+# Modos:
+#   - rafaga:  lanza todas las peticiones a la vez (lo que hacía la versión anterior).
+#   - cerrado: `--concurrencia` clientes que mandan una petición apenas reciben la respuesta anterior.
+#   - abierto: llegan `--tasa` peticiones por segundo, responda como responda el servidor. La latencia
+#              se mide desde el momento en que la petición debía salir, así las demoras del servidor
+#              no se esconden (en el modo cerrado, un servidor lento también recibe menos peticiones).
+#
+# Con `--en-proceso` no hace falta levantar el servidor: se arranca la app en este mismo proceso
+# (con su lifespan) sobre un catálogo sintético en una carpeta temporal, sin usar la red.
+#
+# Para simular varios clientes (`--ips`), cada petición lleva una IP en `X-Forwarded-For`. Contra
+# un servidor de verdad, uvicorn solo la usa si se lo arranca con
+# `uvicorn main:app --proxy-headers --forwarded-allow-ips="*"`.
+#
+# Uso:
+#   python stresser.py                                                  # 100 GET /movies a la vez
+#   python stresser.py --modo cerrado --concurrencia 20 --segundos 30 --mezcla lectura
+#   python stresser.py --en-proceso --modo abierto --tasa 200 --segundos 20 --ips 500 --mezcla mixta
+#   python stresser.py --mezcla mi_mezcla.jsonl --json antes.json --csv antes.csv
+#   python stresser.py --comparar antes.json despues.json
+#
+# Archivos de mezcla: JSONL, una petición por línea (como `requests.jsonl`):
+#   {"name": "titulo", "method": "GET", "path": "/movies/{titulo}", "weight": 5}
+#   {"name": "alta", "method": "POST", "path": "/movies", "auth": true,
+#    "json": {"title": "Stress {n}", "year": "{anio}", "cast": [], "genres": []}}
+# Campos opcionales: `params` (query string), `json` (cuerpo), `auth` (usa --usuario/--clave)
+# y `weight` (frecuencia relativa, 1 por defecto). Marcadores que se reemplazan en la ruta,
+# los parámetros y el cuerpo:
+#   {titulo}  un título al azar del catálogo (se piden al empezar)
+#   {creada}  una película creada antes por esta misma corrida (si todavía no hay, se elige otra petición)
+#   {n}       un número distinto en cada petición
+#   {anio}    un año al azar
+# OJO: las mezclas con escrituras modifican el catálogo del servidor al que se apunta.
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+# --- PARÁMETROS POR DEFECTO DE LA PRUEBA ---
+URL_A_PROBAR = "http://127.0.0.1:8000"
+TOTAL_PETICIONES = 100  # Número total de peticiones a enviar en una ráfaga
+TITULOS_A_PEDIR = 1000  # Títulos del catálogo que se piden al empezar, para el marcador {titulo}
+
+# Límites de los intervalos del histograma de latencias, en milisegundos.
+LIMITES_HISTOGRAMA_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_MARCADOR = re.compile(r"\{(titulo|creada|n|anio)\}")
+
+
+
+# MEZCLAS DE PETICIONES
+
+MEZCLAS: Dict[str, List[Dict]] = {
+    "listado": [
+        {"name": "listado", "method": "GET", "path": "/movies"},
+    ],
+    "lectura": [
+        {"name": "titulo", "method": "GET", "path": "/movies/{titulo}", "weight": 5},
+        {"name": "filtro", "method": "GET", "path": "/movies", "params": {"year": "{anio}", "limit": 50}, "weight": 2},
+        {"name": "busqueda", "method": "GET", "path": "/movies/search", "params": {"q": "{titulo}"}, "weight": 2},
+        {"name": "cantidad", "method": "GET", "path": "/movies/count"},
+        {"name": "estadisticas", "method": "GET", "path": "/movies/stats"},
+    ],
+}
+# La mixta agrega escrituras (un 10%) sobre películas que crea la misma corrida.
+MEZCLAS["mixta"] = MEZCLAS["lectura"] + [
+    {"name": "alta", "method": "POST", "path": "/movies", "auth": True, "weight": 0.6,
+     "json": {"title": "Stress {n}", "year": "{anio}", "cast": ["Stress Actor"], "genres": ["Drama"]}},
+    {"name": "modificacion", "method": "PUT", "path": "/movies/{creada}/partial", "auth": True, "weight": 0.3,
+     "json": {"year": "{anio}"}},
+    {"name": "baja", "method": "DELETE", "path": "/movies/{creada}", "auth": True, "weight": 0.2},
+]
+
+def cargar_mezcla(nombre_o_ruta: str) -> List[Dict]:
+    """Una mezcla predefinida (por nombre) o un archivo JSONL con una petición por línea."""
+    if nombre_o_ruta in MEZCLAS:
+        return MEZCLAS[nombre_o_ruta]
+    mezcla = []
+    with open(nombre_o_ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, 1):
+            if not linea.strip():
+                continue
+            peticion = json.loads(linea)
+            if "path" not in peticion:
+                raise ValueError(f"{nombre_o_ruta}:{numero}: falta el campo 'path'")
+            peticion.setdefault("method", "GET")
+            peticion.setdefault("name", f"{peticion['method']} {peticion['path']}")
+            mezcla.append(peticion)
+    if not mezcla:
+        raise ValueError(f"{nombre_o_ruta}: la mezcla no tiene peticiones")
+    return mezcla
+
+
+class GeneradorDePeticiones:
+    """Elige peticiones de la mezcla según su peso y completa sus marcadores."""
+
+    def __init__(self, mezcla: List[Dict], titulos: List[str], ips: int, semilla: int):
+        self.mezcla = mezcla
+        self.pesos = [peticion.get("weight", 1) for peticion in mezcla]
+        self.titulos = titulos or ["Pelicula Sintetica 0"]
+        self.creadas: List[str] = []   # Títulos que creó esta corrida (para {creada})
+        self.ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(1, ips + 1)]
+        self.rnd = random.Random(semilla)
+        self.contador = 0
+
+    def siguiente(self) -> Dict:
+        while True:
+            plantilla = self.rnd.choices(self.mezcla, weights=self.pesos)[0]
+            if "{creada}" in plantilla["path"] and not self.creadas:
+                continue  # Todavía no se creó ninguna película que modificar o borrar.
+            self.contador += 1
+            valores = {
+                "titulo": self.rnd.choice(self.titulos),
+                "n": f"{os.getpid()}-{self.contador}",
+                "anio": self.rnd.randint(1950, 2020),
+            }
+            if "{creada}" in plantilla["path"]:
+                # Una baja saca el título de la lista para que nadie más lo use.
+                indice = self.rnd.randrange(len(self.creadas))
+                valores["creada"] = self.creadas.pop(indice) if plantilla["method"] == "DELETE" else self.creadas[indice]
+            peticion = {clave: _rellenar(valor, valores) for clave, valor in plantilla.items()}
+            peticion["ip"] = self.rnd.choice(self.ips)
+            return peticion
+
+def _rellenar(valor, valores: Dict):
+    """Reemplaza los marcadores en strings, listas y dicts. Un marcador solo conserva el tipo (p. ej. el año como int)."""
+    if isinstance(valor, str):
+        solo = _MARCADOR.fullmatch(valor)
+        if solo:
+            return valores[solo.group(1)]
+        return _MARCADOR.sub(lambda m: str(valores[m.group(1)]), valor)
+    if isinstance(valor, list):
+        return [_rellenar(v, valores) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _rellenar(v, valores) for k, v in valor.items()}
+    return valor
+
+
+
+# RESULTADOS
+
+def percentil(ordenados: List[float], p: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+class Resultados:
+    """Latencias y códigos de estado por endpoint, y peticiones terminadas por segundo."""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = {}
+        self.estados: Dict[str, Counter] = {}
+        self.por_segundo: List[Counter] = []
+        self.descartadas = 0   # Modo abierto: peticiones que no salieron por haber demasiadas en vuelo
+        self.inicio = time.perf_counter()
+        self.fin = self.inicio
+
+    def registrar(self, nombre: str, latencia: float, estado) -> None:
+        """`estado` es el código HTTP o el nombre de la excepción si no hubo respuesta."""
+        self.latencias.setdefault(nombre, []).append(latencia)
+        self.estados.setdefault(nombre, Counter())[estado] += 1
+        self.fin = time.perf_counter()
+        segundo = int(self.fin - self.inicio)
+        while len(self.por_segundo) <= segundo:
+            self.por_segundo.append(Counter())
+        self.por_segundo[segundo][_categoria(estado)] += 1
+
+    def resumen(self, configuracion: Dict) -> Dict:
+        duracion = max(self.fin - self.inicio, 1e-9)
+        endpoints = {nombre: _estadisticas(self.latencias[nombre], self.estados[nombre], duracion)
+                     for nombre in sorted(self.latencias)}
+        todas = [latencia for latencias in self.latencias.values() for latencia in latencias]
+        estados = sum(self.estados.values(), Counter())
+        return {
+            "configuracion": configuracion,
+            "duracion_s": round(duracion, 3),
+            "descartadas": self.descartadas,
+            "total": _estadisticas(todas, estados, duracion),
+            "endpoints": endpoints,
+            "por_segundo": [dict(segundo) for segundo in self.por_segundo],
+        }
+
+def _categoria(estado) -> str:
+    if isinstance(estado, str):
+        return "excepcion"
+    if estado == 429:
+        return "limitadas"
+    return "ok" if estado < 400 else "errores"
+
+def _estadisticas(latencias: List[float], estados: Counter, duracion: float) -> Dict:
+    ordenadas = sorted(latencias)
+    categorias = Counter()
+    for estado, cantidad in estados.items():
+        categorias[_categoria(estado)] += cantidad
+    histograma = Counter()
+    for latencia in ordenadas:
+        ms = latencia * 1000
+        histograma[next((f"<={limite}" for limite in LIMITES_HISTOGRAMA_MS if ms <= limite), "mas")] += 1
+    ms = lambda segundos: round(segundos * 1000, 3)
+    return {
+        "peticiones": len(ordenadas),
+        "ok": categorias["ok"],
+        "limitadas": categorias["limitadas"],
+        "errores": categorias["errores"] + categorias["excepcion"],
+        "por_segundo": round(len(ordenadas) / duracion, 1),
+        "p50_ms": ms(percentil(ordenadas, 0.50)),
+        "p95_ms": ms(percentil(ordenadas, 0.95)),
+        "p99_ms": ms(percentil(ordenadas, 0.99)),
+        "max_ms": ms(ordenadas[-1]) if ordenadas else 0.0,
+        "media_ms": ms(sum(ordenadas) / len(ordenadas)) if ordenadas else 0.0,
+        "estados": {str(estado): cantidad for estado, cantidad in sorted(estados.items(), key=str)},
+        "histograma_ms": {intervalo: histograma[intervalo] for intervalo in
+                          [f"<={limite}" for limite in LIMITES_HISTOGRAMA_MS] + ["mas"] if histograma[intervalo]},
+    }
+
+COLUMNAS_CSV = ("peticiones", "ok", "limitadas", "errores", "por_segundo",
+                "p50_ms", "p95_ms", "p99_ms", "max_ms", "media_ms")
+
+def imprimir_resumen(resumen: Dict) -> None:
+    print(f"\n--- Resultados ({resumen['duracion_s']:.1f} s) ---")
+    print(f"{'endpoint':<16}{'pet.':>8}{'ok':>8}{'429':>7}{'error':>7}{'pet/s':>9}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>9}  (ms)")
+    for nombre, fila in [*resumen["endpoints"].items(), ("TOTAL", resumen["total"])]:
+        print(f"{nombre[:15]:<16}{fila['peticiones']:>8}{fila['ok']:>8}{fila['limitadas']:>7}{fila['errores']:>7}"
+              f"{fila['por_segundo']:>9.1f}{fila['p50_ms']:>9.2f}{fila['p95_ms']:>9.2f}{fila['p99_ms']:>9.2f}{fila['max_ms']:>9.2f}")
+    por_segundo = [sum(segundo.values()) for segundo in resumen["por_segundo"]]
+    if len(por_segundo) > 1:
+        completos = por_segundo[:-1]  # El último segundo suele estar incompleto.
+        print(f"Peticiones terminadas por segundo: mín. {min(completos)}, media {sum(completos) / len(completos):.0f}, máx. {max(completos)}")
+    if resumen["descartadas"]:
+        print(f"Descartadas (demasiadas peticiones en vuelo): {resumen['descartadas']}")
+    errores = {estado: n for estado, n in resumen["total"]["estados"].items() if not estado.isdigit() or int(estado) >= 400}
+    if errores:
+        print(f"Respuestas con error: {errores}")
+
+def guardar_csv(resumen: Dict, ruta: str) -> None:
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(("endpoint",) + COLUMNAS_CSV)
+        for nombre, fila in [*resumen["endpoints"].items(), ("TOTAL", resumen["total"])]:
+            escritor.writerow([nombre] + [fila[columna] for columna in COLUMNAS_CSV])
+
+def comparar(ruta_antes: str, ruta_despues: str) -> None:
+    """Compara dos resultados guardados con --json, endpoint por endpoint."""
+    with open(ruta_antes, encoding="utf-8") as f:
+        antes = json.load(f)
+    with open(ruta_despues, encoding="utf-8") as f:
+        despues = json.load(f)
+    print(f"{'endpoint':<16}{'métrica':<12}{'antes':>12}{'después':>12}{'cambio':>10}")
+    nombres = [n for n in antes["endpoints"] if n in despues["endpoints"]] + ["TOTAL"]
+    for nombre in nombres:
+        fila_antes = antes["total"] if nombre == "TOTAL" else antes["endpoints"][nombre]
+        fila_despues = despues["total"] if nombre == "TOTAL" else despues["endpoints"][nombre]
+        for metrica in ("por_segundo", "p50_ms", "p99_ms", "max_ms"):
+            a, d = fila_antes[metrica], fila_despues[metrica]
+            cambio = f"{(d - a) / a * 100:+.0f}%" if a else "-"
+            print(f"{nombre[:15]:<16}{metrica:<12}{a:>12.2f}{d:>12.2f}{cambio:>10}")
+
+
+
+# EJECUCIÓN DE LA CARGA
+
+async def enviar(cliente: httpx.AsyncClient, generador: GeneradorDePeticiones, resultados: Resultados,
+                 autenticacion, inicio: Optional[float] = None) -> None:
+    """Manda una petición y registra su resultado. `inicio` es cuándo debía salir (modo abierto)."""
+    peticion = generador.siguiente()
+    inicio = time.perf_counter() if inicio is None else inicio
+    try:
+        respuesta = await cliente.request(
+            peticion["method"], peticion["path"], params=peticion.get("params"), json=peticion.get("json"),
+            auth=autenticacion if peticion.get("auth") else None, headers={"X-Forwarded-For": peticion["ip"]},
+        )
+        estado = respuesta.status_code
+        if peticion["method"] == "POST" and estado == 201 and isinstance(peticion.get("json"), dict):
+            generador.creadas.append(peticion["json"].get("title"))
+    except httpx.HTTPError as e:
+        estado = type(e).__name__
+    resultados.registrar(peticion["name"], time.perf_counter() - inicio, estado)
+
+async def modo_rafaga(cliente, generador, resultados, autenticacion, peticiones: int) -> None:
+    await asyncio.gather(*(enviar(cliente, generador, resultados, autenticacion) for _ in range(peticiones)))
+
+async def modo_cerrado(cliente, generador, resultados, autenticacion, concurrencia: int,
+                       segundos: float, peticiones: Optional[int]) -> None:
+    limite = time.perf_counter() + segundos
+    restantes = [peticiones]
+
+    async def cliente_simulado():
+        while time.perf_counter() < limite and (restantes[0] is None or restantes[0] > 0):
+            if restantes[0] is not None:
+                restantes[0] -= 1
+            await enviar(cliente, generador, resultados, autenticacion)
+
+    await asyncio.gather(*(cliente_simulado() for _ in range(concurrencia)))
+
+async def modo_abierto(cliente, generador, resultados, autenticacion, tasa: float,
+                       segundos: float, max_en_vuelo: int) -> None:
+    en_vuelo = set()
+    inicio = time.perf_counter()
+    for i in range(int(tasa * segundos)):
+        programada = inicio + i / tasa
+        espera = programada - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        if len(en_vuelo) >= max_en_vuelo:
+            resultados.descartadas += 1
+            continue
+        tarea = asyncio.create_task(enviar(cliente, generador, resultados, autenticacion, programada))
+        en_vuelo.add(tarea)
+        tarea.add_done_callback(en_vuelo.discard)
+    await asyncio.gather(*en_vuelo)
+
+async def pedir_titulos(cliente: httpx.AsyncClient) -> List[str]:
+    respuesta = await cliente.get("/movies", params={"fields": "title", "limit": TITULOS_A_PEDIR},
+                                  headers={"X-Forwarded-For": "10.255.255.254"})
+    respuesta.raise_for_status()
+    return [pelicula["title"] for pelicula in respuesta.json()]
+
+@asynccontextmanager
+async def servidor_en_proceso(catalogo: int, sin_limite: bool) -> AsyncIterator[httpx.AsyncBaseTransport]:
+    """
+    Arranca la app en este proceso sobre `catalogo` películas sintéticas, en una carpeta temporal
+    (ahí quedan el snapshot y el diario de la prueba), y devuelve un transporte que la llama sin red.
+    """
+    import main
+    from benchmarks import generar_peliculas
+    from limitador import LimitadorTokenBucket, ReglaDeLimite
+    from persistencia import escribir_snapshot
+    from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as carpeta:
+        os.chdir(carpeta)
+        try:
+            escribir_snapshot(main.SNAPSHOT_FILE, generar_peliculas(catalogo))
+            if sin_limite:
+                main.limitador = LimitadorTokenBucket([], ReglaDeLimite("sin límite", 1e12, 10**12))
+            async with main.app.router.lifespan_context(main.app):
+                while main.cargando_datos.is_set():
+                    if main.error_de_carga:
+                        raise RuntimeError(main.error_de_carga)
+                    await asyncio.sleep(0.05)
+                await asyncio.to_thread(main.movies_db.preparar_busqueda)  # Para que no lo arme la primera búsqueda.
+                # La IP de cada petición sale de X-Forwarded-For, como con `uvicorn --proxy-headers`.
+                yield httpx.ASGITransport(app=ProxyHeadersMiddleware(main.app, trusted_hosts="*"))
+        finally:
+            os.chdir(directorio_original)
+
+async def ejecutar(args) -> Dict:
+    mezcla = cargar_mezcla(args.mezcla)
+    autenticacion = (args.usuario, args.clave)
+    if args.en_proceso:
+        contexto = servidor_en_proceso(args.catalogo, args.sin_limite)
+        url = "http://en-proceso"
+    else:
+        contexto = _sin_transporte()
+        url = args.url
+    async with contexto as transporte:
+        limites = httpx.Limits(max_connections=max(args.concurrencia, 100), max_keepalive_connections=max(args.concurrencia, 100))
+        async with httpx.AsyncClient(base_url=url, transport=transporte, timeout=args.timeout, limits=limites) as cliente:
+            usa_titulos = any("{titulo}" in json.dumps(peticion) for peticion in mezcla)
+            titulos = await pedir_titulos(cliente) if usa_titulos else []
+            generador = GeneradorDePeticiones(mezcla, titulos, args.ips, args.semilla)
+            resultados = Resultados()
+            print(f"Modo {args.modo} contra {url} (mezcla: {args.mezcla}, {args.ips} IP(s))...")
+            if args.modo == "rafaga":
+                await modo_rafaga(cliente, generador, resultados, autenticacion, args.peticiones or TOTAL_PETICIONES)
+            elif args.modo == "cerrado":
+                await modo_cerrado(cliente, generador, resultados, autenticacion, args.concurrencia, args.segundos, args.peticiones)
+            else:
+                await modo_abierto(cliente, generador, resultados, autenticacion, args.tasa, args.segundos, args.max_en_vuelo)
+    configuracion = {clave: valor for clave, valor in vars(args).items() if clave not in ("clave", "comparar", "json", "csv")}
+    return resultados.resumen(configuracion)
+
+@asynccontextmanager
+async def _sin_transporte() -> AsyncIterator[None]:
+    yield None  # httpx usa su transporte HTTP normal.
+
+
+
+# PUNTO DE ENTRADA DEL SCRIPT
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generador de carga para la API de películas.")
+    parser.add_argument("--url", default=URL_A_PROBAR, help="Servidor a probar (se ignora con --en-proceso).")
+    parser.add_argument("--en-proceso", action="store_true", help="Arrancar la app en este proceso, con un catálogo sintético.")
+    parser.add_argument("--catalogo", type=int, default=36000, help="Películas del catálogo sintético (--en-proceso).")
+    parser.add_argument("--sin-limite", action="store_true", help="Desactivar el limitador de tasa (--en-proceso).")
+    parser.add_argument("--mezcla", default="listado", help=f"Mezcla predefinida ({', '.join(MEZCLAS)}) o archivo JSONL.")
+    parser.add_argument("--modo", choices=["rafaga", "cerrado", "abierto"], default="rafaga")
+    parser.add_argument("--peticiones", type=int, help=f"Total de peticiones (ráfaga: {TOTAL_PETICIONES} por defecto; cerrado: sin límite).")
+    parser.add_argument("--concurrencia", type=int, default=10, help="Clientes simultáneos en el modo cerrado.")
+    parser.add_argument("--tasa", type=float, default=50.0, help="Peticiones por segundo en el modo abierto.")
+    parser.add_argument("--segundos", type=float, default=10.0, help="Duración de los modos cerrado y abierto.")
+    parser.add_argument("--max-en-vuelo", type=int, default=1000, help="Modo abierto: peticiones sin respuesta como máximo.")
+    parser.add_argument("--ips", type=int, default=1, help="Cantidad de IPs de origen simuladas.")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--clave", default="supersecret")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--json", help="Guardar el resultado completo en este archivo JSON.")
+    parser.add_argument("--csv", help="Guardar la tabla por endpoint en este archivo CSV.")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DESPUES"), help="Comparar dos resultados guardados con --json.")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    else:
+        resumen = asyncio.run(ejecutar(args))
+        imprimir_resumen(resumen)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(resumen, f, ensure_ascii=False, indent=2)
+        if args.csv:
+            guardar_csv(resumen, args.csv)
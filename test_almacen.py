@@ -0,0 +1,99 @@
+# PRUEBAS DEL ALMACÉN
+
+# Se corren con `python -m pytest`.
+
+import random
+import threading
+import time
+
+import pytest
+
+import indice_ordenado
+from almacen import AlmacenPeliculas, _Pendiente
+from snapshot_binario import leer_snapshot_binario, serializar_snapshot_binario
+
+
+def pelicula(titulo: str, anio: int, extract: str = "") -> dict:
+    return {"title": titulo, "year": anio, "cast": ["Ana"], "genres": ["Drama"], "extract": extract, "thumbnail": None}
+
+def almacen_perezoso(cantidad: int) -> AlmacenPeliculas:
+    """Almacén cargado desde un snapshot binario: `extract` y `thumbnail` quedan pendientes."""
+    almacen = AlmacenPeliculas()
+    peliculas, detalles, _ = leer_snapshot_binario(serializar_snapshot_binario(
+        [pelicula(f"Película {i}", 1990 + i % 10, f"resumen número {i}") for i in range(cantidad)]))
+    almacen.cargar(peliculas, detalles)
+    return almacen
+
+def pendientes(almacen: AlmacenPeliculas) -> int:
+    return sum(type(registro.extract) is _Pendiente for registro in almacen._peliculas.values())
+
+
+
+# CAMPOS PEREZOSOS
+
+def test_indice_de_busqueda_no_carga_los_campos_perezosos():
+    almacen = almacen_perezoso(20)
+    almacen.preparar_busqueda()
+    assert pendientes(almacen) == 20
+    resultados, total = almacen.buscar("número 7", prefijo=False)
+    assert total >= 1 and almacen.obtener_por_id(resultados[0][0])["title"] == "Película 7"
+
+
+
+# LISTADOS ORDENADOS
+
+@pytest.mark.parametrize("orden", ["title", "year"])
+@pytest.mark.parametrize("descendente", [False, True])
+@pytest.mark.parametrize("filtros", [{}, {"title_prefix": "b"}, {"year_from": 1993, "year_to": 1996}, {"year": 1991},
+                                     {"genres": ["Drama"]}, {"title_prefix": "a", "year_to": 1994}])
+def test_pagina_ordenada_recorre_lo_mismo_que_ordenar_todo(monkeypatch, orden, descendente, filtros):
+    monkeypatch.setattr(indice_ordenado, "TAMANIO_BLOQUE", 3)  # Muchos bloques chicos.
+    rnd = random.Random(7)
+    almacen = AlmacenPeliculas()
+    almacen.cargar([pelicula(f"{rnd.choice('abc')}{i:03}", rnd.randint(1990, 1999)) for i in range(80)])
+    for i in range(20):  # Altas y bajas después de armar los índices.
+        almacen.pagina_ordenada(orden)
+        almacen.eliminar(rnd.choice([p["title"] for p in almacen]))
+        almacen.agregar(pelicula(f"b{i}", rnd.randint(1990, 1999)))
+
+    claves = sorted(almacen._clave_de_orden(orden, i, almacen._peliculas[i]) for i in almacen.filtrar_ids(**filtros))
+    esperadas = claves[::-1] if descendente else claves
+    recorridas, cursor = [], None
+    while True:
+        pagina, total, hay_mas = almacen.pagina_ordenada(orden, descendente, cursor, 1, 4, **filtros)
+        assert total == len(esperadas)
+        recorridas.append(pagina)
+        if not hay_mas:
+            break
+        cursor = pagina[-1]
+    # Cada página saltea una clave (`saltear=1`) después del cursor.
+    assert [clave for pagina in recorridas for clave in pagina] == \
+        [clave for i, clave in enumerate(esperadas) if i % 5 != 0]
+
+
+
+# CONCURRENCIA
+
+def test_obtener_mientras_otro_hilo_borra_y_vuelve_a_agregar():
+    almacen = AlmacenPeliculas()
+    almacen.cargar([pelicula(f"Película {i}", 2000) for i in range(100)])
+    errores = []
+    fin = time.monotonic() + 0.5
+
+    def leer():
+        try:
+            while time.monotonic() < fin:
+                encontrada = almacen.obtener("Película 50")
+                assert encontrada is None or encontrada["title"] == "Película 50"
+        except Exception as error:
+            errores.append(error)
+
+    lectores = [threading.Thread(target=leer) for _ in range(4)]
+    for lector in lectores:
+        lector.start()
+    while time.monotonic() < fin:
+        almacen.eliminar("Película 50")
+        almacen.agregar(pelicula("Película 50", 2000))
+    for lector in lectores:
+        lector.join()
+    assert errores == []
@@ -0,0 +1,79 @@
+# PRUEBAS DE LA API
+
+# Levantan la app con `TestClient` sobre un catálogo chico en una carpeta temporal (el
+# servidor guarda ahí el snapshot y el diario). Se corren con `python -m pytest`.
+
+import base64
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from feed_cambios import FeedDeCambios
+from limitador import LimitadorTokenBucket, ReglaDeLimite
+
+ADMIN = ("admin", "supersecret")
+
+
+def pelicula(titulo: str, anio: int) -> dict:
+    return {"title": titulo, "year": anio, "cast": [], "genres": ["Drama"]}
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / main.DATA_FILE).write_text(json.dumps([pelicula(f"Película {i}", 1990 + i % 10) for i in range(50)]))
+    monkeypatch.setattr(main, "limitador", LimitadorTokenBucket([], ReglaDeLimite("pruebas", 1e9, 10**9)))
+    with TestClient(main.app) as cliente:
+        while main.cargando_datos.is_set():
+            time.sleep(0.01)
+        yield cliente
+
+@pytest.fixture
+def feed_chico(monkeypatch):
+    """Reemplaza el feed por uno que guarda solo 5 cambios (se suscribe al final, como el original)."""
+    feed = FeedDeCambios(5)
+    main.movies_db.desuscribir(main.feed.al_cambiar)
+    main.movies_db.suscribir(feed.al_cambiar)
+    original, main.feed = main.feed, feed
+    yield feed
+    main.movies_db.desuscribir(feed.al_cambiar)
+    main.movies_db.suscribir(original.al_cambiar)
+    main.feed = original
+
+
+
+# FEED DE CAMBIOS
+
+def test_listado_cacheado_informa_la_version_actual(cliente, feed_chico):
+    # El listado de 1995 queda en el cache; las altas de 2010 no lo invalidan.
+    assert cliente.get("/movies", params={"year": 1995}).status_code == 200
+    for i in range(10):
+        assert cliente.post("/movies", json=pelicula(f"Nueva {i}", 2010), auth=ADMIN).status_code == 201
+
+    respuesta = cliente.get("/movies", params={"year": 1995})
+    assert int(respuesta.headers["X-Catalog-Version"]) == feed_chico.version
+    cambios = cliente.get("/movies/changes", params={"since": respuesta.headers["X-Catalog-Version"],
+                                                     "epoch": respuesta.headers["X-Catalog-Epoch"]})
+    assert cambios.status_code == 200
+
+
+
+# LISTADOS ORDENADOS
+
+@pytest.mark.parametrize("contenido", [b"title:5", b'title:"ab"', b"title:{}", b"title:[1, 2]", b"year:[1990, \"x\", 3]", b"title:["])
+def test_cursor_de_orden_invalido_responde_400(cliente, contenido):
+    cursor = base64.urlsafe_b64encode(contenido).decode().rstrip("=")
+    assert cliente.get("/movies", params={"sort": "title", "cursor": cursor}).status_code == 400
+
+def test_cursor_de_orden_recorre_todo_el_listado(cliente):
+    titulos, params = [], {"sort": "-year", "limit": 7}
+    while True:
+        respuesta = cliente.get("/movies", params=params)
+        titulos += [movie["title"] for movie in respuesta.json()]
+        if "X-Next-Cursor" not in respuesta.headers:
+            break
+        params["cursor"] = respuesta.headers["X-Next-Cursor"]
+    esperados = sorted(main.movies_db, key=lambda movie: (movie["year"], movie["title"].lower()), reverse=True)
+    assert titulos == [movie["title"] for movie in esperados]
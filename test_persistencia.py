@@ -0,0 +1,169 @@
+# PRUEBAS DE LA PERSISTENCIA
+
+# Caídas del proceso en medio de una compactación: al arrancar, los cambios que el snapshot
+# ya incluye no se tienen que volver a aplicar. Se corren con `python -m pytest`.
+
+import os
+import sqlite3
+
+import pytest
+
+import persistencia
+from almacen import AlmacenPeliculas, _Pendiente
+from persistencia import DiarioCompartido, DiarioDeCambios, escribir_snapshot
+
+
+def pelicula(titulo: str, anio: int) -> dict:
+    return {"title": titulo, "year": anio, "cast": [], "genres": []}
+
+def renombrar_en_cadena(almacen: AlmacenPeliculas) -> None:
+    """X -> Y y después Z -> X: reaplicar el primer cambio renombraría la X nueva."""
+    almacen.actualizar("X", pelicula("Y", 2001))
+    almacen.actualizar("Z", pelicula("X", 2002))
+
+def anios_por_titulo(almacen: AlmacenPeliculas) -> dict:
+    return {p["title"]: p["year"] for p in almacen}
+
+
+
+# DIARIO JSONL
+
+@pytest.mark.parametrize("nombre_snapshot", ["movies.json", "movies.bin"])
+def test_caida_antes_de_borrar_el_diario_congelado(tmp_path, monkeypatch, nombre_snapshot):
+    archivo_snapshot = str(tmp_path / nombre_snapshot)
+    archivo_diario = str(tmp_path / "movies.journal.jsonl")
+    escribir_snapshot(archivo_snapshot, [pelicula("X", 2001), pelicula("Z", 2002)])
+
+    almacen = AlmacenPeliculas()
+    diario = DiarioDeCambios(almacen, archivo_snapshot, archivo_diario, politica_fsync="nunca")
+    diario.recuperar()
+    renombrar_en_cadena(almacen)
+
+    # El snapshot nuevo queda escrito, pero el proceso "se cae" antes de borrar el diario congelado.
+    borrar = os.remove
+    def caida(ruta):
+        if ruta == diario.archivo_compactando:
+            raise OSError("caída simulada")
+        borrar(ruta)
+    monkeypatch.setattr(persistencia.os, "remove", caida)
+    with pytest.raises(OSError):
+        diario.compactar()
+    monkeypatch.undo()
+    diario.cerrar()
+    assert os.path.exists(diario.archivo_compactando)
+
+    recuperado = AlmacenPeliculas()
+    diario = DiarioDeCambios(recuperado, archivo_snapshot, archivo_diario, politica_fsync="nunca")
+    diario.recuperar()
+    assert anios_por_titulo(recuperado) == {"Y": 2001, "X": 2002}
+    assert not os.path.exists(diario.archivo_compactando)
+
+    # Los cambios posteriores siguen numerándose después de los que ya tiene el snapshot.
+    recuperado.eliminar("Y")
+    diario.cerrar()
+    otro = AlmacenPeliculas()
+    diario = DiarioDeCambios(otro, archivo_snapshot, archivo_diario, politica_fsync="nunca")
+    diario.recuperar()
+    assert anios_por_titulo(otro) == {"X": 2002}
+    diario.cerrar()
+
+
+
+# COMPACTACIÓN CON CAMPOS PEREZOSOS
+
+@pytest.mark.parametrize("nombre_snapshot", ["movies.json", "movies.bin"])
+def test_compactar_no_carga_los_campos_perezosos(tmp_path, nombre_snapshot):
+    peliculas = [{**pelicula(f"P{i}", 2000), "extract": f"resumen {i}", "thumbnail": f"http://x/{i}.jpg"} for i in range(20)]
+    archivo_semilla = str(tmp_path / "semilla.bin")  # Binaria: al cargarla, `extract` y `thumbnail` quedan pendientes.
+    escribir_snapshot(archivo_semilla, peliculas)
+    archivo_snapshot = str(tmp_path / nombre_snapshot)
+    archivo_diario = str(tmp_path / "movies.journal.jsonl")
+
+    almacen = AlmacenPeliculas()
+    diario = DiarioDeCambios(almacen, archivo_snapshot, archivo_diario, politica_fsync="nunca", archivo_semilla=archivo_semilla)
+    diario.recuperar()
+    diario._hilo_compactacion.join()  # Genera el snapshot desde la semilla.
+    almacen.obtener("P3")             # Una sola película queda cargada.
+    diario.compactar()
+    assert sum(type(registro.extract) is _Pendiente for registro in almacen._peliculas.values()) == 19
+    diario.cerrar()
+
+    recuperado = AlmacenPeliculas()
+    persistencia.cargar_snapshot(recuperado, archivo_snapshot)
+    assert [(p["title"], p["extract"], p["thumbnail"]) for p in recuperado] == \
+        [(p["title"], p["extract"], p["thumbnail"]) for p in peliculas]
+
+
+
+# DIARIO COMPARTIDO (SQLITE)
+
+@pytest.mark.parametrize("nombre_snapshot", ["movies.json", "movies.bin"])
+def test_caida_antes_de_confirmar_la_compactacion(tmp_path, monkeypatch, nombre_snapshot):
+    archivo_snapshot = str(tmp_path / nombre_snapshot)
+    archivo_base = str(tmp_path / "movies.sqlite3")
+    escribir_snapshot(archivo_snapshot, [pelicula("X", 2001), pelicula("Z", 2002)])
+
+    almacen = AlmacenPeliculas()
+    diario = DiarioCompartido(almacen, archivo_snapshot, archivo_base, politica_fsync="nunca")
+    diario.recuperar()
+    with diario.escritura():
+        renombrar_en_cadena(almacen)
+
+    # El snapshot nuevo reemplaza al viejo, pero el proceso "se cae" antes del COMMIT que
+    # actualiza `estado.seq_snapshot`.
+    escribir = persistencia.escribir_snapshot
+    def caida(*args):
+        escribir(*args)
+        raise OSError("caída simulada")
+    monkeypatch.setattr(persistencia, "escribir_snapshot", caida)
+    with pytest.raises(OSError):
+        diario.compactar()
+    monkeypatch.undo()
+    diario.cerrar()
+
+    recuperado = AlmacenPeliculas()
+    diario = DiarioCompartido(recuperado, archivo_snapshot, archivo_base, politica_fsync="nunca")
+    diario.recuperar()
+    assert anios_por_titulo(recuperado) == {"Y": 2001, "X": 2002}
+    diario.cerrar()
+
+class FallaAlConfirmar:
+    """Envuelve una conexión de SQLite y hace fallar el COMMIT (como un disco lleno)."""
+
+    def __init__(self, conexion: sqlite3.Connection):
+        self.conexion = conexion
+
+    def __getattr__(self, nombre):
+        return getattr(self.conexion, nombre)
+
+    def execute(self, sql: str, *args):
+        if sql == "COMMIT":
+            raise sqlite3.OperationalError("database or disk is full")
+        return self.conexion.execute(sql, *args)
+
+def test_cambio_descartado_no_se_avisa(tmp_path):
+    archivo_snapshot = str(tmp_path / "movies.json")
+    escribir_snapshot(archivo_snapshot, [pelicula("X", 2001)])
+    almacen = AlmacenPeliculas()
+    diario = DiarioCompartido(almacen, archivo_snapshot, str(tmp_path / "movies.sqlite3"), politica_fsync="nunca")
+    diario.recuperar()
+    avisos = []  # Como el feed: se suscribe al almacén.
+    almacen.suscribir(lambda anterior, nueva: avisos.append((anterior and anterior["title"], nueva and nueva["title"])))
+
+    with diario.escritura():
+        almacen.agregar(pelicula("Y", 2002))
+        assert avisos == []  # Todavía no está confirmado.
+    assert avisos == [(None, "Y")]
+
+    conexion, diario._escritura = diario._escritura, FallaAlConfirmar(diario._escritura)
+    with pytest.raises(sqlite3.OperationalError):
+        with diario.escritura():
+            almacen.agregar(pelicula("Z", 2003))
+    diario._escritura = conexion
+    assert avisos == [(None, "Y")]
+
+    # La próxima sincronización recarga el almacén (snapshot + cambios confirmados), y eso sí se avisa.
+    diario.sincronizar()
+    assert avisos[1:] == [(None, None), (None, "Y")]
+    assert anios_por_titulo(almacen) == {"X": 2001, "Y": 2002}
+    diario.cerrar()